@@ -2,35 +2,100 @@
 
 from flask import (
     Flask, render_template, request, redirect, url_for, 
-    jsonify, flash, send_from_directory, abort
+    jsonify, flash, abort, stream_with_context, has_request_context
 )
+from flask.sessions import SecureCookieSessionInterface
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import selectinload
 from flask_login import (
     LoginManager, login_user, logout_user, login_required, current_user
 )
-from werkzeug.utils import secure_filename
+from werkzeug.utils import send_from_directory as werkzeug_send_from_directory
+from werkzeug.security import safe_join
+from werkzeug.http import is_resource_modified
+from werkzeug.routing import IntegerConverter
+import click
+import datetime
+import hashlib
 import os
-import uuid # Para nomes de arquivos únicos
+import time
+import urllib.parse
+import uuid # Para códigos únicos dos pedidos
+from collections import namedtuple
 
 # Importar de arquivos locais
 from config import Config
-from models import db, Admin, Categoria, Produto, ImagemProduto, SiteSettings, Banner
+from models import db, Admin, Categoria, Produto, ImagemProduto, SiteSettings, Banner, produto_categoria
 from forms import (
     LoginForm, ProdutoForm, CategoriaForm, SiteSettingsForm, BannerForm,
     IMG_ALLOWED
 )
+import search
+import facets
+import suggestions
+import listing
+import related
+import feeds
+from pagination import paginar_linhas, CursorInvalido
+from cache import CacheVersionado, VersaoCombinada, VersaoCompartilhada, monitorar_commits
+from page_cache import CachePaginas
+from sql_profiler import SQLProfiler
+from request_profiler import ProfilerRequisicoes
+from metrics import Metricas
+from order_queue import FilaPedidos
+from jobs import FilaTarefas
+from static_site import SiteEstatico
+from snapshot import SnapshotCatalogo
+from assets import Assets
+import assets
+import uploads
+import db_engine
+import images
 
 
 # --- Configuração Inicial ---
 
+class PublicFileSessionInterface(SecureCookieSessionInterface):
+    """
+    Não grava a sessão (nem adiciona 'Vary: Cookie') nas rotas de arquivos
+    públicos: o Flask-Login lê a sessão em toda resposta, e o 'Vary: Cookie'
+    impede CDNs/proxies de guardarem as imagens em cache.
+    """
+    sessionless_endpoints = {'uploaded_file', 'get_produto_data', 'get_produtos_data', 'metrics', 'asset',
+                             'sugestoes_busca', 'sitemap', 'sitemap_parte', 'feed_produtos'}
+
+    def save_session(self, app, session, response):
+        if request.endpoint in self.sessionless_endpoints and not session.modified:
+            return
+        super().save_session(app, session, response)
+
+
+class IdConverter(IntegerConverter):
+    """
+    '<id:produto_id>': como '<int:...>', mas só até facets.ID_MAX; um id maior
+    chegaria à consulta e o SQLite levantaria OverflowError (500 em vez de 404).
+    """
+
+    def __init__(self, map):
+        super().__init__(map, max=facets.ID_MAX)
+
 app = Flask(__name__)
 app.config.from_object(Config)
+app.session_interface = PublicFileSessionInterface()
+app.url_map.converters['id'] = IdConverter
 
 # Cria a pasta de UPLOADS se não existir
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # Inicializar DB e LoginManager
+db_engine.configurar(app) # Perfil do SQLite (WAL/pragmas/pools): antes do init_app
 db.init_app(app)
+db_engine.instalar(app, db)
+sql_profiler = SQLProfiler(app) # Conta as queries de cada requisição (Server-Timing)
+profiler = ProfilerRequisicoes(app, sql_profiler=sql_profiler) # cProfile sob demanda (?_perfil=) e das mais lentas
+metricas = Metricas(app, sql_profiler=sql_profiler) # /metrics (Prometheus), somado entre os workers
+arquivos_estaticos = Assets(app) # asset_url() e /assets/ (CSS/JS minificados, com hash e pré-comprimidos)
+fila_pedidos = FilaPedidos(app) # Grava os pedidos do checkout em lote (write-behind)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login_admin'
@@ -41,13 +106,93 @@ login_manager.login_message_category = 'error' # Categoria para flash message
 def load_user(user_id):
     return db.session.get(Admin, int(user_id))
 
+# Cache do contexto global (categorias + settings), compartilhado entre
+# requisições. A versão fica num arquivo para valer em todos os workers.
+site_context_cache = CacheVersionado(
+    'site_context',
+    VersaoCompartilhada(os.path.join(app.config['CACHE_DIR'], 'site_context.version'))
+)
+
+# Versão do catálogo: muda a cada commit que altera produtos, categorias,
+# imagens, banners ou configurações (de qualquer rota ou comando)
+catalogo_versao = VersaoCompartilhada(os.path.join(app.config['CACHE_DIR'], 'catalogo.version'))
+monitorar_commits(db.session, (Produto, Categoria, ImagemProduto, Banner, SiteSettings),
+                  catalogo_versao.incrementar)
+
+# Snapshot binário do catálogo, mapeado em memória por todos os workers (ver
+# snapshot.py): index, loja e a API de produtos leem dele enquanto está em dia
+snapshot_catalogo = SnapshotCatalogo(app, catalogo_versao,
+                                     engine=lambda: db.engines.get(db_engine.BIND_LEITURA, db.engine))
+
+def refazer_snapshot():
+    # Só nas requisições (admin): um comando CLI sairia antes de a thread terminar
+    if has_request_context():
+        snapshot_catalogo.agendar()
+
+monitorar_commits(db.session, (Produto, Categoria, ImagemProduto, Banner, SiteSettings), refazer_snapshot)
+
+# Site estático ('flask build-static'): anota as páginas afetadas por cada commit
+site_estatico = SiteEstatico(app, db)
+
+# Versão das variantes das imagens: muda quando as tarefas de imagem de um
+# produto (ou dos banners) terminam. Os srcsets das páginas dependem dela;
+# os dados do catálogo (facetas, sugestões, snapshot), não.
+variantes_versao = VersaoCompartilhada(os.path.join(app.config['CACHE_DIR'], 'variantes.version'))
+TAREFAS_IMAGEM = ('processar_imagem', 'excluir_imagem')
+
+def tarefa_concluida(tipo, referencia):
+    if tipo not in TAREFAS_IMAGEM:
+        catalogo_versao.incrementar() # Ex: relacionados recalculados (estão no snapshot e nos modais)
+    elif not fila_tarefas.em_aberto(referencia, TAREFAS_IMAGEM):
+        variantes_versao.incrementar() # Uma vez só, quando a última imagem da referência fica pronta
+    site_estatico.registrar_tarefa(referencia)
+
+# Processamento de imagens em segundo plano (variantes, exclusões). Quando
+# as tarefas de imagem terminam, as páginas em cache (e as do site estático)
+# são refeitas com os novos srcsets.
+fila_tarefas = FilaTarefas(app, ao_concluir=tarefa_concluida)
+
+# Cache do HTML das páginas públicas (index, sobre, loja)
+page_cache = CachePaginas(
+    VersaoCombinada(catalogo_versao, variantes_versao),
+    max_entradas=app.config['PAGE_CACHE_MAX_ENTRIES'],
+    stale_max=app.config['PAGE_CACHE_STALE_MAX'],
+    max_age=app.config['PAGE_CACHE_MAX_AGE']
+)
+page_cache.ativo = app.config['PAGE_CACHE_ENABLED']
+
+# Índice das facetas da loja (bitsets por categoria/faixa de preço/destaque),
+# refeito quando a versão do catálogo muda
+facetas_cache = CacheVersionado('facetas', catalogo_versao)
+FAIXAS_PRECO = facets.faixas_preco(app.config['FACETAS_FAIXAS_PRECO'])
+
+# Índice de prefixos dos nomes (sugestões da busca), também refeito quando o catálogo muda
+sugestoes_cache = CacheVersionado('sugestoes', catalogo_versao)
+
+# Colunas ordenáveis da tabela de produtos do admin (o id desempata;
+# cada combinação tem índice no read model da listagem)
+ORDENACOES_ADMIN = {
+    'id': (listing.listagem.c.id,),
+    'nome': (listing.listagem.c.nome, listing.listagem.c.id),
+    'preco': (listing.listagem.c.preco, listing.listagem.c.id),
+    'destaque': (listing.listagem.c.destaque, listing.listagem.c.id),
+}
+
+# Cópia leve da categoria (o cache não pode guardar objetos da sessão do SQLAlchemy)
+CategoriaResumo = namedtuple('CategoriaResumo', ['id', 'nome'])
+
 # --- Funções Helper ---
 
-def get_site_context():
-    """Função helper para carregar dados globais do site."""
-    categorias = Categoria.query.order_by(Categoria.nome).all()
-    settings_db = SiteSettings.query.all()
-    settings = {s.chave: s.valor for s in settings_db}
+def carregar_site_context():
+    """Dados globais do site, do snapshot do catálogo ou do DB."""
+    snapshot = snapshot_catalogo.atual()
+    if snapshot is not None:
+        categorias = [CategoriaResumo(*c) for c in snapshot.categorias]
+        settings = dict(snapshot.configuracoes)
+    else:
+        categorias = [CategoriaResumo(c.id, c.nome)
+                      for c in Categoria.query.order_by(Categoria.nome).all()]
+        settings = {s.chave: s.valor for s in SiteSettings.query.all()}
     settings.setdefault('whatsapp_number', app.config['WHATSAPP_NUMBER'])
     settings.setdefault('texto_footer', '© 2025 Sua Loja.')
     settings.setdefault('sobre_nos', 'Bem-vindo à nossa loja.')
@@ -56,35 +201,127 @@ def get_site_context():
         "settings": settings
     }
 
-def save_image(file_storage):
-    """Salva um arquivo de imagem e retorna seu nome único."""
-    if not file_storage or file_storage.filename == '':
-        return None
-    
-    # Pega a extensão
-    ext = file_storage.filename.rsplit('.', 1)[1].lower()
-    if ext not in IMG_ALLOWED:
-        return None # Ou lançar um erro
-        
-    # Cria um nome de arquivo único
-    filename = secure_filename(f"{uuid.uuid4().hex}.{ext}")
-    
-    # Salva o arquivo
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file_storage.save(file_path)
-    
-    return filename # Retorna apenas o nome do arquivo (ex: 'abc123def.jpg')
+def get_site_context():
+    """Função helper para carregar dados globais do site (com cache)."""
+    context = site_context_cache.obter(carregar_site_context)
+    # Cópia rasa: as rotas/templates não alteram o dict guardado no cache
+    return {
+        "categorias": context["categorias"],
+        "settings": dict(context["settings"])
+    }
 
-def delete_image(filename):
-    """Exclui um arquivo de imagem da pasta de uploads."""
+def save_images(file_storages, perfil='produto', referencia=None):
+    """
+    Salva os arquivos de imagem e retorna seus nomes, que são o hash do
+    conteúdo (ver uploads.py): a mesma foto enviada de novo reaproveita o
+    arquivo. Arquivos vazios ou de extensão não permitida são ignorados.
+    A conferência das imagens e as variantes responsivas ('perfil':
+    'produto' ou 'banner') ficam para tarefas em segundo plano (um INSERT
+    só para todas); até elas terminarem, o site usa o original.
+    """
+    filenames = []
+    for file_storage in file_storages:
+        if not file_storage or file_storage.filename == '':
+            continue
+
+        # Pega a extensão
+        ext = uploads.extensao(file_storage.filename)
+        if ext not in IMG_ALLOWED:
+            continue
+
+        # Salva o arquivo com o nome do hash (se já existir, nada é gravado)
+        filename, novo = uploads.salvar(file_storage.stream, ext, app.config['UPLOAD_FOLDER'])
+        deduplicado = 'false' if novo else 'true'
+        metricas.contar('modaafro_uploads_saved_total', deduplicated=deduplicado)
+        metricas.contar('modaafro_uploads_saved_bytes_total',
+                        os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER'], filename)),
+                        deduplicated=deduplicado)
+        filenames.append(filename) # Apenas o nome do arquivo (ex: 'abc123def.jpg')
+
+    # Gera as versões menores (WebP + JPEG) em segundo plano. Se o arquivo já
+    # existia, só faltam as variantes de um perfil novo (ex: foto de produto
+    # usada num banner); as que existem não são refeitas.
+    fila_tarefas.enfileirar_varias('processar_imagem', referencia,
+                                   [{'filename': f, 'perfil': perfil} for f in dict.fromkeys(filenames)])
+    return filenames
+
+def save_image(file_storage, perfil='produto', referencia=None):
+    """Como 'save_images', para um arquivo só: retorna o nome ou None."""
+    filenames = save_images([file_storage], perfil, referencia)
+    return filenames[0] if filenames else None
+
+def add_imagens_produto(produto_id, filenames):
+    """Grava as linhas de ImagemProduto dos arquivos num único INSERT (sem commit)."""
+    if filenames:
+        db.session.execute(db.insert(ImagemProduto),
+                           [{'url_imagem': f, 'produto_id': produto_id} for f in filenames])
+
+def srcset_imagem(filename, uso, formato='jpeg'):
+    """String 'srcset' com as variantes de um uso (ex: 'card'); '' se não houver."""
+    if not filename:
+        return ''
+    larguras = images.larguras_disponiveis(app.config['UPLOAD_FOLDER'], filename, uso, formato,
+                                           versao=variantes_versao.atual())
+    return ', '.join(
+        f"{url_for('uploaded_file', filename=images.nome_variante(filename, w, formato))} {w}w"
+        for w in larguras
+    )
+
+def url_variante(filename, uso, formato='jpeg'):
+    """URL da menor variante de um uso, ou do original se não houver variantes."""
     if not filename:
+        return None
+    larguras = images.larguras_disponiveis(app.config['UPLOAD_FOLDER'], filename, uso, formato,
+                                           versao=variantes_versao.atual())
+    if larguras:
+        filename = images.nome_variante(filename, larguras[0], formato)
+    return url_for('uploaded_file', filename=filename)
+
+def srcsets_imagem(filename, uso):
+    """Dict {formato: srcset} para as APIs JSON (só formatos existentes)."""
+    srcsets = {}
+    for formato in images.formatos_suportados(app.config['IMAGE_VARIANT_FORMATS']):
+        srcset = srcset_imagem(filename, uso, formato)
+        if srcset:
+            srcsets[formato] = srcset
+    return srcsets
+
+@app.context_processor
+def inject_image_helpers():
+    return {
+        "srcset_imagem": srcset_imagem,
+        "url_variante": url_variante,
+        "image_formats": [f for f in images.formatos_suportados(app.config['IMAGE_VARIANT_FORMATS'])
+                          if f != 'jpeg'],
+        "image_mime": images.MIME
+    }
+
+def delete_images(filenames, referencia=None):
+    """
+    Agenda a exclusão dos arquivos de imagem (e variantes) da pasta de
+    uploads que nenhuma imagem, destaque ou banner usa mais. Chame uma vez,
+    depois de remover as linhas (a conferência já enxerga a exclusão). As
+    tarefas entram na transação da rota: só rodam se ela for salva.
+    """
+    filenames = {f for f in filenames if f}
+    if not filenames:
         return
-    try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except Exception as e:
-        print(f"Erro ao excluir imagem {filename}: {e}") # Logar o erro
+    db.session.flush()
+    # Os que ainda são usados são compartilhados (mesmo conteúdo em outro produto ou banner)
+    usados = uploads.referenciados(filenames)
+    # 'agendada_em': se o mesmo conteúdo for enviado de novo antes da tarefa
+    # rodar, o mtime do arquivo fica mais novo e a exclusão é cancelada
+    agendada_em = time.time()
+    fila_tarefas.enfileirar_varias('excluir_imagem', referencia,
+                                   [{'filename': f, 'agendada_em': agendada_em} for f in sorted(filenames - usados)])
+
+def atualizar_relacionados(produto_id):
+    """
+    Agenda o recálculo dos relacionados de um produto criado, alterado ou
+    excluído (e das listas dos produtos afetados). Também entra na
+    transação da rota.
+    """
+    fila_tarefas.enfileirar('atualizar_relacionados', f'produto:{produto_id}', produto_id=produto_id)
 
 
 # --- Comandos CLI (Já existentes) ---
@@ -93,8 +330,252 @@ def init_db_command():
     """Cria as tabelas do banco de dados."""
     with app.app_context():
         db.create_all()
+        # 'create_all' não cria índices novos em tabelas que já existem
+        for tabela in db.metadata.sorted_tables:
+            for indice in tabela.indexes:
+                indice.create(db.engine, checkfirst=True)
+        # Nem colunas novas (anuláveis, como 'tarefa.batimento_em')
+        inspetor = db.inspect(db.engine)
+        for tabela in db.metadata.sorted_tables:
+            existentes = {c['name'] for c in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name not in existentes and coluna.nullable:
+                    tipo = coluna.type.compile(dialect=db.engine.dialect)
+                    with db.engine.begin() as conexao:
+                        conexao.exec_driver_sql(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}')
+                    print(f"Coluna {tabela.name}.{coluna.name} adicionada.")
+        search.criar_indice()
+        if listing.precisa_reconstruir():
+            # Banco de antes do read model da listagem: preenche a partir dos produtos
+            print(f"Listagem da loja preenchida: {listing.reconstruir()} produtos.")
+        if related.precisa_reconstruir(db.session):
+            resumo = related.reconstruir(db.session.connection(), app.config['RELATED_PRODUCTS_K'])
+            db.session.commit()
+            print(f"Produtos relacionados calculados: {resumo['produtos']} produtos.")
         print("Banco de dados inicializado.")
 
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Reconstrói o índice de busca (FTS5) dos produtos."""
+    with app.app_context():
+        total = search.reconstruir_indice()
+        print(f"Índice de busca reconstruído: {total} produtos.")
+
+@app.cli.command("rebuild-listing")
+def rebuild_listing_command():
+    """Reconstrói o read model das listagens da loja (tabela produto_listagem)."""
+    with app.app_context():
+        total = listing.reconstruir()
+        catalogo_versao.incrementar()
+        print(f"Listagem da loja reconstruída: {total} produtos.")
+
+@app.cli.command("generate-image-variants")
+@click.option('--force', is_flag=True, help='Regera mesmo as variantes que já existem.')
+def generate_image_variants_command(force):
+    """Gera as variantes responsivas das imagens já enviadas (backfill)."""
+    with app.app_context():
+        pasta = app.config['UPLOAD_FOLDER']
+        formatos = app.config['IMAGE_VARIANT_FORMATS']
+
+        # (arquivo, perfil) de tudo o que está referenciado no DB
+        arquivos = {}
+        for (url,) in db.session.execute(db.select(ImagemProduto.url_imagem)).yield_per(1000):
+            arquivos[url] = 'produto'
+        for (url,) in db.session.execute(
+                db.select(Produto.imagem_destaque_url).where(Produto.imagem_destaque_url.isnot(None))
+        ).yield_per(1000):
+            arquivos.setdefault(url, 'produto')
+        for (url,) in db.session.execute(db.select(Banner.imagem_url)):
+            arquivos[url] = 'banner'
+
+        total, erros = 0, 0
+        for filename, perfil in arquivos.items():
+            if not os.path.exists(os.path.join(pasta, filename)):
+                continue
+            try:
+                total += len(images.gerar_variantes(pasta, filename, perfil,
+                                                    formatos=formatos, sobrescrever=force))
+            except Exception as e:
+                erros += 1
+                print(f"Erro ao gerar variantes de {filename}: {e}")
+        variantes_versao.incrementar() # Workers e cache de páginas passam a ver as novas variantes
+        print(f"{total} variantes geradas para {len(arquivos)} imagens ({erros} erros).")
+
+@app.cli.command("seed-catalog")
+@click.option('--produtos', default=1000, show_default=True, help='Quantidade de produtos.')
+@click.option('--categorias', default=20, show_default=True, help='Quantidade de categorias.')
+@click.option('--imagens', default=3, show_default=True, help='Imagens por produto.')
+@click.option('--banners', default=4, show_default=True, help='Quantidade de banners.')
+@click.option('--seed', default=42, show_default=True, help='Semente (mesma semente, mesmo catálogo).')
+def seed_catalog_command(produtos, categorias, imagens, banners, seed):
+    """Popula o banco com um catálogo sintético (para benchmarks)."""
+    from benchmark import gerar_catalogo_sintetico
+    with app.app_context():
+        inicio = time.perf_counter()
+        criados = gerar_catalogo_sintetico(produtos, categorias, imagens, banners,
+                                           app.config['UPLOAD_FOLDER'], seed=seed)
+        # As inserções em lote não passam pelas rotas: atualiza índices e caches
+        search.reconstruir_indice()
+        site_context_cache.invalidar()
+        catalogo_versao.incrementar()
+        print(f"Catálogo sintético criado em {time.perf_counter() - inicio:.1f}s: {criados}")
+
+@app.cli.command("import-catalog")
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='Padrão: pela extensão do arquivo.')
+@click.option('--imagens', 'pasta_imagens', type=click.Path(exists=True, file_okay=False),
+              help='Pasta de onde vêm as imagens listadas no arquivo.')
+@click.option('--lote', default=1000, show_default=True, help='Produtos por transação.')
+@click.option('--workers', type=int, help='Processos para as imagens (padrão: núcleos da CPU).')
+@click.option('--do-inicio', is_flag=True, help='Ignora o progresso salvo e importa tudo de novo.')
+def import_catalog_command(arquivo, formato, pasta_imagens, lote, workers, do_inicio):
+    """Importa produtos em massa de um CSV/JSONL (retoma se for interrompido)."""
+    import catalog_io
+    with app.app_context():
+        inicio = time.perf_counter()
+        resumo = catalog_io.importar(
+            arquivo, formato=formato, pasta_imagens=pasta_imagens,
+            pasta_uploads=app.config['UPLOAD_FOLDER'],
+            formatos_imagem=app.config['IMAGE_VARIANT_FORMATS'],
+            tamanho_lote=lote, workers=workers, retomar=not do_inicio)
+        site_context_cache.invalidar() # Categorias novas aparecem no menu
+        print(f"Importação concluída em {time.perf_counter() - inicio:.1f}s: {resumo}")
+
+@app.cli.command("export-catalog")
+@click.argument('arquivo')
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='Padrão: pela extensão do arquivo.')
+def export_catalog_command(arquivo, formato):
+    """Exporta o catálogo para CSV/JSONL ('-' para a saída padrão)."""
+    import catalog_io
+    with app.app_context():
+        total = catalog_io.exportar(arquivo, formato=formato)
+        if arquivo != '-':
+            print(f"{total} produtos exportados para {arquivo}.")
+
+@app.cli.command("recover-orders")
+def recover_orders_command():
+    """Grava no banco os pedidos que ficaram nos diários (rode com o servidor parado)."""
+    with app.app_context():
+        total = fila_pedidos.recuperar()
+        print(f"{total} pedidos recuperados.")
+
+@app.cli.command("run-jobs")
+@click.option('--workers', type=int, help='Processos do pool (padrão: JOBS_WORKERS).')
+@click.option('--ate-esvaziar', is_flag=True, help='Sai quando não houver mais tarefas pendentes.')
+def run_jobs_command(workers, ate_esvaziar):
+    """Executa as tarefas em segundo plano (use com JOBS_EMBEDDED=0 nos workers web)."""
+    import signal
+    if workers:
+        app.config['JOBS_WORKERS'] = workers
+    # Ctrl+C / SIGTERM: termina as tarefas em andamento antes de sair
+    signal.signal(signal.SIGTERM, lambda *_: fila_tarefas.parar())
+    signal.signal(signal.SIGINT, lambda *_: fila_tarefas.parar())
+    print(f"Executando tarefas com {app.config['JOBS_WORKERS']} processos...")
+    fila_tarefas.executar(ate_esvaziar=ate_esvaziar)
+    print(f"Fim: {fila_tarefas.executadas} tarefas concluídas, {fila_tarefas.falhas} falhas.")
+
+@app.cli.command("build-static")
+@click.option('--destino', type=click.Path(file_okay=False), help='Pasta do site (padrão: STATIC_EXPORT_DIR).')
+@click.option('--incremental', is_flag=True, help='Refaz só as páginas alteradas desde a última geração.')
+@click.option('--intervalo', type=float, help='Fica rodando e repete a geração incremental a cada N segundos.')
+def build_static_command(destino, incremental, intervalo):
+    """Gera a vitrine (index, sobre, loja, categorias, JSON dos produtos e uploads) em arquivos estáticos."""
+    destino = destino or app.config['STATIC_EXPORT_DIR']
+    if not destino:
+        raise click.UsageError("Informe --destino ou defina STATIC_EXPORT_DIR.")
+    page_cache.ativo = False # Sempre o HTML atual, nunca uma cópia ainda em cache
+    while True:
+        with app.app_context():
+            resumo = site_estatico.construir(produto_detalhe, carregar_produtos, destino,
+                                             incremental=incremental or bool(intervalo))
+        if not intervalo or resumo['paginas'] or resumo['produtos'] or resumo['removidos']:
+            print(f"Site em {destino}: {resumo['paginas']} páginas, {resumo['produtos']} produtos, "
+                  f"{resumo['removidos']} removidos, {resumo['arquivos']} arquivos copiados "
+                  f"({resumo['segundos']}s).")
+        if not intervalo:
+            break
+        time.sleep(intervalo)
+
+@app.cli.command("build-assets")
+@click.option('--limpar', is_flag=True, help='Apaga os arquivos de builds anteriores.')
+def build_assets_command(limpar):
+    """Minifica o CSS/JS, põe o hash no nome e grava as versões .gz/.br em ASSETS_DIR."""
+    _, relatorio = assets.construir(app.static_folder, app.config['ASSETS_DIR'],
+                                    app.config['ASSETS_FILES'], limpar=limpar)
+    catalogo_versao.incrementar() # Páginas em cache dos workers no ar passam a usar os novos nomes
+    for arquivo, original, minificado, gz, br in relatorio:
+        br = f", br {br / 1024:.1f} KB" if br is not None else ""
+        print(f"{arquivo}: {original / 1024:.1f} KB -> {minificado / 1024:.1f} KB "
+              f"(gzip {gz / 1024:.1f} KB{br})")
+    if assets.brotli is None:
+        print("Módulo 'brotli' não instalado: só as versões .gz foram geradas.")
+    print(f"Manifesto em {os.path.join(app.config['ASSETS_DIR'], 'manifest.json')}.")
+
+@app.cli.command("build-related")
+def build_related_command():
+    """Recalcula os produtos relacionados de todo o catálogo (TF-IDF do nome/descrição + categorias)."""
+    with app.app_context():
+        resumo = related.reconstruir(db.session.connection(), app.config['RELATED_PRODUCTS_K'])
+        db.session.commit()
+    catalogo_versao.incrementar()
+    motor = "NumPy" if resumo['numpy'] else "Python puro (instale o numpy para acelerar)"
+    print(f"{resumo['pares']} relacionados para {resumo['produtos']} produtos, "
+          f"{resumo['termos']} termos ({motor}, {resumo['segundos']}s).")
+
+@app.cli.command("build-feeds")
+@click.option('--destino', type=click.Path(file_okay=False),
+              help='Pasta dos arquivos (padrão: FEEDS_EXPORT_DIR ou STATIC_EXPORT_DIR).')
+@click.option('--url-base', help='Endereço público do site, ex: https://modaafro.com.br (padrão: SITE_URL).')
+def build_feeds_command(destino, url_base):
+    """Grava sitemap.xml e feed de produtos (CSV/XML), com as versões .gz, para o nginx servir."""
+    destino = destino or app.config['FEEDS_EXPORT_DIR'] or app.config['STATIC_EXPORT_DIR']
+    url_base = url_base or app.config['SITE_URL']
+    if not destino:
+        raise click.UsageError("Informe --destino ou defina FEEDS_EXPORT_DIR/STATIC_EXPORT_DIR.")
+    if not url_base:
+        raise click.UsageError("Informe --url-base ou defina SITE_URL (o sitemap usa URLs absolutas).")
+    lote, nivel = app.config['FEEDS_BATCH'], app.config['FEEDS_GZIP_LEVEL']
+    inicio = time.perf_counter()
+    with app.test_request_context(base_url=url_base): # 'url_for' com o endereço público
+        arquivos = {'sitemap.xml': feeds.gerar_sitemap(db.session, lote=lote)}
+        total = feeds.total_sitemaps(db.session)
+        if total > 1:
+            for pagina in range(1, total + 1):
+                arquivos[f'sitemap-{pagina}.xml'] = feeds.gerar_sitemap(db.session, pagina, lote)
+        for formato, gerar in feeds.GERADORES_FEED.items():
+            arquivos[f'feed/produtos.{formato}'] = gerar(db.session, lote)
+        for nome, pedacos in arquivos.items():
+            tamanho = feeds.gravar(os.path.join(destino, nome), pedacos, nivel)
+            print(f"{nome}: {tamanho / 1024:.1f} KB")
+    print(f"Arquivos em {destino} ({time.perf_counter() - inicio:.1f}s).")
+
+@app.cli.command("build-snapshot")
+def build_snapshot_command():
+    """Gera o snapshot binário do catálogo (SNAPSHOT_PATH) que os workers mapeiam em memória."""
+    with app.app_context():
+        resumo = snapshot_catalogo.construir()
+    print(f"Snapshot em {snapshot_catalogo.caminho}: {resumo['produtos']} produtos, "
+          f"{resumo['bytes'] / 1024:.1f} KB ({resumo['segundos']}s).")
+
+@app.cli.command("gc-uploads")
+@click.option('--carencia', type=int, help='Ignora arquivos mais novos que N segundos (padrão: UPLOADS_GC_CARENCIA).')
+@click.option('--simular', is_flag=True, help='Só mostra o que seria apagado.')
+def gc_uploads_command(carencia, simular):
+    """Apaga uploads que nenhum produto ou banner usa (e as variantes deles)."""
+    with app.app_context():
+        resumo = uploads.coletar_lixo(
+            app.config['UPLOAD_FOLDER'],
+            carencia=app.config['UPLOADS_GC_CARENCIA'] if carencia is None else carencia,
+            simular=simular
+        )
+    if not simular:
+        variantes_versao.incrementar() # Variantes apagadas saem dos srcsets de todos os workers
+    verbo = "seriam apagados" if simular else "apagados"
+    liberado = resumo['bytes'] / 1024
+    liberado = f"{liberado / 1024:.1f} MB" if liberado >= 1024 else f"{liberado:.1f} KB"
+    print(f"{resumo['arquivos']} uploads, {resumo['variantes']} variantes e {resumo['temporarios']} "
+          f"temporários {verbo} ({liberado}).")
+
 @app.cli.command("create-admin")
 def create_admin_command():
     """Cria o usuário administrador inicial."""
@@ -113,95 +594,466 @@ def create_admin_command():
         db.session.add(SiteSettings(chave='sobre_nos', valor='Escreva aqui sobre sua loja.'))
 
         db.session.commit()
+        site_context_cache.invalidar()
         print("Usuário 'admin' criado com senha 'admin123'.")
 
 
 # --- Rotas do Cliente (Públicas) ---
 
 @app.route('/')
+@page_cache()
 def index():
     """Página Inicial (Homepage)"""
     context = get_site_context()
-    banners = Banner.query.order_by(Banner.ordem).all()
-    produtos_destaque = Produto.query.filter_by(destaque=True).limit(8).all()
+    snapshot = snapshot_catalogo.atual()
+    if snapshot is not None:
+        banners = snapshot.banners
+        produtos_destaque = snapshot.destaques(8)
+    else:
+        banners = Banner.query.order_by(Banner.ordem).all()
+        produtos_destaque = Produto.query.filter_by(destaque=True) \
+            .options(selectinload(Produto.imagens)).limit(8).all()
+
+    # Produtos lincados nos banners ("#product-modal-trigger-<id>")
+    ids_banners = {facets.ler_id(b.link_url.rsplit('-', 1)[1]) for b in banners
+                   if b.link_url and b.link_url.startswith('#product-modal-trigger-')} - {None}
     
     return render_template('index.html', 
                            **context, 
                            banners=banners, 
-                           produtos=produtos_destaque)
+                           produtos=produtos_destaque,
+                           produtos_detalhes=detalhes_embutidos(produtos_destaque, ids_banners))
 @app.route('/sobre')
+@page_cache()
 def sobre():
     """Página Sobre Nós"""
     context = get_site_context() # Pega as configs (incluindo 'sobre_nos')
     return render_template('sobre.html', **context)
 
-@app.route('/produto/<int:produto_id>')
+def produto_detalhe(produto, relacionados=None):
+    """
+    Dados completos de um produto (modal). 'produto.imagens' já deve estar
+    carregado; 'relacionados' (ver carregar_relacionados) é lido se não vier.
+    """
+    if relacionados is None:
+        relacionados = carregar_relacionados([produto.id])[produto.id]
+    return {
+        "id": produto.id,
+        "nome": produto.nome,
+        "descricao": produto.descricao,
+        "preco": f"{produto.preco:.2f}",
+        "imagem_destaque": url_for('uploaded_file', filename=produto.imagem_destaque_url) if produto.imagem_destaque_url else None,
+        "imagens": [url_for('uploaded_file', filename=img.url_imagem) for img in produto.imagens],
+        # Versões responsivas: 'srcset' por formato para a imagem grande
+        # e a miniatura leve de cada imagem para a galeria
+        "imagem_destaque_srcset": srcsets_imagem(produto.imagem_destaque_url, 'modal'),
+        "imagens_variantes": [
+            {
+                "url": url_for('uploaded_file', filename=img.url_imagem),
+                "thumb": url_variante(img.url_imagem, 'thumb'),
+                "srcset": srcsets_imagem(img.url_imagem, 'modal')
+            }
+            for img in produto.imagens
+        ],
+        "relacionados": [produto_resumo(r) for r in relacionados]
+    }
+
+def carregar_relacionados(ids):
+    """Cards dos produtos relacionados de cada produto (dict por id), numa consulta."""
+    snapshot = snapshot_catalogo.atual()
+    if snapshot is not None:
+        return snapshot.relacionados(ids, app.config['RELATED_PRODUCTS_K'])
+    return related.relacionados(db.session, ids, app.config['RELATED_PRODUCTS_K'])
+
+def carregar_produtos(ids):
+    """Carrega vários produtos, já com as imagens, numa única consulta (dict por id)."""
+    if not ids:
+        return {}
+    snapshot = snapshot_catalogo.atual()
+    if snapshot is not None:
+        return snapshot.produtos(ids)
+    produtos = db.session.scalars(
+        db.select(Produto)
+        .where(Produto.id.in_(ids))
+        .options(selectinload(Produto.imagens))
+    ).all()
+    return {p.id: p for p in produtos}
+
+def json_com_cache(data):
+    """Resposta JSON pública com ETag (304 se o cliente já tem) e Cache-Control."""
+    response = jsonify(data)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['PRODUTO_JSON_MAX_AGE']
+    response.add_etag()
+    return response.make_conditional(request)
+
+def detalhes_embutidos(produtos, ids_extras=()):
+    """
+    Detalhes dos produtos da página para embutir no HTML, assim o modal
+    abre sem ir ao servidor. 'produtos' já vem com as imagens carregadas;
+    'ids_extras' (ex: produtos lincados nos banners) são buscados juntos.
+    """
+    if not app.config['EMBED_PRODUCT_DETAILS']:
+        return None
+    produtos = {p.id: p for p in produtos}
+    produtos.update(carregar_produtos([i for i in ids_extras if i not in produtos]))
+    relacionados = carregar_relacionados(list(produtos))
+    return {i: produto_detalhe(p, relacionados[i]) for i, p in produtos.items()}
+
+@app.route('/produto/<id:produto_id>')
 def get_produto_data(produto_id):
     """API para buscar dados do produto."""
-    produto = db.session.get(Produto, produto_id)
+    produto = carregar_produtos([produto_id]).get(produto_id)
     if not produto:
         return jsonify({"error": "Produto não encontrado"}), 404
 
-    produto_data = {
+    return json_com_cache(produto_detalhe(produto))
+
+@app.route('/produtos')
+def get_produtos_data():
+    """API em lote: /produtos?ids=1,2,3 (uma consulta para todos)."""
+    pedidos = [i for valor in request.args.getlist('ids') for i in valor.split(',') if i.strip()]
+    # Conta antes de converter: uma URL com milhares de ids nem chega a ser lida
+    if len(pedidos) > app.config['PRODUTOS_BATCH_MAX']:
+        return jsonify({"error": f"No máximo {app.config['PRODUTOS_BATCH_MAX']} produtos por chamada"}), 400
+    ids = [facets.ler_id(i) for i in pedidos] # Só dígitos ASCII, até o maior id do SQLite
+    if None in ids:
+        return jsonify({"error": "Parâmetro 'ids' inválido"}), 400
+    ids = list(dict.fromkeys(ids)) # Remove repetidos, mantendo a ordem
+    if not ids:
+        return jsonify({"error": "Informe os produtos em 'ids'"}), 400
+
+    produtos = carregar_produtos(ids)
+    relacionados = carregar_relacionados(list(produtos))
+    return json_com_cache({
+        "produtos": [produto_detalhe(produtos[i], relacionados[i]) for i in ids if i in produtos],
+        "nao_encontrados": [i for i in ids if i not in produtos]
+    })
+
+def filtrar_produtos(args):
+    """
+    Monta o SELECT da listagem da loja a partir dos filtros da URL
+    (usado pela página /loja e pela API de listagem). Lê do read model
+    'produto_listagem' (ver listing.py): linhas leves, sem entidades do ORM.
+
+    Retorna (select, ordem, selecao); 'ordem' é a chave de ordenação usada
+    na paginação por cursor e 'selecao' são as facetas escolhidas.
+    """
+    # Pega os parâmetros da URL (ex: /loja?q=camiseta&categoria_id=1&categoria_id=3&preco=0-50)
+    query_pesquisa = args.get('q')
+    categorias_validas = {c.id for c in get_site_context()["categorias"]}
+    selecao = facets.Selecao.da_url(args, categorias_validas, FAIXAS_PRECO)
+
+    # Começa com as colunas dos cards de todos os produtos
+    colunas = listing.listagem.c
+    query_produtos = listing.selecionar_cards()
+    # Ordem alfabética; o 'id' desempata nomes iguais (a chave precisa ser única)
+    ordem = [colunas.nome, colunas.id]
+
+    # 1. Filtro por Pesquisa (Query)
+    if query_pesquisa:
+        # Busca no índice FTS5 (ignora acentos), ordenada por relevância
+        query_produtos, rank = search.aplicar_busca(query_produtos, query_pesquisa, coluna_id=colunas.id)
+        if rank is not None:
+            query_produtos = query_produtos.add_columns(rank) # A paginação lê a chave das linhas
+            ordem = [rank] + ordem
+
+    # 2. Facetas: categorias, faixas de preço e destaque
+    query_produtos = facets.filtrar(query_produtos, selecao, FAIXAS_PRECO)
+
+    return query_produtos, ordem, selecao
+
+def contar_facetas(selecao, query_pesquisa):
+    """Contagens da barra lateral, pelo índice de facetas (sem COUNT no banco)."""
+    indice = facetas_cache.obter(lambda: facets.IndiceFacetas.construir(FAIXAS_PRECO))
+    base = None
+    if query_pesquisa:
+        # Produtos que casam com a busca viram um bitset, cruzado com as facetas
+        query_busca, _ = search.aplicar_busca(Produto.query, query_pesquisa)
+        base = facets.bitset(id_ for (id_,) in query_busca.with_entities(Produto.id))
+    return indice.contar(selecao, base)
+
+def produto_resumo(produto):
+    """Dados de um produto para o card da listagem (JSON); aceita as linhas do read model."""
+    return {
         "id": produto.id,
         "nome": produto.nome,
-        "descricao": produto.descricao,
         "preco": f"{produto.preco:.2f}",
         "imagem_destaque": url_for('uploaded_file', filename=produto.imagem_destaque_url) if produto.imagem_destaque_url else None,
-        "imagens": [url_for('uploaded_file', filename=img.url_imagem) for img in produto.imagens]
+        "imagem_srcset": srcsets_imagem(produto.imagem_destaque_url, 'card')
     }
-    return jsonify(produto_data)
+
 @app.route('/loja')
+@page_cache(permitidos=('q', 'categoria_id', 'preco', 'destaque', 'produto'))
 def loja():
-    """Página da Loja, com filtro e pesquisa."""
+    """
+    Página da Loja, com facetas e pesquisa (renderiza só a primeira página).
+    '?produto=<id>' (link do sitemap e do feed) abre já com o modal do produto.
+    """
     context = get_site_context()
     
-    # Pega os parâmetros da URL (ex: /loja?q=camiseta&categoria=1)
     query_pesquisa = request.args.get('q')
-    query_categoria = request.args.get('categoria_id')
+    query_produtos, ordem, selecao = filtrar_produtos(request.args)
+    pedidas = {facets.ler_id(v) for v in request.args.getlist('categoria_id')} - {None}
+    if len(pedidas) > len(selecao.categorias):
+        flash("Categoria não encontrada.") # Opcional
 
-    # Começa com uma query base para todos os produtos
-    query_produtos = Produto.query.order_by(Produto.nome)
-    
-    categoria_selecionada = None
-
-    # 1. Filtro por Categoria
-    if query_categoria:
-        try:
-            categoria_id = int(query_categoria)
-            categoria_selecionada = db.session.get(Categoria, categoria_id)
-            if categoria_selecionada:
-                # Filtra produtos que ESTÃO ('any') na categoria selecionada
-                query_produtos = query_produtos.filter(Produto.categorias.any(id=categoria_id))
-            else:
-                flash("Categoria não encontrada.") # Opcional
-        except ValueError:
-            pass # Ignora se o ID da categoria não for um número
-
-    # 2. Filtro por Pesquisa (Query)
-    if query_pesquisa:
-        # 'ilike' é case-insensitive (ignora maiúsculas/minúsculas)
-        search_term = f"%{query_pesquisa}%"
-        query_produtos = query_produtos.filter(
-            db.or_(
-                Produto.nome.ilike(search_term),
-                Produto.descricao.ilike(search_term)
-            )
+    # Executa a query, paginada por cursor (sem OFFSET)
+    try:
+        produtos_encontrados, proximo_cursor = paginar_linhas(
+            db.session, query_produtos, ordem,
+            cursor=request.args.get('cursor'),
+            limite=app.config['PRODUTOS_POR_PAGINA']
         )
-
-    # Finalmente, executa a query
-    produtos_encontrados = query_produtos.all()
-
+    except CursorInvalido:
+        return redirect(url_for('loja', q=query_pesquisa, **selecao.params()))
+
+    categorias_selecionadas = [c for c in context["categorias"] if c.id in selecao.categorias]
+    ids_detalhes = [p.id for p in produtos_encontrados]
+    produto_aberto = facets.ler_id(request.args.get('produto', '')) # Inválido conta como ausente
+    if produto_aberto:
+        ids_detalhes.append(produto_aberto)
     return render_template('loja.html',
                            **context,
                            produtos=produtos_encontrados,
-                           categoria_selecionada=categoria_selecionada,
-                           query_pesquisa=query_pesquisa)
+                           selecao=selecao,
+                           faixas_preco=FAIXAS_PRECO,
+                           contagens=contar_facetas(selecao, query_pesquisa),
+                           categoria_selecionada=categorias_selecionadas[0] if len(categorias_selecionadas) == 1 else None,
+                           query_pesquisa=query_pesquisa,
+                           proximo_cursor=proximo_cursor,
+                           # Detalhes do modal (descrição, imagens) só para os produtos da página
+                           produtos_detalhes=detalhes_embutidos((), ids_detalhes))
+
+@app.route('/loja/produtos')
+def loja_produtos():
+    """API de listagem da loja (mesmos filtros da /loja), para o scroll infinito."""
+    query_produtos, ordem, _ = filtrar_produtos(request.args)
+
+    try:
+        limite = min(int(request.args.get('limite', app.config['PRODUTOS_POR_PAGINA'])),
+                     app.config['PRODUTOS_POR_PAGINA_MAX'])
+    except ValueError:
+        return jsonify({"error": "Parâmetro 'limite' inválido"}), 400
+    if limite < 1:
+        return jsonify({"error": "Parâmetro 'limite' inválido"}), 400
+
+    try:
+        produtos, proximo_cursor = paginar_linhas(db.session, query_produtos, ordem,
+                                                  cursor=request.args.get('cursor'), limite=limite)
+    except CursorInvalido:
+        return jsonify({"error": "Cursor inválido"}), 400
+
+    return jsonify({
+        "produtos": [produto_resumo(p) for p in produtos],
+        "proximo_cursor": proximo_cursor
+    })
+
+@app.route('/loja/sugestoes')
+def sugestoes_busca():
+    """Sugestões da caixa de busca: produtos e categorias que começam com 'q' (índice em memória)."""
+    termo = request.args.get('q', '')
+    if len(termo.strip()) < app.config['SUGESTOES_MIN_CARACTERES']:
+        categorias, produtos = [], []
+    else:
+        indice = sugestoes_cache.obter(suggestions.IndiceSugestoes.construir)
+        categorias, produtos = indice.sugerir(termo, app.config['SUGESTOES_PRODUTOS'],
+                                              app.config['SUGESTOES_CATEGORIAS'])
+    response = jsonify({
+        "q": termo,
+        "categorias": [{"id": i, "nome": nome, "url": url_for('loja', categoria_id=i)} for i, nome in categorias],
+        "produtos": [{"id": i, "nome": nome} for i, nome in produtos]
+    })
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['SUGESTOES_MAX_AGE']
+    return response
+
+def resposta_streaming(pedacos, content_type):
+    """
+    Resposta gerada aos poucos (sitemap, feed), com gzip se o cliente aceitar.
+    'content_type' vai como está no header (já com o charset).
+
+    ETag/Last-Modified vêm da versão do catálogo, então um 304 sai antes de
+    qualquer consulta. 'pedacos' é uma função que devolve o gerador: só é
+    chamada se o corpo for mesmo enviado (e roda com o contexto da requisição).
+    """
+    versao = catalogo_versao.atual() or catalogo_versao.incrementar()
+    gzip_aceito = bool(request.accept_encodings['gzip'])
+    etag = hashlib.sha1(f"{versao}:{gzip_aceito}".encode()).hexdigest()
+    modificado = datetime.datetime.fromtimestamp(versao.mtime_ns // 10**9, datetime.timezone.utc)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modificado):
+        response = app.response_class(status=304)
+    else:
+        blocos = feeds.agrupar(pedacos())
+        if gzip_aceito:
+            blocos = feeds.comprimir(blocos, app.config['FEEDS_GZIP_LEVEL'])
+        response = app.response_class(stream_with_context(blocos), content_type=content_type)
+        if gzip_aceito:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.last_modified = modificado
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['FEEDS_MAX_AGE']
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/sitemap.xml')
+def sitemap():
+    """Sitemap da loja (ou o índice dos sitemaps, se o catálogo passar de 50.000 URLs)."""
+    return resposta_streaming(lambda: feeds.gerar_sitemap(db.session, lote=app.config['FEEDS_BATCH']),
+                              feeds.CONTENT_TYPE_SITEMAP)
+
+@app.route('/sitemap-<int:pagina>.xml')
+def sitemap_parte(pagina):
+    """Uma das partes listadas no índice do /sitemap.xml."""
+    if not 1 <= pagina <= feeds.total_sitemaps(db.session):
+        abort(404)
+    return resposta_streaming(lambda: feeds.gerar_sitemap(db.session, pagina, app.config['FEEDS_BATCH']),
+                              feeds.CONTENT_TYPE_SITEMAP)
+
+@app.route('/feed/produtos.<formato>')
+def feed_produtos(formato):
+    """Feed de produtos para marketplaces: id, nome, preço, link, imagem e categorias."""
+    if formato not in feeds.FORMATOS_FEED:
+        abort(404)
+    gerar = feeds.GERADORES_FEED[formato]
+    return resposta_streaming(lambda: gerar(db.session, app.config['FEEDS_BATCH']),
+                              feeds.FORMATOS_FEED[formato])
+
+def inteiro_json(valor):
+    """Inteiro vindo de um JSON: int (true/false não) ou texto só com dígitos; senão None."""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, str):
+        return facets.ler_id(valor)
+    return None
+
+def ler_carrinho(itens):
+    """
+    Valida os itens enviados ao checkout ([{"id": 1, "quantidade": 2}, ...]).
+    Retorna {produto_id: quantidade} na ordem do carrinho; ValueError se inválido.
+    """
+    if not isinstance(itens, list) or not itens:
+        raise ValueError("Carrinho vazio")
+    if len(itens) > app.config['CHECKOUT_ITENS_MAX']:
+        raise ValueError(f"No máximo {app.config['CHECKOUT_ITENS_MAX']} produtos por pedido")
+    quantidades = {}
+    for item in itens:
+        if not isinstance(item, dict):
+            raise ValueError("Item do carrinho inválido")
+        produto_id, quantidade = inteiro_json(item.get('id')), inteiro_json(item.get('quantidade', 1))
+        # O id vai para a consulta: fora do intervalo do SQLite, ela levantaria OverflowError
+        if produto_id is None or not 1 <= produto_id <= facets.ID_MAX or quantidade is None:
+            raise ValueError("Item do carrinho inválido")
+        quantidades[produto_id] = quantidades.get(produto_id, 0) + quantidade
+    if any(q < 1 or q > app.config['CHECKOUT_QUANTIDADE_MAX'] for q in quantidades.values()):
+        raise ValueError(f"Quantidade deve ser entre 1 e {app.config['CHECKOUT_QUANTIDADE_MAX']}")
+    return quantidades
+
+def mensagem_whatsapp(pedido):
+    """Texto do pedido para o WhatsApp (mesmo formato do antigo checkout no navegador)."""
+    mensagem = "Olá! Gostaria de fazer o seguinte pedido:\n\n"
+    for item in pedido['itens']:
+        subtotal = item['preco_unitario'] * item['quantidade']
+        mensagem += f"*Produto:* {item['nome']}\n"
+        mensagem += f"*Quantidade:* {item['quantidade']}\n"
+        mensagem += f"*Subtotal:* R$ {subtotal:.2f}\n"
+        mensagem += "--------------------\n"
+    mensagem += f"\n*TOTAL DO PEDIDO: R$ {pedido['total']:.2f}*"
+    mensagem += f"\n*Código do pedido:* {pedido['codigo']}"
+    return mensagem
+
+@app.route('/checkout', methods=['POST'])
+def checkout():
+    """
+    Fecha o pedido: recalcula o carrinho com os preços atuais do banco (uma
+    consulta só), registra o pedido e devolve o link do WhatsApp.
+    O pedido é gravado pela 'fila_pedidos' (em lote, logo em seguida), então
+    a resposta não espera pelo lock de escrita do banco.
+    """
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict): # JSON inválido, ou uma lista/valor solto no lugar do objeto
+        return jsonify({"error": "Pedido inválido"}), 400
+    try:
+        quantidades = ler_carrinho(dados.get('itens'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    encontrados = {p.id: p for p in db.session.execute(
+        db.select(Produto.id, Produto.nome, Produto.preco).where(Produto.id.in_(quantidades))
+    )}
+    itens = [{"produto_id": p.id, "nome": p.nome, "preco_unitario": round(p.preco, 2), "quantidade": q}
+             for p, q in ((encontrados.get(i), q) for i, q in quantidades.items()) if p]
+    removidos = [i for i in quantidades if i not in encontrados]
+    if not itens:
+        return jsonify({"error": "Nenhum dos produtos está mais disponível", "removidos": removidos}), 409
+
+    pedido = {
+        "codigo": uuid.uuid4().hex,
+        "criado_em": datetime.datetime.utcnow().isoformat(),
+        "total": round(sum(i['preco_unitario'] * i['quantidade'] for i in itens), 2),
+        "itens": itens,
+    }
+    fila_pedidos.enfileirar(pedido)
+
+    whatsapp = get_site_context()['settings']['whatsapp_number']
+    return jsonify({
+        "pedido": pedido['codigo'],
+        "itens": itens,
+        "total": pedido['total'],
+        "removidos": removidos,
+        "whatsapp_url": f"https://wa.me/{whatsapp}?text={urllib.parse.quote(mensagem_whatsapp(pedido))}"
+    }), 202
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    """Serve os arquivos de upload."""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """
+    Serve os arquivos de upload.
+
+    Os nomes vêm do 'save_image' (hash do conteúdo), então o conteúdo de um
+    nome nunca muda: mandamos Cache-Control longo + 'immutable', ETag
+    forte (304 em requisições condicionais) e aceitamos Range. Opcionalmente
+    o envio dos bytes fica com o proxy (X-Accel-Redirect / X-Sendfile).
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    # ETag pelo nome + tamanho (não pelo mtime): igual em todos os servidores
+    stat = os.stat(path)
+    etag = hashlib.sha1(f"{filename}:{stat.st_size}".encode()).hexdigest()
+
+    offload = app.config['UPLOADS_OFFLOAD']
+    environ = request.environ
+    if offload:
+        # Quem responde ao Range é o proxy; aqui só tratamos o condicional (304)
+        environ = {k: v for k, v in environ.items() if k != 'HTTP_RANGE'}
+
+    response = werkzeug_send_from_directory(
+        folder, filename, environ,
+        max_age=app.config['UPLOADS_MAX_AGE'],
+        etag=etag,
+        conditional=True,
+        use_x_sendfile=bool(offload)
+    )
+
+    if offload == 'x-accel' and 'X-Sendfile' in response.headers:
+        # nginx: 'location /_uploads/ { internal; alias .../static/uploads/; }'
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = app.config['UPLOADS_X_ACCEL_PREFIX'] + filename
+
+    if app.config['UPLOADS_MAX_AGE'] and app.config['UPLOADS_IMMUTABLE']:
+        response.cache_control.immutable = True
+
+    if response.status_code in (200, 206):
+        # Com offload o corpo sai do proxy: conta o arquivo inteiro
+        enviados = stat.st_size if offload else response.content_length
+        metricas.contar('modaafro_uploads_served_bytes_total', enviados or 0)
+    return response
 
 
 # --- Rotas do Admin (Protegidas) ---
@@ -233,14 +1085,126 @@ def logout_admin():
 def dashboard_admin():
     return render_template('admin/dashboard.html')
 
+@app.route('/admin/cache')
+@login_required
+def cache_stats_admin():
+    """Hits/misses dos caches e a fila de pedidos deste worker (cada processo tem os seus)."""
+    return jsonify({
+        "caches": [site_context_cache.estatisticas(), facetas_cache.estatisticas(),
+                   sugestoes_cache.estatisticas(), page_cache.estatisticas(),
+                   snapshot_catalogo.estatisticas()],
+        "filas": [fila_pedidos.estatisticas(), fila_tarefas.estatisticas()]
+    })
+
+@app.route('/admin/perfis')
+@login_required
+def perfis_admin():
+    """Requisições mais lentas entre as amostradas (PROFILER_SAMPLE_RATE) por este worker."""
+    return jsonify({
+        **profiler.estatisticas(),
+        "perfis": [{**resumo, "url": url_for('perfil_admin', perfil_id=resumo['id'])}
+                   for resumo in profiler.lentas()]
+    })
+
+@app.route('/admin/perfis/<int:perfil_id>')
+@login_required
+def perfil_admin(perfil_id):
+    """Perfil de uma requisição guardada: download .prof ou, com ?formato=texto, o resumo em texto."""
+    guardado = profiler.obter(perfil_id)
+    if guardado is None:
+        abort(404)
+    resumo, stats = guardado
+    return profiler.responder(resumo, stats, request.args.get('formato', 'prof'))
+
+@app.route('/admin/tarefas')
+@login_required
+def status_tarefas():
+    """Andamento das tarefas em segundo plano de um item (ex: ?referencia=produto:12)."""
+    referencia = request.args.get('referencia', '')
+    if not referencia:
+        return jsonify({"error": "Informe a 'referencia'"}), 400
+    return jsonify({"tarefas": fila_tarefas.situacao(referencia)})
+
 # --- CRUD de Produtos ---
 
 @app.route('/admin/produtos')
 @login_required
 def gerenciar_produtos():
-    produtos = Produto.query.order_by(Produto.id.desc()).all()
-    categorias = Categoria.query.all()
-    return render_template('admin/gerenciar_produtos.html', produtos=produtos, categorias=categorias)
+    """
+    Tabela de produtos, lida do read model da listagem: paginada por cursor,
+    ordenável por coluna (cada ordenação tem índice) e com filtros.
+    ?q=texto (ou id) &categoria_id=N &destaque=1|0 &ordenar=id|nome|preco|destaque &direcao=asc|desc
+    """
+    colunas = listing.listagem.c
+    ordenar = request.args.get('ordenar')
+    if ordenar not in ORDENACOES_ADMIN:
+        ordenar = 'id'
+    # Padrão: mais novos primeiro no id, ordem alfabética/crescente no resto
+    direcao = request.args.get('direcao') or ('desc' if ordenar == 'id' else 'asc')
+    if direcao not in ('asc', 'desc'):
+        direcao = 'asc'
+
+    filtros = {
+        'q': request.args.get('q', '').strip() or None,
+        'categoria_id': facets.ler_id(request.args.get('categoria_id', '')),
+        'destaque': request.args.get('destaque') if request.args.get('destaque') in ('0', '1') else None,
+    }
+    select = db.select(colunas.id, colunas.nome, colunas.preco, colunas.destaque, colunas.categoria_ids)
+    id_pesquisado = facets.ler_id(filtros['q'] or '')
+    if id_pesquisado is not None:
+        select = select.where(colunas.id == id_pesquisado)
+    elif filtros['q']:
+        select, _ = search.aplicar_busca(select, filtros['q'], coluna_id=colunas.id)
+    if filtros['categoria_id']:
+        select = facets.filtrar(select, facets.Selecao((filtros['categoria_id'],), (), False), FAIXAS_PRECO)
+    if filtros['destaque']:
+        select = select.where(colunas.destaque.is_(filtros['destaque'] == '1'))
+
+    total = db.session.scalar(db.select(db.func.count()).select_from(select.order_by(None).subquery()))
+    try:
+        produtos, proximo_cursor = paginar_linhas(
+            db.session, select, ORDENACOES_ADMIN[ordenar],
+            cursor=request.args.get('cursor'),
+            limite=app.config['ADMIN_PRODUTOS_POR_PAGINA'],
+            descendente=direcao == 'desc'
+        )
+    except CursorInvalido:
+        return redirect(url_for('gerenciar_produtos', ordenar=ordenar, direcao=direcao, **filtros))
+
+    # Nomes das categorias da tabela: vêm do contexto do site (em cache)
+    categorias = get_site_context()['categorias']
+    nomes_categorias = {c.id: c.nome for c in categorias}
+    return render_template('admin/gerenciar_produtos.html',
+                           produtos=produtos,
+                           total=total,
+                           proximo_cursor=proximo_cursor,
+                           primeira_pagina=not request.args.get('cursor'),
+                           ordenar=ordenar,
+                           direcao=direcao,
+                           filtros=filtros,
+                           categorias=categorias,
+                           nomes_categorias=nomes_categorias,
+                           ler_categorias=listing.ler_categorias)
+
+@app.route('/admin/produtos/sugestoes')
+@login_required
+def sugestoes_produtos_admin():
+    """Produtos para o campo com sugestões (ex: link do banner): ?q=texto ou id."""
+    termo = request.args.get('q', '').strip()
+    if not termo:
+        return jsonify({"produtos": []})
+    colunas = listing.listagem.c
+    select = db.select(colunas.id, colunas.nome, colunas.preco)
+    id_pesquisado = facets.ler_id(termo)
+    if id_pesquisado is not None:
+        select = select.where(colunas.id == id_pesquisado)
+    else:
+        select, rank = search.aplicar_busca(select, termo, coluna_id=colunas.id)
+        select = select.order_by(rank if rank is not None else colunas.nome, colunas.id)
+    linhas = db.session.execute(select.limit(app.config['ADMIN_SUGESTOES_MAX'])).all()
+    return jsonify({"produtos": [
+        {"id": p.id, "nome": p.nome, "preco": f"{p.preco:.2f}"} for p in linhas
+    ]})
 
 
 @app.route('/admin/categorias', methods=['GET', 'POST'])
@@ -261,6 +1225,7 @@ def gerenciar_categorias():
             nova_categoria = Categoria(nome=nome_categoria)
             db.session.add(nova_categoria)
             db.session.commit()
+            site_context_cache.invalidar()
             flash('Categoria adicionada com sucesso!', 'success')
         
         # Redireciona para a mesma página (limpando o formulário)
@@ -268,10 +1233,16 @@ def gerenciar_categorias():
 
     # Lógica para LER (GET)
     categorias = Categoria.query.order_by(Categoria.nome).all()
-    return render_template('admin/gerenciar_categorias.html', form=form, categorias=categorias)
+    # Só a quantidade: 'categoria.produtos' carregaria todos os produtos de cada categoria
+    qtd_produtos = dict(db.session.execute(
+        db.select(produto_categoria.c.categoria_id, db.func.count())
+        .group_by(produto_categoria.c.categoria_id)
+    ).all())
+    return render_template('admin/gerenciar_categorias.html', form=form, categorias=categorias,
+                           qtd_produtos=qtd_produtos)
 
 
-@app.route('/admin/categoria/editar/<int:categoria_id>', methods=['GET', 'POST'])
+@app.route('/admin/categoria/editar/<id:categoria_id>', methods=['GET', 'POST'])
 @login_required
 def edit_categoria(categoria_id):
     """Página para EDITAR uma categoria."""
@@ -291,25 +1262,31 @@ def edit_categoria(categoria_id):
         else:
             categoria.nome = nome_categoria
             db.session.commit()
+            site_context_cache.invalidar()
             flash('Categoria atualizada com sucesso!', 'success')
             return redirect(url_for('gerenciar_categorias'))
 
     return render_template('admin/form_categoria.html', form=form, categoria=categoria)
 
 
-@app.route('/admin/categoria/excluir/<int:categoria_id>')
+@app.route('/admin/categoria/excluir/<id:categoria_id>')
 @login_required
 def delete_categoria(categoria_id):
     """Rota para EXCLUIR uma categoria."""
     categoria = db.session.get(Categoria, categoria_id) or abort(404)
     
     # IMPORTANTE: Verificação de segurança
-    # 'categoria.produtos' usa o backref que definimos no models.py
-    if categoria.produtos:
+    # Basta saber se existe um produto associado (sem carregar todos pelo backref)
+    associada = db.session.scalar(
+        db.select(produto_categoria.c.produto_id)
+        .where(produto_categoria.c.categoria_id == categoria_id).limit(1)
+    )
+    if associada is not None:
         flash('Não é possível excluir esta categoria, pois ela está associada a produtos.', 'error')
     else:
         db.session.delete(categoria)
         db.session.commit()
+        site_context_cache.invalidar()
         flash('Categoria excluída com sucesso!', 'success')
         
     return redirect(url_for('gerenciar_categorias'))
@@ -338,28 +1315,32 @@ def add_produto():
         db.session.add(novo_produto)
         db.session.commit() # Commit para ter o ID do produto
         
-        # 3. Salva as imagens
-        primeira_imagem_url = None
-        for img_file in form.novas_imagens.data:
-            filename = save_image(img_file)
-            if filename:
-                nova_imagem = ImagemProduto(url_imagem=filename, produto_id=novo_produto.id)
-                db.session.add(nova_imagem)
-                if not primeira_imagem_url:
-                    primeira_imagem_url = filename
+        # 3. Salva as imagens (o processamento fica para a fila de tarefas)
+        produto_id = novo_produto.id # Guardado: depois do commit, ler o atributo volta ao banco
+        novas_urls = save_images(form.novas_imagens.data, referencia=f'produto:{produto_id}')
+        add_imagens_produto(produto_id, novas_urls)
+        primeira_imagem_url = novas_urls[0] if novas_urls else None
         
         # 4. Define a primeira imagem como destaque
         if primeira_imagem_url:
             novo_produto.imagem_destaque_url = primeira_imagem_url
+
+        # 5. Indexa o produto para a busca, a listagem da loja e os relacionados
+        search.indexar_produto(novo_produto)
+        listing.atualizar_produto(novo_produto)
+        atualizar_relacionados(produto_id)
             
         db.session.commit()
         flash('Produto adicionado com sucesso!', 'success')
+        if primeira_imagem_url:
+            # O formulário de edição mostra o andamento do processamento das imagens
+            return redirect(url_for('edit_produto', produto_id=produto_id))
         return redirect(url_for('gerenciar_produtos'))
 
     return render_template('admin/form_produto.html', form=form, produto=None)
 
 
-@app.route('/admin/produto/editar/<int:produto_id>', methods=['GET', 'POST'])
+@app.route('/admin/produto/editar/<id:produto_id>', methods=['GET', 'POST'])
 @login_required
 def edit_produto(produto_id):
     produto = db.session.get(Produto, produto_id) or abort(404)
@@ -374,6 +1355,9 @@ def edit_produto(produto_id):
             form.categorias.data = produto.categorias[0].id
             
     if form.validate_on_submit():
+        # O que entra no cálculo dos relacionados (ver related.py)
+        texto_anterior = (produto.nome, produto.descricao, [c.id for c in produto.categorias])
+
         # 1. Atualiza dados básicos
         produto.nome = form.nome.data
         produto.descricao = form.descricao.data
@@ -385,25 +1369,26 @@ def edit_produto(produto_id):
         produto.categorias = [categoria] # Simples, assume 1 categoria
         
         # 3. Exclui imagens marcadas
-        ids_para_excluir = request.form.getlist('excluir_imagem')
+        ids_para_excluir = {facets.ler_id(i) for i in request.form.getlist('excluir_imagem')} - {None}
+        arquivos_excluidos = []
         if ids_para_excluir:
-            for img_id in ids_para_excluir:
-                img = db.session.get(ImagemProduto, int(img_id))
-                if img and img.produto_id == produto.id:
+            # Uma única consulta para todas as imagens marcadas
+            imagens_excluir = db.session.scalars(
+                db.select(ImagemProduto).where(ImagemProduto.id.in_(ids_para_excluir))
+            ).all()
+            for img in imagens_excluir:
+                if img.produto_id == produto.id:
                     # Se a imagem a excluir era o destaque, limpa o destaque
                     if produto.imagem_destaque_url == img.url_imagem:
                         produto.imagem_destaque_url = None
-                    delete_image(img.url_imagem) # Exclui arquivo
                     db.session.delete(img) # Exclui do DB
+                    arquivos_excluidos.append(img.url_imagem)
+            # Agenda a exclusão dos arquivos que ninguém mais usa
+            delete_images(arquivos_excluidos, f'produto:{produto.id}')
         
         # 4. Adiciona novas imagens
-        novas_urls = []
-        for img_file in form.novas_imagens.data:
-            filename = save_image(img_file)
-            if filename:
-                nova_imagem = ImagemProduto(url_imagem=filename, produto_id=produto.id)
-                db.session.add(nova_imagem)
-                novas_urls.append(filename)
+        novas_urls = save_images(form.novas_imagens.data, referencia=f'produto:{produto.id}')
+        add_imagens_produto(produto.id, novas_urls)
         
         # 5. Atualiza imagem de destaque
         destaque_selecionada = request.form.get('imagem_destaque')
@@ -421,24 +1406,42 @@ def edit_produto(produto_id):
                 if img_restante:
                     produto.imagem_destaque_url = img_restante.url_imagem
 
+        # 6. Reindexa o produto para a busca e para a listagem da loja
+        search.indexar_produto(produto)
+        listing.atualizar_produto(produto)
+        if (produto.nome, produto.descricao, [c.id for c in produto.categorias]) != texto_anterior:
+            atualizar_relacionados(produto.id)
+
         db.session.commit()
         flash('Produto atualizado com sucesso!', 'success')
+        if novas_urls:
+            return redirect(url_for('edit_produto', produto_id=produto_id))
         return redirect(url_for('gerenciar_produtos'))
 
-    return render_template('admin/form_produto.html', form=form, produto=produto)
+    # Andamento do processamento de cada imagem (a tarefa mais recente vale)
+    tarefas_imagens = {}
+    for tarefa in reversed(fila_tarefas.situacao(f'produto:{produto.id}')):
+        if tarefa['tipo'] == 'processar_imagem':
+            tarefas_imagens[tarefa['argumentos'].get('filename')] = tarefa
 
+    return render_template('admin/form_produto.html', form=form, produto=produto,
+                           tarefas_imagens=tarefas_imagens)
 
-@app.route('/admin/produto/excluir/<int:produto_id>', methods=['GET', 'POST']) # GET para link simples
+
+@app.route('/admin/produto/excluir/<id:produto_id>', methods=['GET', 'POST']) # GET para link simples
 @login_required
 def delete_produto(produto_id):
     produto = db.session.get(Produto, produto_id) or abort(404)
     
-    # Excluir todas as imagens associadas
-    for img in produto.imagens:
-        delete_image(img.url_imagem)
-        # O DB excluirá via 'cascade'
+    arquivos = {img.url_imagem for img in produto.imagens} | {produto.imagem_destaque_url}
         
-    db.session.delete(produto)
+    search.remover_produto(produto.id)
+    listing.remover_produto(produto.id)
+    atualizar_relacionados(produto.id)
+    db.session.delete(produto) # As imagens vão junto via 'cascade'
+
+    # Excluir os arquivos que não são usados por mais ninguém
+    delete_images(arquivos, f'produto:{produto.id}')
     db.session.commit()
     
     flash('Produto excluído com sucesso!', 'success')
@@ -454,15 +1457,6 @@ def gerenciar_site():
     settings_form = SiteSettingsForm()
     banner_form = BannerForm()
     
-    # --- INÍCIO DA MUDANÇA ---
-    # Precisamos carregar a lista de produtos para o dropdown do banner_form
-    # Criamos uma lista de tuplas (id, nome)
-    # O '0' é a opção "Nenhum"
-    produto_choices = [(0, '--- Nenhum ---')] + \
-                      [(p.id, f"ID {p.id} - {p.nome}") for p in Produto.query.order_by(Produto.nome).all()]
-    banner_form.produto_selecionado.choices = produto_choices
-    # --- FIM DA MUDANÇA ---
-
     # Lógica para o formulário de Configurações (sem alteração)
     if settings_form.validate_on_submit() and 'sobre_nos' in request.form:
         sobre = SiteSettings.query.filter_by(chave='sobre_nos').first() or SiteSettings(chave='sobre_nos')
@@ -475,6 +1469,7 @@ def gerenciar_site():
         # Adiciona à sessão (necessário se forem novos)
         db.session.add_all([sobre, footer])
         db.session.commit()
+        site_context_cache.invalidar()
         flash('Configurações do site salvas!', 'success')
         return redirect(url_for('gerenciar_site'))
 
@@ -498,20 +1493,17 @@ def add_banner():
     # Esta rota só aceita POST e é chamada pelo 'gerenciar_site'
     banner_form = BannerForm()
     
-    # --- INÍCIO DA MUDANÇA ---
-    # Precisamos popular as choices de novo, caso a validação falhe e 
-    # a página 'gerenciar_site' precise ser re-renderizada com erros
-    produto_choices = [(0, '--- Nenhum ---')] + \
-                      [(p.id, f"ID {p.id} - {p.nome}") for p in Produto.query.order_by(Produto.nome).all()]
-    banner_form.produto_selecionado.choices = produto_choices
-    # --- FIM DA MUDANÇA ---
-    
+    # O produto vem do campo com sugestões (só o id): confere se ele existe
+    produto_id_selecionado = banner_form.produto_selecionado.data
+    if produto_id_selecionado and not db.session.get(Produto, produto_id_selecionado):
+        flash('Produto selecionado não encontrado.', 'error')
+        return redirect(url_for('gerenciar_site'))
+
     if banner_form.validate_on_submit():
-        filename = save_image(banner_form.imagem.data)
+        filename = save_image(banner_form.imagem.data, perfil='banner', referencia='banner')
         if filename:
             
             # --- INÍCIO DA LÓGICA DO LINK ---
-            produto_id_selecionado = banner_form.produto_selecionado.data
             link_manual = banner_form.link_url.data or None
             final_link = None
             
@@ -541,13 +1533,13 @@ def add_banner():
     #  e re-renderizar 'gerenciar_site' com os erros)
     return redirect(url_for('gerenciar_site'))
 
-@app.route('/admin/banner/excluir/<int:banner_id>')
+@app.route('/admin/banner/excluir/<id:banner_id>')
 @login_required
 def delete_banner(banner_id):
     banner = db.session.get(Banner, banner_id) or abort(404)
     
-    delete_image(banner.imagem_url)
     db.session.delete(banner)
+    delete_images([banner.imagem_url], 'banner')
     db.session.commit()
     
     flash('Banner excluído!', 'success')
@@ -0,0 +1,234 @@
+# assets.py
+#
+# Pipeline dos arquivos estáticos do site (CSS/JS), rodado no deploy por
+# 'flask build-assets':
+#
+#   1. minifica (sem dependências: tira comentários e espaços, respeitando
+#      strings, template literals e regex do JS);
+#   2. grava com o hash do conteúdo no nome ('css/style.3fa2b1c0d4e5.css')
+#      em ASSETS_DIR, junto com um manifest.json (nome original -> nome final);
+#   3. grava as versões pré-comprimidas '.gz' e, se o módulo 'brotli' estiver
+#      instalado, '.br'.
+#
+# Nos templates, 'asset_url("css/style.css")' dá a URL do arquivo com hash
+# (ou a do /static normal, se o build ainda não rodou). A rota /assets/
+# entrega a versão comprimida que o navegador aceita, com cache "imutável":
+# um deploy que muda o arquivo muda o nome, então nunca há cache velho.
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli # Opcional: sem ele só há a versão .gz
+except ImportError:
+    brotli = None
+
+# Extensão -> mimetype
+MIMETYPES = {
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+}
+
+# Codificações pré-comprimidas, na ordem de preferência
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+
+# --- Minificação ---
+
+# Depois destes caracteres, uma '/' no JS começa uma regex (e não uma divisão)
+_ANTES_DE_REGEX = set('(,=:[!&|?{};+-*%<>~^') | {''}
+
+
+def minificar_js(codigo):
+    """
+    Minificação conservadora: tira comentários, a indentação e as linhas em
+    branco. As quebras de linha ficam (o JS depende delas para inserir ';'),
+    e strings, template literals e regex são copiados sem alteração.
+    """
+    saida = []
+    i, n = 0, len(codigo)
+    anterior = '' # Último caractere significativo emitido
+    while i < n:
+        c = codigo[i]
+        if c in '"\'`':
+            fim = i + 1
+            while fim < n and codigo[fim] != c:
+                fim += 2 if codigo[fim] == '\\' else 1
+            saida.append(codigo[i:fim + 1])
+            anterior = c
+            i = fim + 1
+        elif codigo.startswith('//', i):
+            fim = codigo.find('\n', i)
+            i = n if fim == -1 else fim
+        elif codigo.startswith('/*', i):
+            fim = codigo.find('*/', i + 2)
+            i = n if fim == -1 else fim + 2
+        elif c == '/' and (anterior in _ANTES_DE_REGEX or re.search(r'\breturn\s*$', ''.join(saida[-3:]))):
+            fim, classe = i + 1, False
+            while fim < n and (codigo[fim] != '/' or classe) and codigo[fim] != '\n':
+                if codigo[fim] == '\\':
+                    fim += 1
+                elif codigo[fim] == '[':
+                    classe = True
+                elif codigo[fim] == ']':
+                    classe = False
+                fim += 1
+            saida.append(codigo[i:fim + 1])
+            anterior = '/'
+            i = fim + 1
+        elif c in ' \t\r\n':
+            fim = i
+            while fim < n and codigo[fim] in ' \t\r\n':
+                fim += 1
+            espaco = codigo[i:fim]
+            if '\n' in espaco:
+                if saida and saida[-1] == ' ': # Espaço antes de um comentário de linha
+                    saida.pop()
+                saida.append('\n')
+            else:
+                saida.append(' ')
+            i = fim
+        else:
+            saida.append(c)
+            anterior = c
+            i += 1
+    return ''.join(saida).strip() + '\n'
+
+
+def minificar_css(codigo):
+    """Tira comentários e espaços desnecessários (strings preservadas)."""
+    partes = re.split(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')', codigo)
+    for indice in range(0, len(partes), 2): # Índices ímpares são strings
+        trecho = re.sub(r'/\*.*?\*/', '', partes[indice], flags=re.S)
+        trecho = re.sub(r'\s+', ' ', trecho)
+        trecho = re.sub(r'\s*([{};,>])\s*', r'\1', trecho)
+        trecho = re.sub(r'\s*:\s*', ':', trecho) if '{' not in trecho else re.sub(
+            r'([{;])([^{};:]+?)\s*:\s*', r'\1\2:', trecho)
+        partes[indice] = trecho.replace(';}', '}')
+    return ''.join(partes).strip() + '\n'
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js}
+
+
+# --- Build ---
+
+def nome_com_hash(caminho, conteudo):
+    """'css/style.css' + bytes -> 'css/style.3fa2b1c0d4e5.css'"""
+    base, ext = os.path.splitext(caminho)
+    return f"{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{ext}"
+
+
+def _gravar(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = f"{caminho}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(conteudo)
+    os.replace(tmp, caminho)
+
+
+def construir(origem, destino, arquivos, limpar=False):
+    """
+    Minifica, põe o hash no nome e comprime cada um dos 'arquivos' (caminhos
+    relativos a 'origem'). Arquivos de builds anteriores ficam (páginas em
+    cache ainda apontam para eles), a não ser com 'limpar'. Retorna o
+    manifesto {original: final} e uma lista (arquivo, bytes antes, depois, gz, br).
+    """
+    manifesto, relatorio = {}, []
+    for relativo in arquivos:
+        ext = os.path.splitext(relativo)[1]
+        with open(os.path.join(origem, relativo), encoding='utf-8') as f:
+            original = f.read()
+        minificado = MINIFICADORES[ext](original).encode('utf-8')
+        final = nome_com_hash(relativo, minificado)
+        caminho = os.path.join(destino, final)
+        _gravar(caminho, minificado)
+        # mtime=0: o mesmo conteúdo sempre gera o mesmo .gz
+        comprimido_gz = gzip.compress(minificado, compresslevel=9, mtime=0)
+        _gravar(caminho + '.gz', comprimido_gz)
+        tamanho_br = None
+        if brotli is not None:
+            comprimido_br = brotli.compress(minificado, quality=11)
+            _gravar(caminho + '.br', comprimido_br)
+            tamanho_br = len(comprimido_br)
+        manifesto[relativo] = final
+        relatorio.append((relativo, len(original.encode('utf-8')), len(minificado), len(comprimido_gz), tamanho_br))
+
+    if limpar:
+        finais = set(manifesto.values())
+        for raiz, _, nomes in os.walk(destino):
+            for nome in nomes:
+                rel = os.path.relpath(os.path.join(raiz, nome), destino).replace(os.sep, '/')
+                if rel != 'manifest.json' and rel.removesuffix('.gz').removesuffix('.br') not in finais:
+                    os.remove(os.path.join(raiz, nome))
+
+    _gravar(os.path.join(destino, 'manifest.json'),
+            json.dumps(manifesto, indent=2, sort_keys=True).encode('utf-8'))
+    return manifesto, relatorio
+
+
+# --- Uso no site ---
+
+class Assets:
+    """Helper 'asset_url' dos templates e rota /assets/ (versões pré-comprimidas)."""
+
+    def __init__(self, app=None):
+        self._manifesto = {}
+        self._mtime = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+        app.config.setdefault('ASSETS_FILES', ('css/style.css', 'js/main.js'))
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.app = app
+        app.add_url_rule('/assets/<path:filename>', 'asset', self.view)
+        app.context_processor(lambda: {'asset_url': self.url})
+
+    def manifesto(self):
+        """manifest.json do último build (relido quando o arquivo muda; {} sem build)."""
+        caminho = os.path.join(self.app.config['ASSETS_DIR'], 'manifest.json')
+        try:
+            mtime = os.stat(caminho).st_mtime_ns
+        except FileNotFoundError:
+            self._manifesto, self._mtime = {}, None
+            return self._manifesto
+        if mtime != self._mtime:
+            with open(caminho, encoding='utf-8') as f:
+                self._manifesto = json.load(f)
+            self._mtime = mtime
+        return self._manifesto
+
+    def url(self, filename):
+        """Como url_for('static', ...), mas para a versão com hash quando ela existe."""
+        final = self.manifesto().get(filename)
+        if final is None:
+            return url_for('static', filename=filename)
+        return url_for('asset', filename=final)
+
+    def view(self, filename):
+        """GET /assets/<nome com hash>: .br ou .gz conforme o Accept-Encoding."""
+        pasta = self.app.config['ASSETS_DIR']
+        mimetype = MIMETYPES.get(os.path.splitext(filename)[1])
+        if mimetype is None or filename == 'manifest.json':
+            abort(404)
+        aceitas = request.accept_encodings
+        for codificacao, sufixo in CODIFICACOES:
+            if aceitas[codificacao] and os.path.isfile(os.path.join(pasta, filename + sufixo)):
+                response = send_from_directory(pasta, filename + sufixo, mimetype=mimetype,
+                                               max_age=self.app.config['ASSETS_MAX_AGE'])
+                response.headers['Content-Encoding'] = codificacao
+                break
+        else:
+            response = send_from_directory(pasta, filename, mimetype=mimetype,
+                                           max_age=self.app.config['ASSETS_MAX_AGE'])
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
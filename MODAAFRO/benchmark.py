@@ -0,0 +1,813 @@
+# benchmark.py
+#
+# Suíte de desempenho da loja:
+#
+#   1. Catálogo sintético:  flask seed-catalog --produtos 10000 --categorias 40 --imagens 3
+#   2. Driver de carga:     python benchmark.py run --url http://127.0.0.1:5000 --out atual.json
+#                           python benchmark.py run --local --out atual.json   (sem servidor)
+#   3. Concorrência:       python benchmark.py concurrency --profiles padrao,producao
+#                           (leituras da loja enquanto outro processo grava em massa)
+#   4. Baseline:            python benchmark.py suite --sizes 1000,10000,100000 --out bench_baseline.json
+#                           python benchmark.py compare bench_baseline.json atual.json
+#   5. Listagem:            python benchmark.py listing --sizes 1000,100000
+#                           (entidades do ORM x read model 'produto_listagem': tempo e memória)
+#
+# O 'suite' cria um banco temporário para cada tamanho, popula, mede e grava
+# tudo num JSON; o 'compare' aponta regressões de latência (p95) e vazão.
+# Alguns cenários têm ainda uma meta absoluta de p95 (METAS_P95_MS), que o
+# 'run' e o 'suite' conferem mesmo sem baseline.
+#
+# bench_baseline.json (no repositório) é a saída do 'suite' com os valores
+# padrão (1k/10k/100k produtos, seed 42); a máquina está em 'meta'. Latência
+# depende do hardware: para comparar, gere a baseline e o resultado atual na
+# mesma máquina (python benchmark.py suite --out bench_baseline.json antes
+# da mudança; depois, suite --out atual.json --compare bench_baseline.json).
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BASEDIR = os.path.abspath(os.path.dirname(__file__))
+
+# --- Catálogo sintético ---
+
+TIPOS = ['Calça', 'Vestido', 'Saia', 'Camisa', 'Blusa', 'Turbante', 'Bata', 'Macacão',
+         'Kimono', 'Bolsa', 'Colar', 'Brinco', 'Shorts', 'Jaqueta', 'Túnica']
+ESTAMPAS = ['Ankara', 'Kente', 'Bogolan', 'Kitenge', 'Adinkra', 'Shweshwe', 'Lisa', 'Listrada']
+CORES = ['Vermelho', 'Amarelo', 'Verde', 'Azul', 'Laranja', 'Preto', 'Branco', 'Dourado', 'Terracota']
+# p95 máximo (ms) por cenário, independente da baseline: as sugestões da
+# busca são chamadas a cada pausa na digitação e precisam parecer instantâneas
+METAS_P95_MS = {
+    'sugestoes': 10.0,
+}
+
+PALAVRAS = ('tecido algodão estampa africana conforto elegância tradição feito à mão '
+            'peça exclusiva cores vibrantes caimento leve ocasião festa dia a dia '
+            'coleção verão inverno modelagem ajustável acabamento artesanal').split()
+
+
+def _imagem_sintetica(caminho, cor, tamanho):
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', tamanho, cor)
+    desenho = ImageDraw.Draw(img)
+    for i in range(0, tamanho[0], 40):
+        desenho.line([(i, 0), (i + tamanho[1] // 2, tamanho[1])], fill=(255 - cor[0], 255 - cor[1], 255 - cor[2]), width=6)
+    img.save(caminho, 'JPEG', quality=85)
+
+
+def gerar_catalogo_sintetico(n_produtos, n_categorias, imagens_por_produto, n_banners,
+                             pasta_uploads, seed=42, tamanho_lote=5000, n_arquivos=24, log=print):
+    """
+    Popula o banco com um catálogo artificial (reprodutível pela 'seed').
+    As linhas são inseridas em lote (INSERT de vários registros); as imagens
+    apontam para um conjunto pequeno de arquivos reais, reaproveitados.
+    Retorna um dict com as quantidades criadas.
+    """
+    import sqlalchemy as sa
+    import images
+    from flask import current_app
+    from models import db, Categoria, Produto, ProdutoListagem, ImagemProduto, Banner, produto_categoria
+
+    rnd = random.Random(seed)
+
+    # 1. Arquivos de imagem (com variantes), reaproveitados entre os produtos
+    arquivos_produto, arquivos_banner = [], []
+    formatos = current_app.config['IMAGE_VARIANT_FORMATS']
+    for i in range(n_arquivos if imagens_por_produto else 0):
+        nome = f"sintetico-{seed}-{i}.jpg"
+        caminho = os.path.join(pasta_uploads, nome)
+        if not os.path.exists(caminho):
+            cor = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+            _imagem_sintetica(caminho, cor, (900, 1200))
+            images.gerar_variantes(pasta_uploads, nome, 'produto', formatos=formatos)
+        arquivos_produto.append(nome)
+    for i in range(min(n_banners, 5)):
+        nome = f"sintetico-{seed}-banner-{i}.jpg"
+        caminho = os.path.join(pasta_uploads, nome)
+        if not os.path.exists(caminho):
+            cor = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+            _imagem_sintetica(caminho, cor, (1600, 400))
+            images.gerar_variantes(pasta_uploads, nome, 'banner', formatos=formatos)
+        arquivos_banner.append(nome)
+
+    # 2. Categorias (nomes únicos por seed, para poder rodar de novo)
+    prox_cat = (db.session.scalar(sa.select(sa.func.max(Categoria.id))) or 0) + 1
+    categorias = [{'id': prox_cat + i, 'nome': f"{TIPOS[i % len(TIPOS)]} {ESTAMPAS[(i // len(TIPOS)) % len(ESTAMPAS)]} {seed}-{i}"}
+                  for i in range(n_categorias)]
+    if categorias:
+        db.session.execute(sa.insert(Categoria), categorias)
+    ids_categorias = [c['id'] for c in categorias] or \
+        list(db.session.scalars(sa.select(Categoria.id)))
+
+    # 3. Produtos, categorias e imagens, em lotes
+    prox_prod = (db.session.scalar(sa.select(sa.func.max(Produto.id))) or 0) + 1
+    prox_img = (db.session.scalar(sa.select(sa.func.max(ImagemProduto.id))) or 0) + 1
+    criados = 0
+    while criados < n_produtos:
+        produtos, associacoes, imagens_lote, listagem = [], [], [], []
+        for _ in range(min(tamanho_lote, n_produtos - criados)):
+            pid = prox_prod + criados
+            criados += 1
+            arquivos = rnd.sample(arquivos_produto, min(imagens_por_produto, len(arquivos_produto)))
+            produtos.append({
+                'id': pid,
+                'nome': f"{rnd.choice(TIPOS)} {rnd.choice(ESTAMPAS)} {rnd.choice(CORES)} {pid}",
+                'descricao': ' '.join(rnd.choices(PALAVRAS, k=rnd.randint(12, 40))).capitalize() + '.',
+                'preco': round(rnd.uniform(19.9, 499.9), 2),
+                'destaque': rnd.random() < 0.01,
+                'imagem_destaque_url': arquivos[0] if arquivos else None,
+            })
+            cats = rnd.sample(ids_categorias, min(len(ids_categorias), rnd.choice((1, 1, 1, 2)))) \
+                if ids_categorias else []
+            for cid in cats:
+                associacoes.append({'produto_id': pid, 'categoria_id': cid})
+            # Read model da listagem (listing.py), gravado no mesmo lote
+            p = produtos[-1]
+            listagem.append({'id': pid, 'nome': p['nome'], 'preco': p['preco'], 'destaque': p['destaque'],
+                             'imagem_destaque_url': p['imagem_destaque_url'],
+                             'categoria_ids': ','.join(map(str, sorted(cats)))})
+            for arquivo in arquivos:
+                imagens_lote.append({'id': prox_img, 'url_imagem': arquivo, 'produto_id': pid})
+                prox_img += 1
+
+        db.session.execute(sa.insert(Produto), produtos)
+        db.session.execute(sa.insert(ProdutoListagem), listagem)
+        if associacoes:
+            db.session.execute(produto_categoria.insert(), associacoes)
+        if imagens_lote:
+            db.session.execute(sa.insert(ImagemProduto), imagens_lote)
+        db.session.commit()
+        log(f"  {criados}/{n_produtos} produtos")
+
+    # 4. Banners (metade linca para um produto)
+    for i in range(n_banners):
+        link = f"#product-modal-trigger-{rnd.randrange(prox_prod, prox_prod + n_produtos)}" \
+            if n_produtos and i % 2 == 0 else None
+        db.session.add(Banner(imagem_url=arquivos_banner[i % len(arquivos_banner)], link_url=link, ordem=i + 1))
+    db.session.commit()
+
+    return {'produtos': n_produtos, 'categorias': n_categorias,
+            'imagens': n_produtos * imagens_por_produto, 'banners': n_banners}
+
+
+# --- Clientes (HTTP real ou app em processo) ---
+
+class ClienteHTTP:
+    """Fala com um servidor rodando (gunicorn/flask run)."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def get(self, caminho):
+        try:
+            with self.opener.open(self.base_url + caminho, timeout=60) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def post(self, caminho, dados):
+        corpo = urllib.parse.urlencode(dados).encode()
+        try:
+            with self.opener.open(self.base_url + caminho, data=corpo, timeout=60) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def post_json(self, caminho, dados):
+        requisicao = urllib.request.Request(self.base_url + caminho, data=json.dumps(dados).encode(),
+                                            headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(requisicao, timeout=60) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def novo(self):
+        """Cliente com a mesma sessão (cookies), para outra thread."""
+        outro = ClienteHTTP(self.base_url)
+        outro.opener = self.opener
+        return outro
+
+
+class ClienteLocal:
+    """Usa o test client do Flask: mede a app sem rede (reprodutível)."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from app import app
+            client = app.test_client()
+        self.client = client
+
+    def get(self, caminho):
+        resp = self.client.get(caminho)
+        return resp.status_code, resp.get_data()
+
+    def post(self, caminho, dados):
+        resp = self.client.post(caminho, data=dados)
+        return resp.status_code, resp.get_data()
+
+    def post_json(self, caminho, dados):
+        resp = self.client.post(caminho, json=dados)
+        return resp.status_code, resp.get_data()
+
+    def novo(self):
+        from app import app
+        outro = ClienteLocal(app.test_client())
+        # Reaproveita o cookie de sessão (login do admin)
+        for cookie in self.client._cookies.values():
+            outro.client.set_cookie(cookie.key, cookie.value, domain=cookie.domain, path=cookie.path)
+        return outro
+
+
+def login_admin(cliente, usuario, senha):
+    _, html = cliente.get('/admin/login')
+    token = re.search(rb'name="csrf_token"[^>]*value="([^"]+)"', html)
+    dados = {'username': usuario, 'password': senha}
+    if token:
+        dados['csrf_token'] = token.group(1).decode()
+    status, _ = cliente.post('/admin/login', dados)
+    return status in (200, 302)
+
+
+# --- Driver ---
+
+def descobrir_alvos(cliente, rnd):
+    """Coleta ids de produtos/categorias, imagens e termos reais da loja."""
+    _, corpo = cliente.get('/loja/produtos?limite=100')
+    produtos = json.loads(corpo)['produtos']
+    _, html = cliente.get('/loja')
+    categorias = sorted(set(re.findall(rb'categoria_id=(\d+)', html))) or [b'1']
+    termos = sorted({palavra for p in produtos for palavra in p['nome'].split()[:2]}) or ['calça']
+    imagens = [p['imagem_destaque'] for p in produtos if p['imagem_destaque']]
+    return {
+        'produtos': [p['id'] for p in produtos] or [1],
+        'categorias': [c.decode() for c in categorias],
+        'termos': termos,
+        'imagens': imagens,
+    }
+
+
+def _carrinho(r, alvos):
+    """Corpo de um POST /checkout com 1 a 5 produtos sorteados."""
+    produtos = r.sample(alvos['produtos'], min(len(alvos['produtos']), r.randint(1, 5)))
+    return ('/checkout', {'itens': [{'id': p, 'quantidade': r.randint(1, 3)} for p in produtos]})
+
+
+def requisitar(cliente, alvo):
+    """'alvo' é uma URL (GET) ou (caminho, dados) para um POST em JSON."""
+    if isinstance(alvo, tuple):
+        return cliente.post_json(*alvo)
+    return cliente.get(alvo)
+
+
+def cenarios(alvos, com_admin):
+    """Lista de (nome, função que sorteia a URL ou o POST)."""
+    q = urllib.parse.quote
+    lista = [
+        ('index', lambda r: '/'),
+        ('loja', lambda r: '/loja'),
+        ('loja_busca', lambda r: f"/loja?q={q(r.choice(alvos['termos']))}"),
+        ('loja_categoria', lambda r: f"/loja?categoria_id={r.choice(alvos['categorias'])}"),
+        ('loja_busca_categoria', lambda r: f"/loja?q={q(r.choice(alvos['termos']))}&categoria_id={r.choice(alvos['categorias'])}"),
+        ('loja_facetas', lambda r: '/loja?' + '&'.join(
+            [f"categoria_id={c}" for c in r.sample(alvos['categorias'], min(2, len(alvos['categorias'])))]
+            + [f"preco={r.choice(['0-50', '50-100', '100-200'])}", 'destaque=1'][:r.randint(1, 2)])),
+        ('get_produto_data', lambda r: f"/produto/{r.choice(alvos['produtos'])}"),
+        # Começo de um termo real, como durante a digitação
+        ('sugestoes', lambda r: f"/loja/sugestoes?q={q(r.choice(alvos['termos'])[:r.randint(2, 5)])}"),
+        ('checkout', lambda r: _carrinho(r, alvos)),
+        # Leituras da loja disputando com uma rajada de pedidos
+        ('checkout_loja_misto', lambda r: _carrinho(r, alvos) if r.random() < 0.5
+            else f"/loja?categoria_id={r.choice(alvos['categorias'])}"),
+    ]
+    if alvos['imagens']:
+        lista.append(('uploaded_file', lambda r: r.choice(alvos['imagens'])))
+    if com_admin:
+        lista += [
+            ('admin_produtos', lambda r: '/admin/produtos'),
+            ('admin_categorias', lambda r: '/admin/categorias'),
+            ('admin_site', lambda r: '/admin/site'),
+        ]
+    return lista
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    k = max(0, min(len(valores_ordenados) - 1, int(round(p / 100 * len(valores_ordenados) + 0.5)) - 1))
+    return valores_ordenados[k]
+
+
+def medir(cliente, gerar_url, n_requisicoes, concorrencia, seed, duracao=None):
+    """Dispara 'n_requisicoes' (ou requisições por 'duracao' segundos) com 'concorrencia' threads."""
+    latencias, erros = [], 0
+    lock = threading.Lock()
+    restantes = iter(range(n_requisicoes or 0))
+    fim = time.monotonic() + duracao if duracao else None
+
+    def trabalhador(indice):
+        nonlocal erros
+        rnd = random.Random(seed * 1000 + indice)
+        cli = cliente.novo()
+        while True:
+            if fim is not None:
+                if time.monotonic() >= fim:
+                    return
+            else:
+                with lock:
+                    if next(restantes, None) is None:
+                        return
+            url = gerar_url(rnd)
+            inicio = time.perf_counter()
+            status, _ = requisitar(cli, url)
+            duracao = time.perf_counter() - inicio
+            with lock:
+                latencias.append(duracao)
+                if status >= 400:
+                    erros += 1
+
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(concorrencia)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'rps': round(len(latencias) / total, 1) if total else None,
+        'p50_ms': ms(percentil(latencias, 50)),
+        'p95_ms': ms(percentil(latencias, 95)),
+        'p99_ms': ms(percentil(latencias, 99)),
+        'max_ms': ms(latencias[-1] if latencias else None),
+    }
+
+
+def executar(cliente, n_requisicoes=200, concorrencia=4, seed=42, aquecimento=20,
+             usuario='admin', senha='admin123', log=print):
+    rnd = random.Random(seed)
+    com_admin = login_admin(cliente, usuario, senha) if usuario else False
+    alvos = descobrir_alvos(cliente, rnd)
+    resultados = {}
+    for nome, gerar_url in cenarios(alvos, com_admin):
+        for _ in range(aquecimento):
+            requisitar(cliente, gerar_url(rnd))
+        resultados[nome] = medir(cliente, gerar_url, n_requisicoes, concorrencia, seed)
+        r = resultados[nome]
+        log(f"  {nome:<22} {r['rps']:>8} req/s   p50 {r['p50_ms']:>8} ms   "
+            f"p95 {r['p95_ms']:>8} ms   p99 {r['p99_ms']:>8} ms   erros {r['erros']}")
+    return resultados
+
+
+# --- Concorrência: leituras da loja durante escritas em massa ---
+
+def carga_escrita(duracao, tamanho_lote, pausa=0):
+    """Faz o papel de outro worker gravando lotes de produtos ('pausa' segundos entre eles)."""
+    from app import app
+    from models import db
+    lotes, erros, tempos = 0, 0, []
+    fim = time.monotonic() + duracao
+    with app.app_context():
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                gerar_catalogo_sintetico(tamanho_lote, 0, 0, 0, app.config['UPLOAD_FOLDER'], seed=lotes,
+                                         tamanho_lote=tamanho_lote, log=lambda *a: None)
+                lotes += 1
+            except Exception as e: # Ex: "database is locked"
+                db.session.rollback()
+                erros += 1
+                print(f"  escrita falhou: {e}", file=sys.stderr)
+            tempos.append(time.perf_counter() - inicio)
+            time.sleep(pausa)
+    tempos.sort()
+    return {
+        'lotes': lotes,
+        'produtos': lotes * tamanho_lote,
+        'erros': erros,
+        'lote_p50_ms': round(percentil(tempos, 50) * 1000, 2) if tempos else None,
+        'lote_max_ms': round(tempos[-1] * 1000, 2) if tempos else None,
+    }
+
+
+def carga_leitura(duracao, leitores, seed):
+    """Leituras da loja (sem o cache de páginas, para chegar sempre ao banco)."""
+    from app import page_cache
+    page_cache.ativo = False
+    cliente = ClienteLocal()
+    rnd = random.Random(seed)
+    alvos = descobrir_alvos(cliente, rnd)
+    q = urllib.parse.quote
+    urls = [
+        lambda r: f"/loja?categoria_id={r.choice(alvos['categorias'])}",
+        lambda r: f"/loja?q={q(r.choice(alvos['termos']))}",
+        lambda r: f"/produto/{r.choice(alvos['produtos'])}",
+        lambda r: '/loja/produtos?limite=48',
+    ]
+    return medir(cliente, lambda r: r.choice(urls)(r), None, leitores, seed, duracao=duracao)
+
+
+def cmd_concurrency_worker(args):
+    resultado = carga_escrita(args.duration, args.batch, args.pause) if args.role == 'write' \
+        else carga_leitura(args.duration, args.readers, args.seed)
+    with open(args.out, 'w') as f:
+        json.dump(resultado, f)
+    return 0
+
+
+def cmd_concurrency(args):
+    """
+    Para cada perfil do SQLite: popula um banco novo e roda, ao mesmo tempo,
+    um processo gravando lotes de produtos e outro lendo a loja com várias
+    threads (como dois workers do gunicorn). Relata a latência das leituras
+    e os erros ("database is locked") dos dois lados. Com --max-p99-ms, sai
+    com status 1 se algum perfil tiver erro ou leituras acima do limite.
+
+    Numa máquina com poucos núcleos, os dois processos disputam a CPU e a
+    vazão das leituras mede mais isso do que o banco: compare os erros e a
+    cauda (p99/max). A espera das leituras pelo lock é conferida à parte
+    em tests/test_concorrencia.py.
+    """
+    saida = {'meta': {'data': time.strftime('%Y-%m-%dT%H:%M:%S'), 'produtos': args.products,
+                      'duracao': args.duration, 'leitores': args.readers, 'lote': args.batch,
+                      'pausa': args.pause},
+             'perfis': {}}
+    for perfil in args.profiles.split(','):
+        with tempfile.TemporaryDirectory(prefix=f'bench-{perfil}-') as tmp:
+            env = _ambiente(tmp, SQLITE_PROFILE=perfil)
+            os.makedirs(env['UPLOAD_FOLDER'])
+            print(f"== perfil '{perfil}' ==")
+            _flask(env, 'init-db')
+            _flask(env, 'seed-catalog', '--produtos', str(args.products), '--imagens', '0', '--banners', '0')
+
+            def papel(nome, *extra):
+                out = os.path.join(tmp, f'{nome}.json')
+                proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'concurrency-worker',
+                                         '--role', nome, '--duration', str(args.duration), '--out', out, *extra],
+                                        cwd=BASEDIR, env=env)
+                return proc, out
+
+            escrita = papel('write', '--batch', str(args.batch), '--pause', str(args.pause))
+            leitura = papel('read', '--readers', str(args.readers), '--seed', str(args.seed))
+            resultado = {}
+            for nome, (proc, out) in (('escrita', escrita), ('leitura', leitura)):
+                if proc.wait() != 0:
+                    raise SystemExit(f"O processo de {nome} falhou (perfil {perfil})")
+                with open(out) as f:
+                    resultado[nome] = json.load(f)
+            saida['perfis'][perfil] = resultado
+            r, w = resultado['leitura'], resultado['escrita']
+            print(f"  leituras: {r['rps']} req/s   p50 {r['p50_ms']} ms   p95 {r['p95_ms']} ms   "
+                  f"p99 {r['p99_ms']} ms   max {r['max_ms']} ms   erros {r['erros']}")
+            print(f"  escritas: {w['produtos']} produtos em {w['lotes']} lotes   "
+                  f"lote p50 {w['lote_p50_ms']} ms   erros {w['erros']}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+    if args.max_p99_ms is None:
+        return 0
+    problemas = []
+    for perfil, resultado in saida['perfis'].items():
+        r, w = resultado['leitura'], resultado['escrita']
+        if r['erros'] or w['erros']:
+            problemas.append(f"{perfil}: {r['erros']} leituras e {w['erros']} escritas com erro")
+        if r['p99_ms'] > args.max_p99_ms:
+            problemas.append(f"{perfil}: leituras com p99 de {r['p99_ms']} ms (limite {args.max_p99_ms} ms)")
+    for problema in problemas:
+        print(f"FALHOU  {problema}")
+    if not problemas:
+        print(f"Sem erros e com p99 das leituras até {args.max_p99_ms} ms em todos os perfis.")
+    return 1 if problemas else 0
+
+
+# --- Listagem: entidades do ORM x read model ---
+
+def _medir_leitura(carregar, repeticoes):
+    """Tempo (mediana/p95 em ms) e memória alocada (KB) para carregar o resultado."""
+    import tracemalloc
+    from models import db
+    tempos = []
+    for _ in range(repeticoes):
+        db.session.remove() # Sessão nova: sem objetos do mapa de identidade da rodada anterior
+        inicio = time.perf_counter()
+        resultado = carregar()
+        tempos.append(time.perf_counter() - inicio)
+        del resultado
+    db.session.remove()
+    tracemalloc.start()
+    resultado = carregar()
+    retida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n = len(resultado)
+    del resultado
+    db.session.remove()
+    tempos.sort()
+    return {
+        'linhas': n,
+        'p50_ms': round(percentil(tempos, 50) * 1000, 3),
+        'p95_ms': round(percentil(tempos, 95) * 1000, 3),
+        'memoria_kb': round(retida / 1024, 1),
+        'pico_kb': round(pico / 1024, 1),
+        'bytes_por_linha': round(retida / n) if n else None,
+    }
+
+
+def cmd_listing_worker(args):
+    """
+    Mede, no banco atual, as duas formas de ler a listagem da loja:
+    'orm' (entidades Produto, como antes) e 'read_model' (Rows de
+    produto_listagem). Cenários: primeira página, página de uma categoria
+    e o catálogo inteiro (escala da memória).
+    """
+    import sqlalchemy as sa
+    from app import app
+    import facets
+    import listing
+    from models import db, Produto, Categoria
+    colunas = listing.listagem.c
+    por_pagina = app.config['PRODUTOS_POR_PAGINA']
+    with app.app_context():
+        categoria_id = db.session.scalar(sa.select(Categoria.id).limit(1))
+        consultas = {
+            'pagina': (
+                lambda: db.session.scalars(sa.select(Produto).order_by(Produto.nome, Produto.id).limit(por_pagina)).all(),
+                lambda: db.session.execute(listing.selecionar_cards().order_by(colunas.nome, colunas.id).limit(por_pagina)).all(),
+            ),
+            'pagina_categoria': (
+                lambda: db.session.scalars(sa.select(Produto).where(Produto.categorias.any(id=categoria_id))
+                                           .order_by(Produto.nome, Produto.id).limit(por_pagina)).all(),
+                lambda: db.session.execute(
+                    facets.filtrar(listing.selecionar_cards(), facets.Selecao((categoria_id,), (), False), [])
+                    .order_by(colunas.nome, colunas.id).limit(por_pagina)).all(),
+            ),
+            'catalogo_inteiro': (
+                lambda: db.session.scalars(sa.select(Produto).order_by(Produto.nome, Produto.id)).all(),
+                lambda: db.session.execute(listing.selecionar_cards().order_by(colunas.nome, colunas.id)).all(),
+            ),
+        }
+        resultado = {}
+        for nome, (orm, read_model) in consultas.items():
+            repeticoes = args.repeat if nome != 'catalogo_inteiro' else max(3, args.repeat // 20)
+            resultado[nome] = {'orm': _medir_leitura(orm, repeticoes),
+                               'read_model': _medir_leitura(read_model, repeticoes)}
+    with open(args.out, 'w') as f:
+        json.dump(resultado, f)
+    return 0
+
+
+def cmd_listing(args):
+    """Popula um banco novo para cada tamanho e compara ORM x read model da listagem."""
+    saida = {'meta': {'data': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                      'repeticoes': args.repeat}, 'resultados': {}}
+    for tamanho in [int(t) for t in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory(prefix=f'bench-listagem-{tamanho}-') as tmp:
+            env = _ambiente(tmp, JOBS_EMBEDDED='0')
+            os.makedirs(env['UPLOAD_FOLDER'])
+            print(f"== {tamanho} produtos ==")
+            _flask(env, 'init-db')
+            _flask(env, 'seed-catalog', '--produtos', str(tamanho), '--categorias', '40',
+                   '--imagens', '0', '--banners', '0')
+            out = os.path.join(tmp, 'listagem.json')
+            subprocess.run([sys.executable, os.path.abspath(__file__), 'listing-worker',
+                            '--repeat', str(args.repeat), '--out', out], cwd=BASEDIR, env=env, check=True)
+            with open(out) as f:
+                resultado = json.load(f)
+            saida['resultados'][str(tamanho)] = resultado
+            for cenario, medidas in resultado.items():
+                for caminho, m in medidas.items():
+                    print(f"  {cenario:<17} {caminho:<11} {m['linhas']:>7} linhas   p50 {m['p50_ms']:>9} ms   "
+                          f"p95 {m['p95_ms']:>9} ms   memória {m['memoria_kb']:>9} KB "
+                          f"({m['bytes_por_linha']} B/linha)")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+# --- Baseline ---
+
+def comparar(baseline, atual, tolerancia):
+    """Lista de regressões: p95 maior ou vazão menor que a baseline além da tolerância."""
+    regressoes = []
+    for tamanho, cenarios_base in baseline.get('resultados', {}).items():
+        cenarios_atual = atual.get('resultados', {}).get(tamanho, {})
+        for nome, base in cenarios_base.items():
+            agora = cenarios_atual.get(nome)
+            if not agora:
+                continue
+            if base.get('p95_ms') and agora['p95_ms'] > base['p95_ms'] * (1 + tolerancia):
+                regressoes.append(f"[{tamanho}] {nome}: p95 {base['p95_ms']} -> {agora['p95_ms']} ms")
+            if base.get('rps') and agora['rps'] < base['rps'] * (1 - tolerancia):
+                regressoes.append(f"[{tamanho}] {nome}: vazão {base['rps']} -> {agora['rps']} req/s")
+            if agora['erros'] > base.get('erros', 0):
+                regressoes.append(f"[{tamanho}] {nome}: erros {base.get('erros', 0)} -> {agora['erros']}")
+    return regressoes
+
+
+def verificar_metas(resultados):
+    """Cenários com p95 acima da meta absoluta (METAS_P95_MS), em qualquer tamanho."""
+    violacoes = []
+    for tamanho, cenarios_tamanho in resultados.items():
+        for nome, meta in METAS_P95_MS.items():
+            r = cenarios_tamanho.get(nome)
+            if r and r['p95_ms'] is not None and r['p95_ms'] > meta:
+                violacoes.append(f"[{tamanho}] {nome}: p95 {r['p95_ms']} ms acima da meta de {meta} ms")
+    return violacoes
+
+
+def _meta(args):
+    return {
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'requisicoes': args.requests,
+        'concorrencia': args.concurrency,
+        'seed': args.seed,
+    }
+
+
+def _ambiente(tmp, **extra):
+    """Variáveis de ambiente de uma instância descartável: banco e tudo o que iria para 'instance/' ficam em 'tmp'."""
+    return dict(os.environ,
+                DATABASE_URL='sqlite:///' + os.path.join(tmp, 'site.db'),
+                UPLOAD_FOLDER=os.path.join(tmp, 'uploads'),
+                CACHE_DIR=os.path.join(tmp, 'cache'),
+                METRICS_DIR=os.path.join(tmp, 'metrics'),
+                CHECKOUT_DIARIO_DIR=os.path.join(tmp, 'pedidos'),
+                SNAPSHOT_PATH=os.path.join(tmp, 'catalogo.snapshot'),
+                SQL_PROFILER_LOG='0',
+                **extra)
+
+
+def _flask(env, *argumentos):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', *argumentos],
+                   cwd=BASEDIR, env=env, check=True)
+
+
+def cmd_run(args):
+    if args.local:
+        cliente = ClienteLocal()
+        tamanho = args.size or 'local'
+    else:
+        cliente = ClienteHTTP(args.url)
+        tamanho = args.size or args.url
+    print(f"Medindo ({tamanho})...")
+    resultados = executar(cliente, args.requests, args.concurrency, args.seed)
+    saida = {'meta': _meta(args), 'resultados': {str(tamanho): resultados}}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+    if args.no_verdict:
+        return 0
+    return _relatar(verificar_metas(saida['resultados']))
+
+
+def cmd_suite(args):
+    saida = {'meta': _meta(args), 'resultados': {}}
+    for tamanho in [int(t) for t in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory(prefix=f'bench-{tamanho}-') as tmp:
+            # O perfil com que o bench_baseline.json foi medido
+            env = _ambiente(tmp, SQLITE_PROFILE=os.environ.get('SQLITE_PROFILE') or 'producao')
+            os.makedirs(env['UPLOAD_FOLDER'])
+            print(f"== {tamanho} produtos ==")
+            _flask(env, 'init-db')
+            _flask(env, 'create-admin')
+            _flask(env, 'seed-catalog', '--produtos', str(tamanho), '--categorias', str(args.categories),
+                   '--imagens', str(args.images), '--banners', str(args.banners), '--seed', str(args.seed))
+            resultado = os.path.join(tmp, 'resultado.json')
+            subprocess.run([sys.executable, os.path.abspath(__file__), 'run', '--local',
+                            '--size', str(tamanho), '--requests', str(args.requests),
+                            '--concurrency', str(args.concurrency), '--seed', str(args.seed),
+                            '--out', resultado, '--no-verdict'], cwd=BASEDIR, env=env, check=True)
+            with open(resultado) as f:
+                saida['resultados'].update(json.load(f)['resultados'])
+
+    with open(args.out, 'w') as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {args.out}")
+
+    regressoes = verificar_metas(saida['resultados'])
+    if args.compare:
+        with open(args.compare) as f:
+            regressoes += comparar(json.load(f), saida, args.tolerance)
+    return _relatar(regressoes)
+
+
+def _relatar(regressoes):
+    if regressoes:
+        print("REGRESSÕES:")
+        for r in regressoes:
+            print("  " + r)
+        return 1
+    print("Nenhuma regressão em relação à baseline nem meta de latência estourada.")
+    return 0
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.atual) as f:
+        atual = json.load(f)
+    return _relatar(comparar(baseline, atual, args.tolerance))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da loja MODAAFRO')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    def opcoes_carga(p):
+        p.add_argument('--requests', type=int, default=200, help='Requisições por cenário')
+        p.add_argument('--concurrency', type=int, default=4, help='Threads simultâneas')
+        p.add_argument('--seed', type=int, default=42)
+
+    p_run = sub.add_parser('run', help='Mede uma instância (servidor ou em processo)')
+    alvo = p_run.add_mutually_exclusive_group(required=True)
+    alvo.add_argument('--url', help='Ex: http://127.0.0.1:5000')
+    alvo.add_argument('--local', action='store_true', help='Usa a app em processo (DATABASE_URL atual)')
+    p_run.add_argument('--size', help='Rótulo do resultado (ex: quantidade de produtos)')
+    p_run.add_argument('--out', help='Arquivo JSON de saída')
+    # O 'suite' confere as metas uma vez só, com todos os tamanhos juntos
+    p_run.add_argument('--no-verdict', action='store_true', help=argparse.SUPPRESS)
+    opcoes_carga(p_run)
+    p_run.set_defaults(func=cmd_run)
+
+    p_suite = sub.add_parser('suite', help='Popula e mede um banco novo para cada tamanho')
+    p_suite.add_argument('--sizes', default='1000,10000,100000')
+    p_suite.add_argument('--categories', type=int, default=40)
+    p_suite.add_argument('--images', type=int, default=3)
+    p_suite.add_argument('--banners', type=int, default=4)
+    p_suite.add_argument('--out', default='bench_baseline.json')
+    p_suite.add_argument('--compare', help='Baseline para comparar ao final')
+    p_suite.add_argument('--tolerance', type=float, default=0.25)
+    opcoes_carga(p_suite)
+    p_suite.set_defaults(func=cmd_suite)
+
+    p_cmp = sub.add_parser('compare', help='Compara um resultado com a baseline')
+    p_cmp.add_argument('baseline')
+    p_cmp.add_argument('atual')
+    p_cmp.add_argument('--tolerance', type=float, default=0.25,
+                       help='Piora aceitável (0.25 = 25%%) antes de acusar regressão')
+    p_cmp.set_defaults(func=cmd_compare)
+
+    p_conc = sub.add_parser('concurrency', help='Leituras da loja durante escritas em massa, por perfil do SQLite')
+    p_conc.add_argument('--profiles', default='padrao,producao', help='Perfis do SQLITE_PROFILE a comparar')
+    p_conc.add_argument('--products', type=int, default=5000, help='Tamanho do catálogo inicial')
+    p_conc.add_argument('--duration', type=float, default=10, help='Segundos de carga')
+    p_conc.add_argument('--readers', type=int, default=8, help='Threads lendo a loja')
+    p_conc.add_argument('--batch', type=int, default=2000, help='Produtos por transação de escrita')
+    p_conc.add_argument('--pause', type=float, default=0,
+                        help='Segundos entre os lotes (com pausa, os perfis gravam o mesmo volume)')
+    p_conc.add_argument('--seed', type=int, default=42)
+    p_conc.add_argument('--max-p99-ms', type=float, help='Falha se o p99 das leituras passar disso (ou houver erros)')
+    p_conc.add_argument('--out', help='Arquivo JSON de saída')
+    p_conc.set_defaults(func=cmd_concurrency)
+
+    # Usado internamente pelo 'concurrency' (um processo por papel)
+    p_worker = sub.add_parser('concurrency-worker')
+    p_worker.add_argument('--role', choices=['read', 'write'], required=True)
+    p_worker.add_argument('--duration', type=float, required=True)
+    p_worker.add_argument('--readers', type=int, default=8)
+    p_worker.add_argument('--batch', type=int, default=2000)
+    p_worker.add_argument('--pause', type=float, default=0)
+    p_worker.add_argument('--seed', type=int, default=42)
+    p_worker.add_argument('--out', required=True)
+    p_worker.set_defaults(func=cmd_concurrency_worker)
+
+    p_list = sub.add_parser('listing', help='Listagem da loja: entidades do ORM x read model (tempo e memória)')
+    p_list.add_argument('--sizes', default='1000,100000')
+    p_list.add_argument('--repeat', type=int, default=200, help='Repetições por cenário')
+    p_list.add_argument('--out', help='Arquivo JSON de saída')
+    p_list.set_defaults(func=cmd_listing)
+
+    # Usado internamente pelo 'listing' (um processo por banco)
+    p_list_worker = sub.add_parser('listing-worker')
+    p_list_worker.add_argument('--repeat', type=int, default=200)
+    p_list_worker.add_argument('--out', required=True)
+    p_list_worker.set_defaults(func=cmd_listing_worker)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# cache.py
+
+import os
+import tempfile
+import threading
+import uuid
+from collections import namedtuple
+
+# Identifica uma versão: muda a cada 'incrementar' (o mtime diz quando mudou)
+Versao = namedtuple('Versao', ['inode', 'mtime_ns', 'tamanho'])
+# Versão de uma VersaoCombinada: as versões de cada parte e o mtime da mais recente
+VersoesCombinadas = namedtuple('VersoesCombinadas', ['versoes', 'mtime_ns'])
+
+
+class VersaoCompartilhada:
+    """
+    Carimbo de versão guardado num arquivo, compartilhado entre todos os
+    processos (workers do gunicorn) da mesma máquina.
+
+    Ler a versão custa só um 'os.stat'. Cada 'incrementar' troca o arquivo
+    de forma atômica (os.replace), o que muda inode/mtime e invalida o
+    cache de todos os workers de uma vez.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+    def atual(self):
+        try:
+            st = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        return Versao(st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def incrementar(self):
+        pasta = os.path.dirname(self.caminho)
+        fd, tmp = tempfile.mkstemp(dir=pasta, prefix='.versao-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(tmp, self.caminho)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return self.atual()
+
+
+class VersaoCombinada:
+    """
+    Várias VersaoCompartilhada vistas como uma só, para o que depende de
+    mais de uma coisa (ex: o HTML das páginas, do catálogo e das variantes
+    das imagens): muda quando qualquer uma delas muda.
+    """
+
+    def __init__(self, *versoes):
+        self.versoes = versoes
+
+    def atual(self):
+        atuais = tuple(versao.atual() for versao in self.versoes)
+        if None in atuais:
+            return None
+        return VersoesCombinadas(atuais, max(versao.mtime_ns for versao in atuais))
+
+    def incrementar(self):
+        for versao in self.versoes:
+            versao.incrementar()
+        return self.atual()
+
+
+def monitorar_commits(session, modelos, ao_alterar):
+    """
+    Chama 'ao_alterar()' depois de todo commit que gravou algum objeto de
+    'modelos' (inclusão, alteração ou exclusão), venha de onde vier a
+    escrita: rotas do admin, comandos CLI, importações... Inclui os INSERT/
+    UPDATE/DELETE em lote do ORM ('session.execute(insert(Modelo), linhas)').
+    """
+    from sqlalchemy import event
+
+    marcador = ('monitorar_commits', id(ao_alterar))
+
+    @event.listens_for(session, 'after_flush')
+    def _marcar(sess, flush_context):
+        for obj in list(sess.new) + list(sess.dirty) + list(sess.deleted):
+            if isinstance(obj, modelos):
+                sess.info[marcador] = True
+                return
+
+    @event.listens_for(session, 'do_orm_execute')
+    def _marcar_lote(estado):
+        if (estado.is_insert or estado.is_update or estado.is_delete) and estado.bind_mapper is not None \
+                and issubclass(estado.bind_mapper.class_, modelos):
+            estado.session.info[marcador] = True
+
+    @event.listens_for(session, 'after_commit')
+    def _avisar(sess):
+        if sess.info.pop(marcador, False):
+            ao_alterar()
+
+    @event.listens_for(session, 'after_rollback')
+    def _descartar(sess):
+        sess.info.pop(marcador, None)
+
+
+class CacheVersionado:
+    """
+    Cache em memória (por processo) de um único valor, válido enquanto a
+    VersaoCompartilhada não mudar.
+    """
+
+    def __init__(self, nome, versao):
+        self.nome = nome
+        self.versao = versao
+        self._valor = None
+        self._versao_valor = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obter(self, carregar):
+        """Retorna o valor em cache ou chama 'carregar()' para recriá-lo."""
+        versao = self.versao.atual()
+        if versao is None:
+            # Primeiro uso: cria o arquivo para que os workers tenham uma referência
+            versao = self.versao.incrementar()
+
+        with self._lock:
+            if self._valor is not None and self._versao_valor == versao:
+                self.hits += 1
+                return self._valor
+            self.misses += 1
+
+        # Carrega fora do lock; se a versão mudar no meio, o valor
+        # fica marcado com a versão antiga e será recarregado no próximo acesso
+        valor = carregar()
+        with self._lock:
+            self._valor = valor
+            self._versao_valor = versao
+        return valor
+
+    def invalidar(self):
+        """Descarta o valor neste processo e avisa os outros workers."""
+        with self._lock:
+            self._valor = None
+            self._versao_valor = None
+        self.versao.incrementar()
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {
+            "nome": self.nome,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "versao": "-".join(str(v) for v in self._versao_valor) if self._versao_valor else None,
+            "pid": os.getpid()
+        }
@@ -0,0 +1,274 @@
+# catalog_io.py
+#
+# Importação/exportação do catálogo em massa (CSV ou JSONL), usada pelos
+# comandos 'flask import-catalog' e 'flask export-catalog'.
+#
+# Colunas: nome, descricao, preco, destaque, categorias, imagens
+#   - categorias: nomes separados por '|' (no JSONL pode ser uma lista)
+#   - imagens: arquivos separados por '|', relativos à pasta '--imagens'
+#     (a primeira vira a imagem de destaque)
+
+import csv
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import sqlalchemy as sa
+from sqlalchemy.orm import selectinload
+
+import images
+import listing
+import search
+import uploads
+from forms import IMG_ALLOWED
+from models import db, Categoria, Produto, ImagemProduto, ImportacaoCatalogo
+
+COLUNAS = ['id', 'nome', 'descricao', 'preco', 'destaque', 'categorias', 'imagens', 'imagem_destaque']
+VERDADEIRO = {'1', 'true', 'sim', 's', 'yes', 'y', 'x'}
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+def detectar_formato(caminho, formato=None):
+    if formato:
+        return formato
+    return 'jsonl' if caminho.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def ler_linhas(caminho, formato):
+    """
+    Lê o arquivo linha a linha (nunca carrega tudo na memória). Uma linha
+    JSONL malformada vira um LinhaInvalida no lugar do dict, para ser contada
+    como erro sem interromper a importação (nem mudar a numeração).
+    """
+    with open(caminho, newline='', encoding='utf-8-sig') as f:
+        if formato == 'jsonl':
+            for linha in f:
+                if linha.strip():
+                    try:
+                        yield json.loads(linha)
+                    except json.JSONDecodeError as e:
+                        yield LinhaInvalida(f"JSON inválido: {e}")
+        else:
+            yield from csv.DictReader(f)
+
+
+def _lista(valor):
+    if valor is None:
+        return []
+    if isinstance(valor, list):
+        return [str(v).strip() for v in valor if str(v).strip()]
+    return [v.strip() for v in str(valor).split('|') if v.strip()]
+
+
+def normalizar_linha(bruta):
+    """Valida e converte uma linha do arquivo; levanta LinhaInvalida."""
+    if isinstance(bruta, LinhaInvalida):
+        raise bruta
+    nome = (bruta.get('nome') or '').strip()
+    if len(nome) < 3:
+        raise LinhaInvalida("'nome' vazio ou curto demais")
+    try:
+        preco = float(str(bruta.get('preco', '')).replace(',', '.'))
+    except ValueError:
+        raise LinhaInvalida(f"'preco' inválido: {bruta.get('preco')!r}")
+    if not math.isfinite(preco) or preco <= 0: # float() aceita 'nan' e 'inf'
+        raise LinhaInvalida("'preco' deve ser um número positivo")
+    destaque = bruta.get('destaque')
+    if not isinstance(destaque, bool):
+        destaque = str(destaque or '').strip().lower() in VERDADEIRO
+    return {
+        'nome': nome[:200],
+        'descricao': (bruta.get('descricao') or '').strip() or None,
+        'preco': preco,
+        'destaque': destaque,
+        'categorias': _lista(bruta.get('categorias')),
+        'imagens': _lista(bruta.get('imagens')),
+    }
+
+
+def _processar_imagem(origem, pasta_uploads, formatos):
+    """
+    Roda num processo separado: copia a imagem para os uploads (nome pelo
+    hash, como o 'save_image': fotos repetidas viram um arquivo só) e gera
+    as variantes. Retorna (origem, nome, erro). Se a importação parar antes
+    do commit do lote, os arquivos copiados ficam para o 'flask gc-uploads'.
+    """
+    if uploads.extensao(origem) not in IMG_ALLOWED:
+        return origem, None, 'extensão não permitida'
+    if not os.path.isfile(origem):
+        return origem, None, 'arquivo não encontrado'
+    try:
+        filename, _ = uploads.copiar(origem, pasta_uploads)
+    except OSError as e:
+        return origem, None, f'cópia falhou: {e}'
+    try:
+        images.gerar_variantes(pasta_uploads, filename, 'produto', formatos=formatos)
+    except Exception as e:
+        return origem, filename, f'variantes não geradas: {e}'
+    return origem, filename, None
+
+
+class ResolvedorCategorias:
+    """Acha categorias pelo nome (sem diferenciar maiúsculas), criando as que faltam."""
+
+    def __init__(self):
+        self._por_nome = {c.nome.casefold(): c for c in Categoria.query.all()}
+        self.criadas = 0
+
+    def __call__(self, nome):
+        chave = nome.casefold()
+        categoria = self._por_nome.get(chave)
+        if categoria is None:
+            categoria = Categoria(nome=nome[:100])
+            db.session.add(categoria)
+            self._por_nome[chave] = categoria
+            self.criadas += 1
+        return categoria
+
+
+def importar(caminho, formato=None, pasta_imagens=None, pasta_uploads=None, formatos_imagem=('webp', 'jpeg'),
+             tamanho_lote=1000, workers=None, retomar=True, log=print):
+    """
+    Importa o arquivo em transações de 'tamanho_lote' produtos. O progresso
+    (linhas já importadas) é gravado NA MESMA transação de cada lote, então
+    uma importação interrompida recomeça exatamente do primeiro lote que não
+    foi salvo. Retorna um dict com o resumo.
+    """
+    formato = detectar_formato(caminho, formato)
+    chave = f"{os.path.abspath(caminho)}:{os.path.getsize(caminho)}"
+
+    progresso = ImportacaoCatalogo.query.filter_by(chave=chave).first()
+    if progresso is None:
+        progresso = ImportacaoCatalogo(chave=chave, linhas_processadas=0, concluida=False)
+        db.session.add(progresso)
+        db.session.commit()
+    elif not retomar or progresso.concluida:
+        if progresso.concluida and retomar:
+            log("Este arquivo já foi importado por completo (use --do-inicio para importar de novo).")
+            return {'importados': 0, 'pulados': progresso.linhas_processadas, 'erros': 0, 'categorias_criadas': 0}
+        progresso.linhas_processadas = 0
+        progresso.concluida = False
+        db.session.commit()
+
+    ja_feitas = progresso.linhas_processadas
+    if ja_feitas:
+        log(f"Retomando a partir da linha {ja_feitas + 1}.")
+
+    categorias = ResolvedorCategorias()
+    resumo = {'importados': 0, 'pulados': ja_feitas, 'erros': 0, 'categorias_criadas': 0}
+    linhas = islice(enumerate(ler_linhas(caminho, formato), start=1), ja_feitas, None)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+
+            validas = []
+            for numero, bruta in lote:
+                try:
+                    validas.append(normalizar_linha(bruta))
+                except (LinhaInvalida, AttributeError) as e:
+                    resumo['erros'] += 1
+                    log(f"  linha {numero}: {e}")
+
+            # Imagens do lote em paralelo (cada arquivo uma vez só)
+            salvas = {}
+            if pasta_imagens:
+                origens = {os.path.join(pasta_imagens, img) for linha in validas for img in linha['imagens']}
+                futuros = [pool.submit(_processar_imagem, o, pasta_uploads, formatos_imagem) for o in origens]
+                for futuro in futuros:
+                    origem, filename, erro = futuro.result()
+                    if erro:
+                        log(f"  imagem {origem}: {erro}")
+                    if filename:
+                        salvas[origem] = filename
+
+            novos = []
+            for linha in validas:
+                produto = Produto(nome=linha['nome'], descricao=linha['descricao'],
+                                  preco=linha['preco'], destaque=linha['destaque'])
+                produto.categorias = list({id(c): c for c in map(categorias, linha['categorias'])}.values())
+                arquivos = [salvas[o] for o in (os.path.join(pasta_imagens, i) for i in linha['imagens'])
+                            if o in salvas] if pasta_imagens else []
+                produto.imagens = [ImagemProduto(url_imagem=f) for f in arquivos]
+                produto.imagem_destaque_url = arquivos[0] if arquivos else None
+                novos.append(produto)
+
+            # O mapa de identidade da sessão guarda referências fracas: depois do
+            # commit os produtos do lote são liberados junto com a lista 'novos'
+            db.session.add_all(novos)
+            db.session.flush() # Gera os ids para o índice de busca e a listagem
+            search.indexar_produtos(novos)
+            listing.atualizar_produtos(novos)
+            progresso.linhas_processadas = lote[-1][0]
+            db.session.commit()
+
+            resumo['importados'] += len(novos)
+            log(f"  {progresso.linhas_processadas} linhas lidas, {resumo['importados']} produtos importados")
+
+    progresso.concluida = True
+    db.session.commit()
+    resumo['categorias_criadas'] = categorias.criadas
+    return resumo
+
+
+def _produto_para_linha(produto, formato):
+    categorias = [c.nome for c in produto.categorias]
+    imagens_produto = [img.url_imagem for img in produto.imagens]
+    linha = {
+        'id': produto.id,
+        'nome': produto.nome,
+        'descricao': produto.descricao or '',
+        'preco': produto.preco,
+        'destaque': bool(produto.destaque),
+        'categorias': categorias,
+        'imagens': imagens_produto,
+        'imagem_destaque': produto.imagem_destaque_url or '',
+    }
+    if formato == 'csv':
+        linha['preco'] = f"{produto.preco:.2f}"
+        linha['destaque'] = '1' if produto.destaque else '0'
+        linha['categorias'] = '|'.join(categorias)
+        linha['imagens'] = '|'.join(imagens_produto)
+    return linha
+
+
+def exportar(destino, formato=None, tamanho_lote=500):
+    """
+    Exporta o catálogo lendo do banco em lotes ('yield_per') e escrevendo
+    cada produto assim que é lido. 'destino' '-' escreve na saída padrão.
+    Retorna quantos produtos foram exportados.
+    """
+    formato = detectar_formato(destino if destino != '-' else '', formato)
+    saida = sys.stdout if destino == '-' else open(destino, 'w', newline='', encoding='utf-8')
+    total = 0
+    try:
+        escritor = None
+        if formato == 'csv':
+            escritor = csv.DictWriter(saida, fieldnames=COLUNAS)
+            escritor.writeheader()
+
+        resultado = db.session.execute(
+            sa.select(Produto)
+            .options(selectinload(Produto.categorias), selectinload(Produto.imagens))
+            .order_by(Produto.id)
+            .execution_options(yield_per=tamanho_lote)
+        ).scalars()
+        for produto in resultado:
+            linha = _produto_para_linha(produto, formato)
+            if escritor:
+                escritor.writerow(linha)
+            else:
+                saida.write(json.dumps(linha, ensure_ascii=False) + '\n')
+            total += 1
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    return total
@@ -13,7 +13,165 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
+
+    # Perfil do SQLite (ver db_engine.py): 'padrao' deixa como o SQLAlchemy
+    # cria; 'producao' liga WAL, ajusta os pragmas e separa as conexões de
+    # leitura (rotas públicas) da conexão única de escrita de cada worker.
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE') or 'padrao'
+    SQLITE_PRAGMAS = {} # Sobrescreve pragmas do perfil, ex: {'cache_size': -64000}
+    # Conexões de leitura por worker (acompanhe o número de threads do gunicorn)
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE') or 8)
+    SQLITE_WRITE_TIMEOUT = 30
+    # Rotas que só leem do banco: usam as conexões 'query_only'
+    SQLITE_READ_ENDPOINTS = {
+        'index', 'sobre', 'loja', 'loja_produtos', 'get_produto_data',
+        'get_produtos_data', 'uploaded_file', 'sugestoes_busca',
+        'sitemap', 'sitemap_parte', 'feed_produtos',
+    }
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(basedir, 'static', 'uploads')
+
+    # Formatos das variantes responsivas das imagens ('avif' é opcional e
+    # mais lento para gerar; o JPEG é sempre gerado como fallback)
+    IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+
+    # API de produtos (/produto/<id> e /produtos?ids=...)
+    PRODUTOS_BATCH_MAX = 100
+    PRODUTO_JSON_MAX_AGE = 60
+    # Embute no HTML os detalhes dos produtos da página (o modal abre sem fetch)
+    EMBED_PRODUCT_DETAILS = True
+
+    # Cache HTTP dos uploads (/uploads/...): os nomes são únicos, então o
+    # conteúdo nunca muda e pode ficar em cache "para sempre"
+    UPLOADS_MAX_AGE = 365 * 24 * 3600
+    UPLOADS_IMMUTABLE = True
+    # Entrega dos bytes pelo proxy: None, 'x-accel' (nginx) ou 'x-sendfile' (Apache/lighttpd)
+    UPLOADS_OFFLOAD = os.environ.get('UPLOADS_OFFLOAD') or None
+    # Prefixo da 'location internal' do nginx que aponta para UPLOAD_FOLDER
+    UPLOADS_X_ACCEL_PREFIX = '/_uploads/'
+    # 'flask gc-uploads' não apaga arquivos mais novos que isto (segundos):
+    # podem ser de um upload cuja transação ainda não terminou
+    UPLOADS_GC_CARENCIA = 3600
+
+    # Cache do HTML das páginas públicas, invalidado pela versão do catálogo.
+    # Depois de uma alteração, a página antiga ainda é servida por até
+    # PAGE_CACHE_STALE_MAX segundos enquanto uma requisição gera a nova.
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_MAX_ENTRIES = 500
+    PAGE_CACHE_STALE_MAX = 30
+    PAGE_CACHE_MAX_AGE = 0 # Navegadores/proxies revalidam sempre (ETag/Last-Modified)
+
+    # Instrumentação de SQL por requisição (header Server-Timing + log JSON).
+    # SQL_PROFILER_STRICT=True (ex: nos testes) faz a rota falhar se passar do
+    # orçamento de queries ou repetir a mesma query N+1 vezes. Os orçamentos
+    # são do pior caso: caches frios, sem o snapshot e com um admin logado
+    # (+1: o Flask-Login carrega o usuário); tests/test_orcamento_sql.py confere.
+    SQL_PROFILER_ENABLED = True
+    SQL_PROFILER_LOG = os.environ.get('SQL_PROFILER_LOG', '1') != '0'
+    SQL_PROFILER_STRICT = os.environ.get('SQL_PROFILER_STRICT') == '1'
+    SQL_QUERY_BUDGET_DEFAULT = 20
+    SQL_QUERY_BUDGETS = {
+        'index': 9, # +2 quando um banner linca um produto fora dos destaques
+        'sobre': 3,
+        'loja': 11, # +2 quando o índice de facetas é refeito
+        'loja_produtos': 4,
+        'get_produto_data': 3,
+        'get_produtos_data': 3,
+        'checkout': 3,
+        # Admin: não crescem com o número de imagens (INSERTs em lote). Com
+        # STATIC_EXPORT_DIR, +1 ou +2 por commit (as anotações do site estático)
+        'add_produto': 16,
+        'edit_produto': 24,
+        'delete_produto': 15,
+    }
+    SQL_N_PLUS_ONE_THRESHOLD = 3
+
+    # Profiling de requisições (ver request_profiler.py): um admin logado
+    # adiciona ?_perfil=prof|texto|amostras (ou o header X-Perfil) e recebe o
+    # perfil da requisição. Com PROFILER_SAMPLE_RATE > 0 (ex: 0.01), essa fração
+    # das requisições é medida e as PROFILER_KEEP mais lentas ficam em /admin/perfis.
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '1') != '0'
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE') or 0)
+    PROFILER_KEEP = 20
+    PROFILER_SAMPLE_INTERVAL = 0.001 # Segundos entre as amostras do formato 'amostras'
+
+    # Métricas no formato do Prometheus (GET /metrics, ver metrics.py). Cada
+    # worker grava as suas em METRICS_DIR e o /metrics soma todas. Com
+    # METRICS_TOKEN definido, o Prometheus precisa mandar 'Authorization: Bearer <token>'.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(instance_dir, 'metrics')
+    METRICS_FLUSH_INTERVAL = 5
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+    # Arquivos de versão dos caches (compartilhados entre os workers)
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(instance_dir, 'cache')
+
+    # Paginação da loja (/loja e /loja/produtos)
+    PRODUTOS_POR_PAGINA = 24
+    PRODUTOS_POR_PAGINA_MAX = 100
+    # Tabela de produtos do admin e sugestões do campo de produto dos banners
+    ADMIN_PRODUTOS_POR_PAGINA = 50
+    ADMIN_SUGESTOES_MAX = 10
+    # Limites das faixas de preço das facetas: 0-50, 50-100, ..., acima de 500
+    FACETAS_FAIXAS_PRECO = (0, 50, 100, 200, 500)
+    # Sugestões da busca enquanto se digita (/loja/sugestoes)
+    SUGESTOES_MIN_CARACTERES = 2
+    SUGESTOES_PRODUTOS = 8
+    SUGESTOES_CATEGORIAS = 3
+    SUGESTOES_MAX_AGE = 60 # Segundos de cache no navegador/CDN
     
+    # Checkout (/checkout): limites do carrinho e gravação em lote dos pedidos.
+    # Os pedidos vão para um diário em disco e uma thread grava até
+    # CHECKOUT_LOTE_MAX deles por commit, a cada CHECKOUT_INTERVALO segundos.
+    # Um lote que falha CHECKOUT_TENTATIVAS vezes é dividido ao meio; o
+    # pedido que falhar sozinho vai para o arquivo de rejeitados.
+    CHECKOUT_ITENS_MAX = 50
+    CHECKOUT_QUANTIDADE_MAX = 99
+    CHECKOUT_LOTE_MAX = 200
+    CHECKOUT_INTERVALO = 0.05
+    CHECKOUT_TENTATIVAS = 5
+    CHECKOUT_FSYNC = True
+    CHECKOUT_DIARIO_DIR = os.environ.get('CHECKOUT_DIARIO_DIR') or os.path.join(instance_dir, 'pedidos')
+
+    # Tarefas em segundo plano (jobs.py): processamento e exclusão de imagens.
+    # Com JOBS_EMBEDDED cada worker web roda o despachante numa thread; com
+    # vários workers, prefira JOBS_EMBEDDED=0 e um processo 'flask run-jobs'.
+    JOBS_EMBEDDED = os.environ.get('JOBS_EMBEDDED', '1') != '0'
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS') or 2)
+    JOBS_POLL_INTERVAL = 1.0
+    JOBS_MAX_ATTEMPTS = 3
+    JOBS_RETRY_DELAY = 5 # Segundos antes da 2ª tentativa (dobra a cada falha)
+    JOBS_TIMEOUT = 300 # Tarefa 'executando' sem batimento há mais tempo volta para a fila
+    JOBS_HEARTBEAT = 30 # Segundos entre os batimentos das tarefas em andamento
+    JOBS_KEEP_DAYS = 7
+
+    # Site estático ('flask build-static', ver static_site.py): pasta que o
+    # nginx serve. Com ela definida, cada alteração anota as páginas a refazer
+    # no próximo 'flask build-static --incremental'.
+    STATIC_EXPORT_DIR = os.environ.get('STATIC_EXPORT_DIR') or None
+    STATIC_EXPORT_BATCH = 500 # Produtos por consulta ao gerar os JSON
+
+    # Produtos relacionados do modal (ver related.py): quantos vizinhos guardar
+    RELATED_PRODUCTS_K = 8
+
+    # CSS/JS de produção ('flask build-assets', ver assets.py): minificados,
+    # com o hash no nome e versões .gz/.br, servidos em /assets/
+    ASSETS_DIR = os.environ.get('ASSETS_DIR') or os.path.join(basedir, 'static', 'dist')
+    ASSETS_FILES = ('css/style.css', 'js/main.js')
+    ASSETS_MAX_AGE = 365 * 24 * 3600 # Nome muda a cada conteúdo: pode ficar em cache para sempre
+
+    # Snapshot binário do catálogo (ver snapshot.py), mapeado em memória por
+    # todos os workers; refeito em segundo plano quando o catálogo muda
+    SNAPSHOT_ENABLED = os.environ.get('SNAPSHOT_ENABLED', '1') != '0'
+    SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH') or os.path.join(instance_dir, 'catalogo.snapshot')
+    SNAPSHOT_DELAY = 1.0 # Segundos de espera antes de refazer (junta alterações seguidas)
+
+    # Sitemap e feed de produtos (/sitemap.xml, /feed/produtos.csv|xml e
+    # 'flask build-feeds', ver feeds.py)
+    SITE_URL = os.environ.get('SITE_URL') or None # Ex: https://modaafro.com.br (URLs do 'build-feeds')
+    FEEDS_EXPORT_DIR = os.environ.get('FEEDS_EXPORT_DIR') or None # Padrão: STATIC_EXPORT_DIR
+    FEEDS_BATCH = 1000 # Produtos por lote lido do banco
+    FEEDS_GZIP_LEVEL = 6
+    FEEDS_MAX_AGE = 3600
+
     # Configure o número de WhatsApp para o checkout
     WHATSAPP_NUMBER = "5511981189800" 
\ No newline at end of file
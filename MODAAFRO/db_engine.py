@@ -0,0 +1,120 @@
+# db_engine.py
+#
+# Perfil do SQLite (config SQLITE_PROFILE):
+#
+#   'padrao'   -> como o SQLAlchemy cria (journal em modo rollback);
+#   'producao' -> WAL + pragmas ajustados, e duas engines no mesmo arquivo:
+#                 uma de escrita (1 conexão por processo) e outra só de
+#                 leitura (pool do tamanho das threads do worker), usada
+#                 pelas rotas públicas listadas em SQLITE_READ_ENDPOINTS.
+#
+# Com WAL as leituras não esperam a escrita de outro worker terminar (nem
+# o contrário); o 'busy_timeout' faz dois escritores simultâneos esperarem
+# a vez em vez de falharem com "database is locked".
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Pragmas de cada perfil, aplicados em toda conexão nova
+PERFIS = {
+    'padrao': {},
+    'producao': {
+        'busy_timeout': 5000,        # ms esperando o lock antes de dar erro
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',     # seguro com WAL (fsync só no checkpoint)
+        'cache_size': -20000,        # ~20 MB de cache de páginas por conexão
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+BIND_LEITURA = 'leitura'
+
+
+def _sqlite(uri):
+    return uri.startswith('sqlite:') and ':memory:' not in uri
+
+
+def configurar(app):
+    """
+    Ajusta as opções das engines conforme o perfil. Precisa rodar ANTES do
+    'db.init_app(app)', que é quando o Flask-SQLAlchemy cria as engines.
+    """
+    app.config.setdefault('SQLITE_PROFILE', 'padrao')
+    app.config.setdefault('SQLITE_PRAGMAS', {})
+    app.config.setdefault('SQLITE_READ_POOL_SIZE', 8)
+    app.config.setdefault('SQLITE_WRITE_TIMEOUT', 30)
+    app.config.setdefault('SQLITE_READ_ENDPOINTS', set())
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    perfil = app.config['SQLITE_PROFILE']
+    if perfil not in PERFIS:
+        raise ValueError(f"SQLITE_PROFILE inválido: {perfil!r} (use {', '.join(PERFIS)})")
+    if perfil == 'padrao' or not _sqlite(uri):
+        return
+
+    # Um único escritor por processo: quem precisar escrever espera na fila
+    # do pool (SQLITE_WRITE_TIMEOUT) em vez de disputar o lock do arquivo
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': app.config['SQLITE_WRITE_TIMEOUT'],
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[BIND_LEITURA] = {
+        'url': uri,
+        'pool_size': app.config['SQLITE_READ_POOL_SIZE'],
+        'max_overflow': app.config['SQLITE_READ_POOL_SIZE'],
+    }
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def instalar(app, db):
+    """Registra os pragmas nas engines e a escolha da engine por rota (depois do init_app)."""
+    perfil = app.config['SQLITE_PROFILE']
+    pragmas = {**PERFIS[perfil], **app.config['SQLITE_PRAGMAS']}
+    with app.app_context():
+        engines = db.engines
+        if not _sqlite(str(engines[None].url)):
+            return
+        if pragmas:
+            event.listen(engines[None], 'connect', _aplicar_pragmas(pragmas))
+        if BIND_LEITURA in engines:
+            event.listen(engines[BIND_LEITURA], 'connect', _aplicar_pragmas({**pragmas, 'query_only': 'ON'}))
+
+    leitura = app.config['SQLITE_READ_ENDPOINTS']
+
+    @app.before_request
+    def _marcar_rota_de_leitura():
+        if request.endpoint in leitura:
+            g.db_somente_leitura = True
+
+
+def _aplicar_pragmas(pragmas):
+    def ao_conectar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome} = {valor}")
+        cursor.close()
+    return ao_conectar
+
+
+def somente_leitura():
+    return has_request_context() and g.get('db_somente_leitura', False)
+
+
+class SessaoRoteada(Session):
+    """
+    Sessão do Flask-SQLAlchemy que manda as consultas das rotas de leitura
+    para a engine 'leitura' (quando o perfil a cria). Qualquer flush (escrita)
+    continua indo para a engine principal, de escrita.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and somente_leitura():
+            engine = self._db.engines.get(BIND_LEITURA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
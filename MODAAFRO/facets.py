@@ -0,0 +1,203 @@
+# facets.py
+#
+# Navegação por facetas da loja: categorias (várias ao mesmo tempo), faixas
+# de preço e destaque, com a contagem de produtos de cada opção.
+#
+# As contagens vêm de um índice pré-calculado: para cada valor de faceta,
+# um bitset (um int do Python, com o bit 'id' ligado para cada produto).
+# Combinar filtros é um AND/OR de bitsets e contar é um 'bit_count()', então
+# a barra lateral não faz nenhum COUNT no banco e custa o mesmo com 1k ou
+# 100k produtos. O índice é refeito (uma consulta ao read model da
+# listagem) quando a versão do catálogo muda, ou seja, depois de qualquer
+# alteração de produto.
+
+from collections import defaultdict, namedtuple
+
+import sqlalchemy as sa
+
+import listing
+from models import db, produto_categoria
+
+# Uma faixa de preço: [minimo, maximo) ('maximo' None = sem limite)
+Faixa = namedtuple('Faixa', ['chave', 'minimo', 'maximo', 'rotulo'])
+
+
+def faixas_preco(limites):
+    """(0, 50, 100) -> faixas '0-50', '50-100' e '100-' (acima de 100)."""
+    limites = sorted(limites)
+    faixas = []
+    for minimo, maximo in zip(limites, list(limites[1:]) + [None]):
+        if maximo is None:
+            rotulo = f"Acima de R$ {minimo:g}"
+        elif minimo == 0:
+            rotulo = f"Até R$ {maximo:g}"
+        else:
+            rotulo = f"R$ {minimo:g} a {maximo:g}"
+        faixas.append(Faixa(f"{minimo:g}-{'' if maximo is None else f'{maximo:g}'}", minimo, maximo, rotulo))
+    return faixas
+
+
+# Maior inteiro do SQLite: um id acima disso numa consulta levanta OverflowError
+ID_MAX = 2**63 - 1
+
+
+def ler_id(valor):
+    """
+    Id vindo da URL ('12', ' 12 ') ou None; só dígitos ASCII ('²'.isdigit()
+    também é True) e no máximo ID_MAX.
+    """
+    valor = valor.strip()
+    if not (valor.isascii() and valor.isdigit()) or len(valor) > 19:
+        return None
+    numero = int(valor)
+    return numero if numero <= ID_MAX else None
+
+
+class Selecao(namedtuple('Selecao', ['categorias', 'faixas', 'destaque'])):
+    """Filtros escolhidos na URL: ?categoria_id=1&categoria_id=4&preco=0-50&destaque=1"""
+
+    @classmethod
+    def da_url(cls, args, categorias_validas, faixas):
+        """Lê os filtros da URL, descartando valores inexistentes."""
+        categorias = {ler_id(v) for v in args.getlist('categoria_id')} & set(categorias_validas)
+        escolhidas = set(args.getlist('preco'))
+        return cls(
+            categorias=tuple(sorted(categorias)),
+            faixas=tuple(f.chave for f in faixas if f.chave in escolhidas),
+            destaque=args.get('destaque') == '1',
+        )
+
+    @property
+    def vazia(self):
+        return not (self.categorias or self.faixas or self.destaque)
+
+    def alternar(self, faceta, valor=None):
+        """Cópia com 'valor' ligado/desligado na faceta (links da barra lateral)."""
+        if faceta == 'destaque':
+            return self._replace(destaque=not self.destaque)
+        atuais = getattr(self, faceta)
+        novos = tuple(v for v in atuais if v != valor) if valor in atuais else atuais + (valor,)
+        return self._replace(**{faceta: novos})
+
+    def params(self):
+        """Parâmetros para o 'url_for' (listas viram parâmetros repetidos)."""
+        return {
+            'categoria_id': list(self.categorias) or None,
+            'preco': list(self.faixas) or None,
+            'destaque': '1' if self.destaque else None,
+        }
+
+
+def filtrar(select, selecao, faixas):
+    """
+    Aplica a seleção num SELECT da listagem (listing.listagem); categorias
+    e faixas: qualquer uma das escolhidas.
+    """
+    colunas = listing.listagem.c
+    if selecao.categorias:
+        # EXISTS correlacionado: percorre a listagem já na ordem (nome, id) e para
+        # na página; um IN (subquery) leria todos os produtos da categoria antes
+        select = select.where(sa.exists().where(
+            produto_categoria.c.produto_id == colunas.id,
+            produto_categoria.c.categoria_id.in_(selecao.categorias)
+        ))
+    if selecao.faixas:
+        condicoes = []
+        for faixa in faixas:
+            if faixa.chave in selecao.faixas:
+                condicao = colunas.preco >= faixa.minimo
+                if faixa.maximo is not None:
+                    condicao = sa.and_(condicao, colunas.preco < faixa.maximo)
+                condicoes.append(condicao)
+        select = select.where(sa.or_(*condicoes))
+    if selecao.destaque:
+        select = select.where(colunas.destaque.is_(True))
+    return select
+
+
+def bitset(ids):
+    """Bitset com os 'ids' ligados. Monta os bytes e converte uma vez só (O(n))."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class IndiceFacetas:
+    """Bitsets de produtos por categoria, por faixa de preço e em destaque."""
+
+    __slots__ = ('todos', 'categorias', 'faixas', 'destaque', 'total_produtos')
+
+    def __init__(self, todos, categorias, faixas, destaque, total_produtos):
+        self.todos = todos
+        self.categorias = categorias
+        self.faixas = faixas
+        self.destaque = destaque
+        self.total_produtos = total_produtos
+
+    @classmethod
+    def construir(cls, faixas):
+        """Lê (id, preco, destaque, categorias) do read model da listagem."""
+        colunas = listing.listagem.c
+        ids = []
+        por_faixa = defaultdict(list)
+        por_categoria = defaultdict(list)
+        em_destaque = []
+        for produto_id, preco, destaque, categoria_ids in db.session.execute(
+                sa.select(colunas.id, colunas.preco, colunas.destaque, colunas.categoria_ids)):
+            ids.append(produto_id)
+            for faixa in faixas:
+                if preco >= faixa.minimo and (faixa.maximo is None or preco < faixa.maximo):
+                    por_faixa[faixa.chave].append(produto_id)
+                    break
+            if destaque:
+                em_destaque.append(produto_id)
+            for categoria_id in listing.ler_categorias(categoria_ids):
+                por_categoria[categoria_id].append(produto_id)
+
+        return cls(
+            todos=bitset(ids),
+            categorias={c: bitset(p) for c, p in por_categoria.items()},
+            faixas={f.chave: bitset(por_faixa[f.chave]) for f in faixas},
+            destaque=bitset(em_destaque),
+            total_produtos=len(ids),
+        )
+
+    def contar(self, selecao, base=None):
+        """
+        Contagens para a barra lateral. Cada faceta é contada com os filtros
+        das OUTRAS facetas (e da busca, 'base'), então o número ao lado de uma
+        categoria diz quantos produtos aparecem se ela também for marcada.
+        """
+        universo = self.todos if base is None else self.todos & base
+
+        def uniao(bitsets):
+            resultado = 0
+            for b in bitsets:
+                resultado |= b
+            return resultado
+
+        filtro_categorias = uniao(self.categorias.get(c, 0) for c in selecao.categorias) \
+            if selecao.categorias else None
+        filtro_faixas = uniao(self.faixas.get(f, 0) for f in selecao.faixas) if selecao.faixas else None
+        filtro_destaque = self.destaque if selecao.destaque else None
+
+        def aplicar(*filtros):
+            resultado = universo
+            for filtro in filtros:
+                if filtro is not None:
+                    resultado &= filtro
+            return resultado
+
+        base_categorias = aplicar(filtro_faixas, filtro_destaque)
+        base_faixas = aplicar(filtro_categorias, filtro_destaque)
+        base_destaque = aplicar(filtro_categorias, filtro_faixas)
+        return {
+            'categorias': {c: (b & base_categorias).bit_count() for c, b in self.categorias.items()},
+            'faixas': {f: (b & base_faixas).bit_count() for f, b in self.faixas.items()},
+            'destaque': (self.destaque & base_destaque).bit_count(),
+            'total': aplicar(filtro_categorias, filtro_faixas, filtro_destaque).bit_count(),
+        }
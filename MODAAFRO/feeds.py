@@ -0,0 +1,208 @@
+# feeds.py
+#
+# sitemap.xml (buscadores) e feed de produtos em CSV/XML (marketplaces),
+# servidos em /sitemap.xml e /feed/produtos.<csv|xml> e gravados em disco
+# por 'flask build-feeds' (para o nginx servir direto).
+#
+# Tudo é gerado em streaming: os produtos vêm do read model da listagem em
+# lotes ('yield_per', o cursor fica aberto no banco) e cada pedaço de ~64 KB
+# é comprimido e enviado/gravado assim que fica pronto. A memória do worker
+# não cresce com o tamanho do catálogo.
+#
+# Os produtos não têm página própria: a URL de cada um é /loja?produto=<id>,
+# que abre a loja com o modal do produto. Acima de 50.000 URLs (limite do
+# protocolo), o /sitemap.xml vira um índice de /sitemap-<n>.xml.
+
+import csv
+import gzip
+import io
+import os
+import tempfile
+import zlib
+from xml.sax.saxutils import escape
+
+import sqlalchemy as sa
+from flask import url_for
+
+import listing
+from models import Categoria
+
+URLS_POR_SITEMAP = 50000
+TAMANHO_PEDACO = 64 * 1024
+
+# Content-Type completo (com charset) de cada resposta
+CONTENT_TYPE_SITEMAP = 'application/xml; charset=utf-8'
+FORMATOS_FEED = {
+    'csv': 'text/csv; charset=utf-8',
+    'xml': 'application/xml; charset=utf-8',
+}
+COLUNAS_FEED = ['id', 'nome', 'preco', 'link', 'imagem', 'categorias']
+
+_XMLNS_SITEMAP = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+# --- Sitemap ---
+
+def _paginas_fixas(sessao):
+    """Início, sobre, loja e a página de cada categoria."""
+    urls = [url_for(endpoint, _external=True) for endpoint in ('index', 'sobre', 'loja')]
+    for categoria_id in sessao.scalars(sa.select(Categoria.id).order_by(Categoria.id)):
+        urls.append(url_for('loja', categoria_id=categoria_id, _external=True))
+    return urls
+
+
+def total_sitemaps(sessao):
+    """Quantos arquivos de sitemap o catálogo precisa (1 = sem índice)."""
+    produtos = sessao.scalar(sa.select(sa.func.count()).select_from(listing.listagem))
+    total = len(_paginas_fixas(sessao)) + produtos
+    return max(1, -(-total // URLS_POR_SITEMAP))
+
+
+def _urls(sessao, inicio, fim, lote):
+    """URLs de 'inicio' a 'fim' (páginas fixas e depois os produtos, por id)."""
+    fixas = _paginas_fixas(sessao)
+    yield from fixas[inicio:fim]
+    inicio, fim = max(inicio - len(fixas), 0), fim - len(fixas)
+    if fim <= inicio:
+        return
+    colunas = listing.listagem.c
+    consulta = (sa.select(colunas.id).order_by(colunas.id)
+                .offset(inicio).limit(fim - inicio)
+                .execution_options(yield_per=lote))
+    prefixo = url_for('loja', _external=True) + '?produto='
+    for (produto_id,) in sessao.execute(consulta):
+        yield f'{prefixo}{produto_id}'
+
+
+def gerar_sitemap(sessao, pagina=None, lote=1000):
+    """
+    Pedaços (str) do sitemap. Sem 'pagina': o sitemap inteiro ou, se não
+    couber num arquivo, o índice dos sitemaps; com 'pagina' (1, 2...), só
+    aquela parte (confira antes com 'total_sitemaps' se ela existe).
+    """
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    total = total_sitemaps(sessao) if pagina is None else 1
+    if total > 1:
+        yield f'<sitemapindex xmlns="{_XMLNS_SITEMAP}">\n'
+        for n in range(1, total + 1):
+            url = url_for('sitemap_parte', pagina=n, _external=True)
+            yield f'  <sitemap><loc>{escape(url)}</loc></sitemap>\n'
+        yield '</sitemapindex>\n'
+        return
+    inicio = ((pagina or 1) - 1) * URLS_POR_SITEMAP
+    yield f'<urlset xmlns="{_XMLNS_SITEMAP}">\n'
+    for url in _urls(sessao, inicio, inicio + URLS_POR_SITEMAP, lote):
+        yield f'  <url><loc>{escape(url)}</loc></url>\n'
+    yield '</urlset>\n'
+
+
+# --- Feed de produtos ---
+
+def _produtos(sessao, lote):
+    """Dicts com as colunas do feed, em ordem de id, lidos em lotes."""
+    categorias = dict(sessao.execute(sa.select(Categoria.id, Categoria.nome)).all())
+    colunas = listing.listagem.c
+    consulta = (sa.select(colunas.id, colunas.nome, colunas.preco,
+                          colunas.imagem_destaque_url, colunas.categoria_ids)
+                .order_by(colunas.id)
+                .execution_options(yield_per=lote))
+    prefixo = url_for('loja', _external=True) + '?produto='
+    for linha in sessao.execute(consulta):
+        yield {
+            'id': linha.id,
+            'nome': linha.nome,
+            'preco': f'{linha.preco:.2f}',
+            'link': f'{prefixo}{linha.id}',
+            'imagem': url_for('uploaded_file', filename=linha.imagem_destaque_url, _external=True)
+                      if linha.imagem_destaque_url else '',
+            'categorias': [categorias[c] for c in listing.ler_categorias(linha.categoria_ids)
+                           if c in categorias],
+        }
+
+
+def gerar_feed_csv(sessao, lote=1000):
+    """Pedaços (str) do feed em CSV; as categorias vão separadas por '|', como no import-catalog."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_FEED)
+    for produto in _produtos(sessao, lote):
+        produto['categorias'] = '|'.join(produto['categorias'])
+        escritor.writerow([produto[coluna] for coluna in COLUNAS_FEED])
+        if buffer.tell() >= TAMANHO_PEDACO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gerar_feed_xml(sessao, lote=1000):
+    """Pedaços (str) do feed em XML: <produtos><produto>...</produto></produtos>."""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<produtos>\n'
+    for produto in _produtos(sessao, lote):
+        categorias = ''.join(f'<categoria>{escape(nome)}</categoria>' for nome in produto['categorias'])
+        yield (f'  <produto><id>{produto["id"]}</id><nome>{escape(produto["nome"])}</nome>'
+               f'<preco>{produto["preco"]}</preco><link>{escape(produto["link"])}</link>'
+               f'<imagem>{escape(produto["imagem"])}</imagem>'
+               f'<categorias>{categorias}</categorias></produto>\n')
+    yield '</produtos>\n'
+
+
+GERADORES_FEED = {'csv': gerar_feed_csv, 'xml': gerar_feed_xml}
+
+
+# --- Saída ---
+
+def agrupar(pedacos, tamanho=TAMANHO_PEDACO):
+    """Junta os pedaços (str) em blocos de bytes de ~'tamanho' (menos escritas/pacotes pequenos)."""
+    buffer, acumulado = [], 0
+    for pedaco in pedacos:
+        buffer.append(pedaco)
+        acumulado += len(pedaco)
+        if acumulado >= tamanho:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, acumulado = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def comprimir(blocos, nivel=6):
+    """Blocos de bytes -> blocos do mesmo conteúdo em gzip, sem juntar tudo na memória."""
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31) # 31: cabeçalho gzip
+    for bloco in blocos:
+        saida = compressor.compress(bloco)
+        if saida:
+            yield saida
+    yield compressor.flush()
+
+
+def gravar(caminho, pedacos, nivel=6):
+    """
+    Grava o arquivo e a versão '.gz' (gzip_static do nginx) enquanto os
+    pedaços são gerados. Os dois trocam de lugar atomicamente no fim, então
+    o nginx nunca serve um arquivo pela metade. Retorna o tamanho em bytes.
+    """
+    pasta = os.path.dirname(caminho) or '.'
+    os.makedirs(pasta, exist_ok=True)
+    temporarios = []
+    try:
+        fd, tmp = tempfile.mkstemp(dir=pasta, prefix='.feed-')
+        temporarios.append(tmp)
+        fd_gz, tmp_gz = tempfile.mkstemp(dir=pasta, prefix='.feed-')
+        temporarios.append(tmp_gz)
+        tamanho = 0
+        with os.fdopen(fd, 'wb') as f, os.fdopen(fd_gz, 'wb') as bruto_gz, \
+                gzip.GzipFile(fileobj=bruto_gz, mode='wb', compresslevel=nivel, mtime=0) as f_gz:
+            for bloco in agrupar(pedacos):
+                f.write(bloco)
+                f_gz.write(bloco)
+                tamanho += len(bloco)
+        for temporario in temporarios:
+            os.chmod(temporario, 0o644) # mkstemp cria com 0600: o nginx precisa ler
+        os.replace(tmp, caminho)
+        os.replace(tmp_gz, caminho + '.gz')
+    except Exception:
+        for temporario in temporarios:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        raise
+    return tamanho
@@ -4,8 +4,9 @@ from flask_wtf import FlaskForm
 from wtforms import (
     StringField, PasswordField, SubmitField, BooleanField, 
     TextAreaField, FloatField, SelectField, MultipleFileField,
-    URLField
+    URLField, IntegerField
 )
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, Length, NumberRange, Optional
 from flask_wtf.file import FileField, FileAllowed
 
@@ -50,11 +51,12 @@ class BannerForm(FlaskForm):
                        validators=[FileAllowed(IMG_ALLOWED, 'Apenas imagens!')])
     
     # --- CAMPO NOVO ---
-    # Este campo será populado dinamicamente na rota
-    produto_selecionado = SelectField('...OU selecione um produto para lincar', 
-                                    coerce=int, 
-                                    validators=[Optional()], 
-                                    default=0)
+    # Id do produto escolhido no campo de busca (sugestões vêm de
+    # /admin/produtos/sugestoes); 0 = nenhum
+    produto_selecionado = IntegerField('...OU selecione um produto para lincar', 
+                                       widget=HiddenInput(), 
+                                       validators=[Optional(), NumberRange(min=0)], 
+                                       default=0)
     
     # --- CAMPO ANTIGO (MODIFICADO) ---
     # Não é mais obrigatório, só é usado se um produto NÃO for selecionado
@@ -0,0 +1,148 @@
+# images.py
+
+import os
+
+from PIL import Image, ImageOps, features
+
+# Larguras (px) geradas para cada uso da imagem no site
+LARGURAS = {
+    'thumb': (160,),          # miniaturas da galeria do modal (80px em telas 2x)
+    'card': (400, 600),       # cards da loja/home (300px de altura)
+    'modal': (800, 1200),     # imagem principal do modal
+    'banner': (800, 1200, 1600),
+}
+
+# Quais usos cada tipo de upload precisa
+PERFIS = {
+    'produto': ('thumb', 'card', 'modal'),
+    'banner': ('banner',),
+}
+
+# Subpasta (dentro de UPLOAD_FOLDER) onde ficam as variantes
+PASTA_VARIANTES = 'variantes'
+
+# Extensão e parâmetros do Pillow para cada formato
+FORMATOS = {
+    'avif': ('avif', 'AVIF', {'quality': 60}),
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+MIME = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def formatos_suportados(formatos):
+    """Filtra os formatos que o Pillow instalado consegue gravar."""
+    return [f for f in formatos if f == 'jpeg' or features.check(f)]
+
+
+def nome_variante(filename, largura, formato):
+    """Ex: ('abc.png', 400, 'webp') -> 'variantes/abc-400.webp'"""
+    base = filename.rsplit('.', 1)[0]
+    return f"{PASTA_VARIANTES}/{base}-{largura}.{FORMATOS[formato][0]}"
+
+
+def larguras_do_perfil(perfil):
+    larguras = set()
+    for uso in PERFIS[perfil]:
+        larguras.update(LARGURAS[uso])
+    return sorted(larguras)
+
+
+def _preparar(imagem, formato):
+    """Converte o modo de cor para um que o formato aceite."""
+    if formato == 'jpeg':
+        if imagem.mode in ('RGBA', 'LA', 'P'):
+            imagem = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            fundo.paste(imagem, mask=imagem.split()[-1])
+            return fundo
+        return imagem.convert('RGB')
+    if imagem.mode not in ('RGB', 'RGBA'):
+        transparente = 'A' in imagem.getbands() or 'transparency' in imagem.info
+        return imagem.convert('RGBA' if transparente else 'RGB')
+    return imagem
+
+
+def gerar_variantes(pasta, filename, perfil='produto', formatos=('webp', 'jpeg'), sobrescrever=False):
+    """
+    Gera as versões redimensionadas/recodificadas de uma imagem já salva
+    em 'pasta'. Nunca amplia: larguras maiores que o original são puladas
+    (a menor largura é sempre gerada). Retorna a lista de arquivos criados.
+    """
+    caminho = os.path.join(pasta, filename)
+    os.makedirs(os.path.join(pasta, PASTA_VARIANTES), exist_ok=True)
+    criados = []
+
+    with Image.open(caminho) as original:
+        original = ImageOps.exif_transpose(original) # Respeita a rotação da câmera
+        larguras = larguras_do_perfil(perfil)
+        larguras = [w for w in larguras if w <= original.width] or larguras[:1]
+
+        for largura in larguras:
+            altura = max(1, round(original.height * largura / original.width))
+            redimensionada = original.resize((largura, altura), Image.LANCZOS) \
+                if largura < original.width else original.copy()
+
+            for formato in formatos_suportados(formatos):
+                destino = os.path.join(pasta, nome_variante(filename, largura, formato))
+                if os.path.exists(destino) and not sobrescrever:
+                    continue
+                _, formato_pil, opcoes = FORMATOS[formato]
+                # Grava num temporário e renomeia: nunca servimos arquivo pela metade
+                tmp = destino + '.tmp'
+                _preparar(redimensionada, formato).save(tmp, formato_pil, **opcoes)
+                os.replace(tmp, destino)
+                criados.append(destino)
+
+    limpar_cache()
+    return criados
+
+
+def excluir_variantes(pasta, filename):
+    """Remove todas as variantes de uma imagem (de qualquer perfil)."""
+    todas = set()
+    for larguras in LARGURAS.values():
+        todas.update(larguras)
+    for largura in todas:
+        for formato in FORMATOS:
+            caminho = os.path.join(pasta, nome_variante(filename, largura, formato))
+            if os.path.exists(caminho):
+                os.remove(caminho)
+    limpar_cache()
+
+
+# Cache das larguras encontradas em disco, por (pasta, arquivo, uso, formato),
+# válido enquanto a versão recebida em 'larguras_disponiveis' não mudar
+_cache_larguras = {}
+_versao_larguras = None
+_CACHE_LARGURAS_MAX = 20000
+
+
+def limpar_cache():
+    _cache_larguras.clear()
+
+
+def larguras_disponiveis(pasta, filename, uso, formato, versao=None):
+    """
+    Larguras do 'uso' que existem em disco para a imagem. Os nomes de
+    upload são únicos e imutáveis, então o resultado fica em cache; só
+    não guardamos o "nenhuma" (a imagem pode ganhar variantes num backfill).
+
+    As variantes são geradas e apagadas em outros processos (tarefas, CLI),
+    então 'limpar_cache' lá não alcança este: passe em 'versao' uma versão
+    que eles incrementam (ex: VersaoCompartilhada) e, quando ela mudar, o
+    cache é descartado.
+    """
+    global _versao_larguras
+    if versao != _versao_larguras:
+        _cache_larguras.clear()
+        _versao_larguras = versao
+    chave = (pasta, filename, uso, formato)
+    larguras = _cache_larguras.get(chave)
+    if larguras is None:
+        larguras = tuple(w for w in LARGURAS[uso]
+                         if os.path.exists(os.path.join(pasta, nome_variante(filename, w, formato))))
+        if larguras and len(_cache_larguras) < _CACHE_LARGURAS_MAX:
+            _cache_larguras[chave] = larguras
+    return larguras
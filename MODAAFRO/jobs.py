@@ -0,0 +1,377 @@
+# jobs.py
+#
+# Tarefas em segundo plano, guardadas na própria tabela 'tarefa' do banco
+# (sem broker externo). As rotas só registram a tarefa, na mesma transação
+# da alteração; um despachante reserva as pendentes e as executa num pool
+# de processos, com novas tentativas em caso de erro.
+#
+# O despachante roda numa thread de cada worker web (JOBS_EMBEDDED=True,
+# o padrão) ou num processo separado: flask run-jobs
+
+import atexit
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import sqlalchemy as sa
+
+import images
+import related
+from cache import monitorar_commits
+from models import db, Tarefa
+
+logger = logging.getLogger('modaafro.jobs')
+
+# Funções das tarefas, por tipo. Rodam nos processos do pool: recebem só
+# dados simples (o 'contexto' com a config necessária e os argumentos).
+TIPOS = {}
+
+
+class TarefaInvalida(Exception):
+    """Erro que não adianta tentar de novo (ex: o arquivo não é uma imagem)."""
+
+
+def tipo_tarefa(nome):
+    def registrar(funcao):
+        TIPOS[nome] = funcao
+        return funcao
+    return registrar
+
+
+@tipo_tarefa('processar_imagem')
+def processar_imagem(contexto, filename, perfil='produto'):
+    """Confere o upload e gera as variantes responsivas."""
+    from PIL import Image, UnidentifiedImageError
+    caminho = os.path.join(contexto['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(caminho):
+        raise TarefaInvalida(f"Arquivo não encontrado: {filename}")
+    try:
+        with Image.open(caminho) as imagem:
+            imagem.verify()
+    except (UnidentifiedImageError, SyntaxError) as e:
+        raise TarefaInvalida(f"O arquivo não é uma imagem válida: {e}")
+    images.gerar_variantes(contexto['UPLOAD_FOLDER'], filename, perfil,
+                           formatos=contexto['IMAGE_VARIANT_FORMATS'])
+
+
+@tipo_tarefa('excluir_imagem')
+def excluir_imagem(contexto, filename, agendada_em=None):
+    """Remove o upload e todas as suas variantes."""
+    caminho = os.path.join(contexto['UPLOAD_FOLDER'], filename)
+    if agendada_em is not None and os.path.exists(caminho) and os.stat(caminho).st_mtime >= agendada_em:
+        return # O mesmo conteúdo foi enviado de novo depois do agendamento (ver uploads.py)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    images.excluir_variantes(contexto['UPLOAD_FOLDER'], filename)
+
+
+@tipo_tarefa('atualizar_relacionados')
+def atualizar_relacionados(contexto, produto_id):
+    """Refaz os relacionados do produto e corrige as listas dos produtos afetados."""
+    with related.engine(contexto['SQLALCHEMY_DATABASE_URI']).begin() as conexao:
+        related.atualizar(conexao, produto_id, contexto['RELATED_PRODUCTS_K'])
+
+
+def _executar(tipo, contexto, argumentos):
+    """Ponto de entrada no processo do pool."""
+    TIPOS[tipo](contexto, **argumentos)
+
+
+def _agora():
+    return datetime.datetime.utcnow()
+
+
+class FilaTarefas:
+    """Enfileira tarefas e (no despachante) as executa num pool de processos."""
+
+    def __init__(self, app=None, ao_concluir=None):
+        # ao_concluir(tipo, referencia), depois de cada tarefa que terminou (concluída ou falhou de vez)
+        self.ao_concluir = ao_concluir
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.executadas = 0
+        self.falhas = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_EMBEDDED', True)
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 3)
+        app.config.setdefault('JOBS_RETRY_DELAY', 5)
+        app.config.setdefault('JOBS_TIMEOUT', 300)
+        app.config.setdefault('JOBS_HEARTBEAT', 30)
+        app.config.setdefault('JOBS_KEEP_DAYS', 7)
+        self.app = app
+        # Acorda o despachante deste processo assim que uma tarefa é gravada
+        monitorar_commits(db.session, (Tarefa,), self._acordar.set)
+        if app.config['JOBS_EMBEDDED']:
+            app.before_request(self._garantir_despachante)
+        # No encerramento o concurrent.futures já recusa novas tarefas antes do
+        # 'atexit': as reservadas nesse intervalo voltam para a fila ('_passo')
+        atexit.register(self.parar)
+
+    # --- Lado das rotas ---
+
+    def enfileirar(self, tipo, referencia=None, max_tentativas=None, **argumentos):
+        """
+        Registra uma tarefa. Não faz commit: ela só passa a existir junto
+        com a alteração da rota (e some num rollback).
+        """
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+        tarefa = Tarefa(tipo=tipo, referencia=referencia, argumentos=json.dumps(argumentos),
+                        max_tentativas=max_tentativas or self.app.config['JOBS_MAX_ATTEMPTS'])
+        db.session.add(tarefa)
+        return tarefa
+
+    def enfileirar_varias(self, tipo, referencia, lista_argumentos, max_tentativas=None):
+        """
+        Como 'enfileirar', para várias tarefas do mesmo tipo (uma por item de
+        'lista_argumentos') num único INSERT. Também não faz commit.
+        """
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+        linhas = [{'tipo': tipo, 'referencia': referencia, 'argumentos': json.dumps(argumentos),
+                   'max_tentativas': max_tentativas or self.app.config['JOBS_MAX_ATTEMPTS']}
+                  for argumentos in lista_argumentos]
+        if linhas:
+            db.session.execute(sa.insert(Tarefa), linhas)
+
+    def em_aberto(self, referencia, tipos):
+        """True se a referência ainda tem tarefas desses tipos pendentes ou executando."""
+        return db.session.scalar(
+            sa.select(Tarefa.id)
+            .where(Tarefa.referencia == referencia, Tarefa.tipo.in_(tipos),
+                   Tarefa.estado.in_(('pendente', 'executando')))
+            .limit(1)
+        ) is not None
+
+    def situacao(self, referencia):
+        """Tarefas de uma referência (ex: 'produto:12'), da mais nova para a mais antiga."""
+        tarefas = db.session.scalars(
+            sa.select(Tarefa).where(Tarefa.referencia == referencia).order_by(Tarefa.id.desc()).limit(100)
+        )
+        return [t.resumo() for t in tarefas]
+
+    # --- Despachante ---
+
+    def _garantir_despachante(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._parar.clear()
+            self._thread = threading.Thread(target=self.executar, name='fila-tarefas', daemon=True)
+            self._thread.start()
+
+    def _contexto(self):
+        return {
+            'UPLOAD_FOLDER': self.app.config['UPLOAD_FOLDER'],
+            'IMAGE_VARIANT_FORMATS': list(self.app.config['IMAGE_VARIANT_FORMATS']),
+            'SQLALCHEMY_DATABASE_URI': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'RELATED_PRODUCTS_K': self.app.config['RELATED_PRODUCTS_K'],
+        }
+
+    def executar(self, ate_esvaziar=False):
+        """
+        Laço do despachante: reserva tarefas pendentes e as executa no pool.
+        Com 'ate_esvaziar', volta quando não houver mais nada a fazer.
+        """
+        workers = self.app.config['JOBS_WORKERS']
+        pool = self._novo_pool(workers)
+        em_andamento = {}
+        self._ultima_manutencao = 0
+        self._ultimo_batimento = time.monotonic()
+        with self.app.app_context():
+            try:
+                while not self._parar.is_set() or em_andamento:
+                    try:
+                        if self._passo(pool, em_andamento, workers, ate_esvaziar):
+                            return
+                    except BrokenProcessPool:
+                        # Um processo do pool morreu (ex: falta de memória): as tarefas
+                        # dele voltam para a fila e o pool é recriado
+                        logger.error("Pool de tarefas quebrado; recriando")
+                        for futuro in list(em_andamento):
+                            self._finalizar(em_andamento.pop(futuro), RuntimeError("processo do pool morreu"))
+                        pool.shutdown(wait=False)
+                        pool = self._novo_pool(workers)
+                    except Exception:
+                        # Ex: banco ocupado; as tarefas continuam na tabela
+                        logger.exception("Erro no despachante de tarefas")
+                        db.session.rollback()
+                        time.sleep(self.app.config['JOBS_POLL_INTERVAL'])
+            finally:
+                pool.shutdown(wait=True)
+
+    @staticmethod
+    def _novo_pool(workers):
+        # 'spawn': os processos do pool não herdam as threads/conexões do worker web
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _passo(self, pool, em_andamento, workers, ate_esvaziar):
+        """Uma volta do laço; retorna True quando não há mais nada a fazer ('ate_esvaziar')."""
+        if time.monotonic() - self._ultima_manutencao > 60:
+            self._manutencao()
+            self._ultima_manutencao = time.monotonic()
+
+        if not self._parar.is_set() and len(em_andamento) < workers:
+            contexto = self._contexto()
+            reservadas = self._reservar(workers - len(em_andamento))
+            for n, (tarefa_id, tipo, argumentos) in enumerate(reservadas):
+                try:
+                    futuro = pool.submit(_executar, tipo, contexto, argumentos)
+                except RuntimeError as e:
+                    # Pool quebrado ou encerrado: as reservadas que não foram
+                    # enviadas voltam para a fila na hora (sem esperar JOBS_TIMEOUT)
+                    self._liberar([t[0] for t in reservadas[n:]])
+                    if isinstance(e, BrokenProcessPool):
+                        raise
+                    logger.warning("Pool de tarefas encerrado; parando o despachante")
+                    self._parar.set()
+                    self._acordar.set()
+                    break
+                em_andamento[futuro] = tarefa_id
+
+        if em_andamento and time.monotonic() - self._ultimo_batimento > self.app.config['JOBS_HEARTBEAT']:
+            self._bater(em_andamento.values())
+            self._ultimo_batimento = time.monotonic()
+
+        if em_andamento:
+            prontos, _ = wait(list(em_andamento), timeout=self.app.config['JOBS_POLL_INTERVAL'],
+                              return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                self._finalizar(em_andamento.pop(futuro), futuro.exception())
+        elif ate_esvaziar and not self._pendentes():
+            return True
+        else:
+            self._acordar.wait(self.app.config['JOBS_POLL_INTERVAL'])
+            self._acordar.clear()
+        return False
+
+    def _pendentes(self):
+        existe = db.session.scalar(sa.select(Tarefa.id).where(Tarefa.estado == 'pendente').limit(1))
+        db.session.rollback() # Não segura a conexão de escrita enquanto espera
+        return existe is not None
+
+    def _reservar(self, limite):
+        """
+        Marca até 'limite' tarefas vencidas como 'executando'. O UPDATE
+        condicional garante que dois despachantes nunca peguem a mesma.
+        """
+        agora = _agora()
+        candidatas = db.session.execute(
+            sa.select(Tarefa.id, Tarefa.tipo, Tarefa.argumentos)
+            .where(Tarefa.estado == 'pendente', Tarefa.executar_apos <= agora)
+            .order_by(Tarefa.id).limit(limite)
+        ).all()
+        reservadas = []
+        for tarefa_id, tipo, argumentos in candidatas:
+            resultado = db.session.execute(
+                sa.update(Tarefa)
+                .where(Tarefa.id == tarefa_id, Tarefa.estado == 'pendente')
+                .values(estado='executando', tentativas=Tarefa.tentativas + 1, iniciada_em=agora,
+                        batimento_em=agora)
+            )
+            if resultado.rowcount == 1:
+                reservadas.append((tarefa_id, tipo, json.loads(argumentos or '{}')))
+        db.session.commit()
+        return reservadas
+
+    def _liberar(self, ids):
+        """Devolve à fila tarefas reservadas que não chegaram a ser executadas."""
+        db.session.execute(
+            sa.update(Tarefa)
+            .where(Tarefa.id.in_(ids), Tarefa.estado == 'executando')
+            .values(estado='pendente', tentativas=Tarefa.tentativas - 1, iniciada_em=None, batimento_em=None)
+        )
+        db.session.commit()
+
+    def _bater(self, ids):
+        """
+        Marca as tarefas em andamento como vivas: a manutenção (deste ou de
+        outro despachante) só devolve à fila as que pararam de bater.
+        """
+        db.session.execute(
+            sa.update(Tarefa)
+            .where(Tarefa.id.in_(list(ids)), Tarefa.estado == 'executando')
+            .values(batimento_em=_agora())
+        )
+        db.session.commit()
+
+    def _finalizar(self, tarefa_id, erro):
+        tarefa = db.session.get(Tarefa, tarefa_id)
+        if tarefa is None:
+            db.session.rollback()
+            return
+        if erro is None:
+            tarefa.estado = 'concluida'
+            tarefa.erro = None
+            tarefa.concluida_em = _agora()
+            self.executadas += 1
+        else:
+            self.falhas += 1
+            tarefa.erro = f"{type(erro).__name__}: {erro}"[:1000]
+            if isinstance(erro, TarefaInvalida) or tarefa.tentativas >= tarefa.max_tentativas:
+                tarefa.estado = 'falhou'
+                tarefa.concluida_em = _agora()
+                logger.error("Tarefa %s (%s) falhou: %s", tarefa.id, tarefa.tipo, tarefa.erro)
+            else:
+                # Nova tentativa, com espera crescente (5s, 10s, 20s...)
+                espera = self.app.config['JOBS_RETRY_DELAY'] * 2 ** (tarefa.tentativas - 1)
+                tarefa.estado = 'pendente'
+                tarefa.executar_apos = _agora() + datetime.timedelta(seconds=espera)
+        terminada = tarefa.estado != 'pendente'
+        tipo, referencia = tarefa.tipo, tarefa.referencia # O commit expira o objeto
+        db.session.commit()
+        if terminada and self.ao_concluir:
+            self.ao_concluir(tipo, referencia)
+
+    def _manutencao(self):
+        """
+        Devolve à fila tarefas presas (despachante que caiu: sem batimento há
+        JOBS_TIMEOUT) e apaga as antigas concluídas. Uma tarefa demorada cujo
+        despachante segue vivo continua batendo e não é executada em dobro.
+        """
+        agora = _agora()
+        db.session.execute(
+            sa.update(Tarefa)
+            .where(Tarefa.estado == 'executando',
+                   sa.func.coalesce(Tarefa.batimento_em, Tarefa.iniciada_em)
+                   < agora - datetime.timedelta(seconds=self.app.config['JOBS_TIMEOUT']))
+            .values(estado='pendente', executar_apos=agora)
+        )
+        db.session.execute(
+            sa.delete(Tarefa)
+            .where(Tarefa.estado == 'concluida',
+                   Tarefa.concluida_em < agora - datetime.timedelta(days=self.app.config['JOBS_KEEP_DAYS']))
+        )
+        db.session.commit()
+
+    def parar(self):
+        """Termina as tarefas em andamento e encerra o despachante (no encerramento do processo)."""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._thread.join(30)
+
+    def estatisticas(self):
+        contagem = dict(db.session.execute(
+            sa.select(Tarefa.estado, sa.func.count()).group_by(Tarefa.estado)
+        ).all())
+        return {
+            "nome": "fila_tarefas",
+            "pid": os.getpid(),
+            "despachante_ativo": bool(self._thread and self._thread.is_alive()),
+            "executadas": self.executadas,
+            "falhas": self.falhas,
+            "por_estado": contagem,
+        }
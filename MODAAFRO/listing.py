@@ -0,0 +1,110 @@
+# listing.py
+#
+# Read model das listagens da loja (tabela 'produto_listagem').
+#
+# Os cards da loja só usam id, nome, preço e imagem de destaque. Carregar
+# entidades 'Produto' do ORM traz junto a descrição (Text), registra cada
+# objeto no mapa de identidade da sessão e prepara o rastreamento de
+# alterações, para quase tudo ser jogado fora em seguida. Aqui cada produto
+# tem uma linha "achatada" (com os ids das categorias), lida com um SELECT
+# de colunas: o resultado são Rows do SQLAlchemy (tuplas com acesso por
+# nome, 'linha.nome'), sem hidratar objetos.
+#
+# Como o índice de busca, a tabela é mantida pelas rotas do admin, sem
+# commit próprio: a linha muda na mesma transação do produto.
+# 'flask rebuild-listing' refaz tudo a partir da tabela 'produto'.
+
+from collections import defaultdict
+
+import sqlalchemy as sa
+
+from models import db, Produto, ProdutoListagem, produto_categoria
+
+listagem = ProdutoListagem.__table__
+
+# Colunas usadas pelos cards (loja.html e /loja/produtos)
+COLUNAS_CARD = (listagem.c.id, listagem.c.nome, listagem.c.preco, listagem.c.imagem_destaque_url)
+
+
+def selecionar_cards():
+    """SELECT base da listagem (filtros e ordem são aplicados por quem chama)."""
+    return sa.select(*COLUNAS_CARD)
+
+
+def ler_categorias(valor):
+    """'1,4,7' -> [1, 4, 7]"""
+    return [int(c) for c in valor.split(',')] if valor else []
+
+
+def _linha(produto):
+    return {
+        'id': produto.id,
+        'nome': produto.nome,
+        'preco': produto.preco,
+        'destaque': bool(produto.destaque),
+        'imagem_destaque_url': produto.imagem_destaque_url,
+        'categoria_ids': ','.join(map(str, sorted(c.id for c in produto.categorias))),
+    }
+
+
+def atualizar_produto(produto):
+    """
+    Regrava a linha do produto. Não faz commit: entra na mesma transação
+    da rota, então a listagem nunca diverge do produto.
+    """
+    atualizar_produtos([produto])
+
+
+def atualizar_produtos(produtos):
+    """Versão em lote de 'atualizar_produto' (ex: importação do catálogo)."""
+    if not produtos:
+        return
+    if any(p.id is None for p in produtos):
+        db.session.flush() # Garante que os produtos já têm ID
+    linhas = [_linha(p) for p in produtos]
+    db.session.execute(sa.delete(listagem).where(listagem.c.id.in_([linha['id'] for linha in linhas])))
+    db.session.execute(sa.insert(listagem), linhas)
+
+
+def remover_produto(produto_id):
+    """Remove o produto da listagem (também sem commit)."""
+    db.session.execute(sa.delete(listagem).where(listagem.c.id == produto_id))
+
+
+def precisa_reconstruir():
+    """True se há produtos mas a listagem está vazia (banco criado antes dela)."""
+    tem_produtos = db.session.scalar(sa.select(Produto.id).limit(1)) is not None
+    tem_linhas = db.session.scalar(sa.select(listagem.c.id).limit(1)) is not None
+    return tem_produtos and not tem_linhas
+
+
+def reconstruir(tamanho_lote=5000):
+    """Apaga e refaz a listagem inteira, em lotes por id. Retorna quantos produtos."""
+    db.session.execute(sa.delete(listagem))
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = db.session.execute(
+            sa.select(Produto.id, Produto.nome, Produto.preco, Produto.destaque, Produto.imagem_destaque_url)
+            .where(Produto.id > ultimo_id)
+            .order_by(Produto.id)
+            .limit(tamanho_lote)
+        ).all()
+        if not lote:
+            break
+        categorias = defaultdict(list)
+        for produto_id, categoria_id in db.session.execute(
+                sa.select(produto_categoria.c.produto_id, produto_categoria.c.categoria_id)
+                .where(produto_categoria.c.produto_id.between(lote[0].id, lote[-1].id))
+                .order_by(produto_categoria.c.categoria_id)):
+            categorias[produto_id].append(str(categoria_id))
+        db.session.execute(sa.insert(listagem), [
+            {'id': p.id, 'nome': p.nome, 'preco': p.preco, 'destaque': bool(p.destaque),
+             'imagem_destaque_url': p.imagem_destaque_url, 'categoria_ids': ','.join(categorias[p.id])}
+            for p in lote
+        ])
+        total += len(lote)
+        ultimo_id = lote[-1].id
+
+    db.session.commit()
+    return total
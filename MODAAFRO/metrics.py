@@ -0,0 +1,339 @@
+# metrics.py
+#
+# Métricas da aplicação no formato texto do Prometheus (GET /metrics):
+# requisições e latência por endpoint, tempo de banco por requisição,
+# bytes servidos pelo /uploads e bytes gravados pelo 'save_image'.
+#
+# Cada processo (worker do gunicorn) soma as suas métricas em memória: uma
+# requisição custa alguns incrementos de dict sob um lock, sem I/O. Uma
+# thread do processo grava o estado num arquivo próprio a cada
+# METRICS_FLUSH_INTERVAL segundos ('metricas-<pid>.json' em METRICS_DIR), e
+# o /metrics soma os arquivos de todos os processos, então o resultado é o
+# mesmo qualquer que seja o worker que atende o Prometheus.
+#
+# Contadores não podem "voltar": quando um worker morre (ou é reciclado), o
+# arquivo dele é somado a 'metricas-acumuladas.json' em vez de apagado. Um
+# processo está vivo enquanto segura a trava (fcntl) do seu '.lock'.
+
+import atexit
+import bisect
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, abort, g, request
+
+try:
+    import fcntl # Só em Unix: trava o arquivo do processo enquanto ele está vivo
+except ImportError:
+    fcntl = None
+
+# Limites (segundos) dos histogramas de latência
+BUCKETS_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nome -> (tipo, descrição)
+METRICAS = {
+    'modaafro_http_requests_total': ('counter', 'Requisições HTTP por endpoint, método e status.'),
+    'modaafro_http_request_duration_seconds': ('histogram', 'Tempo de resposta por endpoint.'),
+    'modaafro_db_queries_total': ('counter', 'Queries SQL executadas, por endpoint.'),
+    'modaafro_db_duration_seconds': ('histogram', 'Tempo de banco de cada requisição, por endpoint.'),
+    'modaafro_uploads_served_bytes_total': ('counter', 'Bytes de arquivos entregues pelo /uploads.'),
+    'modaafro_uploads_saved_total': ('counter', 'Imagens recebidas pelo save_image (deduplicated="true": o arquivo já existia).'),
+    'modaafro_uploads_saved_bytes_total': ('counter', 'Bytes das imagens recebidas pelo save_image.'),
+}
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos):
+    """{'endpoint': 'loja'} -> 'endpoint="loja"' (a chave das séries)."""
+    return ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in sorted(rotulos.items()))
+
+
+@functools.lru_cache(maxsize=1024)
+def _chave_endpoint(endpoint):
+    return _rotulos({'endpoint': endpoint})
+
+
+@functools.lru_cache(maxsize=4096)
+def _chave_requisicao(endpoint, metodo, status):
+    return _rotulos({'endpoint': endpoint, 'method': metodo, 'status': status})
+
+
+def _numero(valor):
+    """Valor de amostra sem perder dígitos (':g' daria '1.23457e+06' para 1234567)."""
+    return str(valor) if isinstance(valor, int) else repr(float(valor))
+
+
+def _vazio():
+    return {'contadores': {}, 'histogramas': {}}
+
+
+def somar(destino, origem):
+    """Soma o estado 'origem' em 'destino' (os dois no formato dos arquivos)."""
+    for nome, series in origem['contadores'].items():
+        alvo = destino['contadores'].setdefault(nome, {})
+        for chave, valor in series.items():
+            alvo[chave] = alvo.get(chave, 0) + valor
+    for nome, series in origem['histogramas'].items():
+        alvo = destino['histogramas'].setdefault(nome, {})
+        for chave, h in series.items():
+            atual = alvo.get(chave)
+            if atual is None or len(atual['buckets']) != len(h['buckets']):
+                # Série nova (ou limites mudaram entre versões): fica a mais recente
+                alvo[chave] = {'buckets': list(h['buckets']), 'soma': h['soma'], 'total': h['total']}
+                continue
+            atual['buckets'] = [a + b for a, b in zip(atual['buckets'], h['buckets'])]
+            atual['soma'] += h['soma']
+            atual['total'] += h['total']
+    return destino
+
+
+class Metricas:
+    """Contadores e histogramas por processo, somados entre os workers no /metrics."""
+
+    def __init__(self, app=None, sql_profiler=None):
+        self.sql_profiler = sql_profiler
+        self._lock = threading.Lock()
+        self._estado = _vazio()
+        self._alteracoes = 0
+        self._gravadas = 0
+        self._pid = None
+        self._trava = None
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_DIR', os.path.join(app.instance_path, 'metrics'))
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 5)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_BUCKETS', BUCKETS_PADRAO)
+        self.app = app
+        self.buckets = tuple(sorted(app.config['METRICS_BUCKETS']))
+        if not app.config['METRICS_ENABLED']:
+            return
+        os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+        app.teardown_request(self._teardown)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        atexit.register(self.gravar)
+
+    # --- Registro (caminho quente: só memória) ---
+
+    def contar(self, nome, valor=1, **rotulos):
+        if not self.app.config['METRICS_ENABLED']:
+            return
+        chave = _rotulos(rotulos)
+        with self._lock:
+            self._abrir()
+            self._somar(nome, chave, valor)
+
+    def observar(self, nome, valor, **rotulos):
+        if not self.app.config['METRICS_ENABLED']:
+            return
+        chave = _rotulos(rotulos)
+        with self._lock:
+            self._abrir()
+            self._observar(nome, chave, valor)
+
+    def _somar(self, nome, chave, valor):
+        series = self._estado['contadores'].setdefault(nome, {})
+        series[chave] = series.get(chave, 0) + valor
+        self._alteracoes += 1
+
+    def _observar(self, nome, chave, valor):
+        series = self._estado['histogramas'].setdefault(nome, {})
+        h = series.get(chave)
+        if h is None:
+            h = series[chave] = {'buckets': [0] * (len(self.buckets) + 1), 'soma': 0.0, 'total': 0}
+        h['buckets'][bisect.bisect_left(self.buckets, valor)] += 1 # Último = +Inf
+        h['soma'] += valor
+        h['total'] += 1
+        self._alteracoes += 1
+
+    # --- Ciclo da requisição ---
+
+    def _iniciar(self):
+        g.metricas_inicio = time.perf_counter()
+
+    def _registrar(self, status):
+        """Uma requisição: tudo sob uma só aquisição do lock, com as chaves das séries em cache."""
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None:
+            return # Já registrada (after_request + teardown)
+        duracao = time.perf_counter() - inicio
+        endpoint = request.endpoint or 'nao_encontrado'
+        chave_endpoint = _chave_endpoint(endpoint)
+        chave_requisicao = _chave_requisicao(endpoint, request.method, status)
+        totais = self.sql_profiler.totais() if self.sql_profiler else None
+        with self._lock:
+            self._abrir()
+            self._somar('modaafro_http_requests_total', chave_requisicao, 1)
+            self._observar('modaafro_http_request_duration_seconds', chave_endpoint, duracao)
+            if totais is not None:
+                queries, tempo = totais
+                if queries:
+                    self._somar('modaafro_db_queries_total', chave_endpoint, queries)
+                self._observar('modaafro_db_duration_seconds', chave_endpoint, tempo)
+
+    def _finalizar(self, response):
+        self._registrar(response.status_code)
+        return response
+
+    def _teardown(self, erro):
+        if erro is not None: # Exceção sem tratamento: o after_request não rodou
+            self._registrar(500)
+
+    # --- Arquivo do processo ---
+
+    def _caminho(self, pid=None, extensao='json'):
+        return os.path.join(self.app.config['METRICS_DIR'], f"metricas-{pid or os.getpid()}.{extensao}")
+
+    def _abrir(self):
+        """Estado, trava e thread deste processo (de novo depois de um fork). Chamar com o lock."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._estado = _vazio() # Depois do fork, o que veio do pai é do pai
+        self._alteracoes = self._gravadas = 0
+        caminho = self._caminho()
+        if os.path.exists(caminho):
+            # Sobra de um processo antigo com o mesmo pid (comum em contêineres):
+            # renomeia para ser somada às acumuladas
+            os.replace(caminho, caminho.replace('.json', f"-{time.time_ns()}.json"))
+        self._trava = open(self._caminho(extensao='lock'), 'w')
+        if fcntl:
+            fcntl.flock(self._trava, fcntl.LOCK_EX)
+        self._thread = threading.Thread(target=self._trabalhar, name='metricas', daemon=True)
+        self._thread.start()
+
+    def _trabalhar(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.app.config['METRICS_FLUSH_INTERVAL'])
+            try:
+                self.gravar()
+            except OSError:
+                pass # Tenta de novo no próximo intervalo
+
+    def gravar(self):
+        """Grava o estado do processo no arquivo dele (só se mudou desde a última vez)."""
+        with self._lock:
+            if self._pid != os.getpid() or self._alteracoes == self._gravadas:
+                return
+            conteudo = json.dumps(self._estado, separators=(',', ':'))
+            self._gravadas = self._alteracoes
+        caminho = self._caminho()
+        tmp = f"{caminho}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+        os.replace(tmp, caminho)
+
+    # --- Agregação entre processos ---
+
+    def _vivo(self, caminho):
+        """O processo dono do arquivo ainda está rodando (segura a trava)?"""
+        nome = os.path.basename(caminho)[len('metricas-'):-len('.json')]
+        if not nome.isdigit():
+            return False # Sobra renomeada ('<pid>-<ns>')
+        if int(nome) == os.getpid():
+            return True
+        trava = self._caminho(int(nome), 'lock')
+        if not os.path.exists(trava):
+            return False
+        if fcntl is None:
+            return True # Sem fcntl (Windows) não dá para saber: nunca acumula
+        with open(trava, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return False
+
+    def _acumular_mortos(self, mortos):
+        """Soma os arquivos de processos mortos às acumuladas e os apaga."""
+        pasta = self.app.config['METRICS_DIR']
+        acumuladas = os.path.join(pasta, 'metricas-acumuladas.json')
+        with open(os.path.join(pasta, 'metricas.lock'), 'w') as trava:
+            if fcntl:
+                fcntl.flock(trava, fcntl.LOCK_EX) # Dois /metrics ao mesmo tempo não somam duas vezes
+            try:
+                with open(acumuladas, encoding='utf-8') as f:
+                    estado = json.load(f)
+            except FileNotFoundError:
+                estado = _vazio()
+            lidos = []
+            for caminho in mortos:
+                try:
+                    with open(caminho, encoding='utf-8') as f:
+                        somar(estado, json.load(f))
+                    lidos.append(caminho)
+                except (FileNotFoundError, ValueError):
+                    continue # Outro processo já acumulou (ou arquivo corrompido)
+            if not lidos:
+                return
+            tmp = f"{acumuladas}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(estado, f, separators=(',', ':'))
+            os.replace(tmp, acumuladas)
+            for caminho in lidos:
+                os.remove(caminho)
+                trava_morto = caminho[:-len('.json')] + '.lock'
+                if os.path.exists(trava_morto):
+                    os.remove(trava_morto)
+
+    def coletar(self):
+        """Estado somado de todos os processos (vivos, mortos e este)."""
+        self.gravar()
+        pasta = self.app.config['METRICS_DIR']
+        arquivos = [c for c in glob.glob(os.path.join(pasta, 'metricas-*.json'))
+                    if not c.endswith('metricas-acumuladas.json')]
+        mortos = [c for c in arquivos if not self._vivo(c)]
+        if mortos and fcntl:
+            self._acumular_mortos(mortos)
+        estado = _vazio()
+        for caminho in [os.path.join(pasta, 'metricas-acumuladas.json')] + arquivos:
+            try:
+                with open(caminho, encoding='utf-8') as f:
+                    somar(estado, json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue # Acabou de ser acumulado por outro processo
+        return estado
+
+    def texto(self):
+        """Formato de exposição texto do Prometheus (versão 0.0.4)."""
+        estado = self.coletar()
+        linhas = []
+        limites = [f"{b:g}" for b in self.buckets] + ['+Inf']
+        for nome, (tipo, descricao) in METRICAS.items():
+            linhas.append(f"# HELP {nome} {descricao}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            if tipo == 'counter':
+                for chave, valor in sorted(estado['contadores'].get(nome, {}).items()):
+                    linhas.append(f"{nome}{{{chave}}} {_numero(valor)}" if chave else f"{nome} {_numero(valor)}")
+                continue
+            for chave, h in sorted(estado['histogramas'].get(nome, {}).items()):
+                separador = ',' if chave else ''
+                acumulado = 0
+                for limite, quantidade in zip(limites, h['buckets']):
+                    acumulado += quantidade
+                    linhas.append(f'{nome}_bucket{{{chave}{separador}le="{limite}"}} {acumulado}')
+                linhas.append(f"{nome}_sum{{{chave}}} {h['soma']:.6f}")
+                linhas.append(f"{nome}_count{{{chave}}} {h['total']}")
+        return '\n'.join(linhas) + '\n'
+
+    def view(self):
+        """GET /metrics (com METRICS_TOKEN, exige 'Authorization: Bearer <token>')."""
+        token = self.app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            abort(401)
+        return Response(self.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,8 +2,12 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
+import json
 
-db = SQLAlchemy()
+from db_engine import SessaoRoteada
+
+# A sessão escolhe a engine (leitura/escrita) conforme a rota; ver db_engine.py
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 # --- Modelos de Autenticação ---
 
@@ -38,18 +42,45 @@ class Produto(db.Model):
     destaque = db.Column(db.Boolean, default=False) # Para "produtos em destaque"
     
     # Relacionamento (Muitos para Muitos)
+    # Carregadas só quando usadas (antes era 'subquery': uma query extra
+    # em TODA consulta de produtos, mesmo nas listagens que não as exibem)
     categorias = db.relationship('Categoria', secondary=produto_categoria,
-                                 lazy='subquery', backref=db.backref('produtos', lazy=True))
+                                 lazy='select', backref=db.backref('produtos', lazy=True))
     
     # Relacionamento (Um para Muitos)
     imagens = db.relationship('ImagemProduto', backref='produto', lazy=True, cascade="all, delete-orphan")
     
     # Armazena o path da imagem de destaque
+    imagem_destaque_url = db.Column(db.String(300), index=True) # Índice: contagem de referências dos uploads
+
+    # Índice da ordenação da loja (nome, id): usado pela paginação por cursor
+    __table_args__ = (db.Index('ix_produto_nome_id', 'nome', 'id'),)
+
+class ProdutoListagem(db.Model):
+    """
+    Read model das listagens da loja (ver listing.py): só as colunas do
+    card + os ids das categorias, numa linha por produto, sem joins.
+    Atualizado pelas rotas do admin na mesma transação do produto.
+    """
+    __tablename__ = 'produto_listagem'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False) # Mesmo id do produto
+    nome = db.Column(db.String(200), nullable=False)
+    preco = db.Column(db.Float, nullable=False)
+    destaque = db.Column(db.Boolean, nullable=False, default=False)
     imagem_destaque_url = db.Column(db.String(300))
+    categoria_ids = db.Column(db.String(500), nullable=False, default='') # Ex: "1,4,7"
+
+    # Mesma ordenação da loja (nome, id), para a paginação por cursor; preço e
+    # destaque são as outras colunas ordenáveis da tabela de produtos do admin
+    __table_args__ = (
+        db.Index('ix_produto_listagem_nome_id', 'nome', 'id'),
+        db.Index('ix_produto_listagem_preco_id', 'preco', 'id'),
+        db.Index('ix_produto_listagem_destaque_id', 'destaque', 'id'),
+    )
 
 class ImagemProduto(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    url_imagem = db.Column(db.String(300), nullable=False)
+    url_imagem = db.Column(db.String(300), nullable=False, index=True)
     produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'), nullable=False)
 
 # --- Modelos de Customização do Site ---
@@ -65,4 +96,99 @@ class Banner(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     imagem_url = db.Column(db.String(300), nullable=False)
     link_url = db.Column(db.String(300)) # Link para produto ou URL externa
-    ordem = db.Column(db.Integer)
\ No newline at end of file
+    ordem = db.Column(db.Integer)
+
+# --- Controle de Importações em Lote ---
+
+class ImportacaoCatalogo(db.Model):
+    """Progresso de um 'flask import-catalog', para retomar depois de uma interrupção."""
+    id = db.Column(db.Integer, primary_key=True)
+    # Identifica o arquivo importado (caminho + tamanho)
+    chave = db.Column(db.String(500), unique=True, nullable=False)
+    linhas_processadas = db.Column(db.Integer, nullable=False, default=0)
+    concluida = db.Column(db.Boolean, nullable=False, default=False)
+    atualizada_em = db.Column(db.DateTime, default=datetime.datetime.utcnow,
+                              onupdate=datetime.datetime.utcnow)
+
+# --- Pedidos (checkout) ---
+
+class Pedido(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # Gerado no checkout, antes de gravar (vai na mensagem do WhatsApp)
+    codigo = db.Column(db.String(32), unique=True, nullable=False)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    total = db.Column(db.Float, nullable=False)
+    itens = db.relationship('ItemPedido', backref='pedido', lazy=True, cascade="all, delete-orphan")
+
+class ItemPedido(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False)
+    # Cópia do produto no momento da compra (o produto pode mudar ou ser excluído)
+    produto_id = db.Column(db.Integer, nullable=False)
+    nome = db.Column(db.String(200), nullable=False)
+    preco_unitario = db.Column(db.Float, nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False)
+
+# --- Tarefas em Segundo Plano (ver jobs.py) ---
+
+class Tarefa(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False) # Ex: 'processar_imagem'
+    argumentos = db.Column(db.Text) # JSON
+    # A quem a tarefa se refere (ex: 'produto:12'), para mostrar o andamento
+    referencia = db.Column(db.String(100), index=True)
+    # 'pendente' -> 'executando' -> 'concluida' ou 'falhou' (ou 'pendente' de novo, numa nova tentativa)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    erro = db.Column(db.Text)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    executar_apos = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime)
+    # Renovado pelo despachante enquanto a tarefa roda (ver jobs.FilaTarefas._bater)
+    batimento_em = db.Column(db.DateTime)
+    concluida_em = db.Column(db.DateTime)
+
+    # Índice da busca do despachante (pendentes já vencidas)
+    __table_args__ = (db.Index('ix_tarefa_estado_executar_apos', 'estado', 'executar_apos'),)
+
+    def resumo(self):
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "estado": self.estado,
+            "tentativas": self.tentativas,
+            "erro": self.erro,
+            "argumentos": json.loads(self.argumentos or '{}'),
+        }
+# --- Exportação Estática (ver static_site.py) ---
+
+class PaginaEstaticaPendente(db.Model):
+    # Página do site estático a refazer no próximo 'flask build-static --incremental'
+    id = db.Column(db.Integer, primary_key=True)
+    pagina = db.Column(db.String(100), nullable=False) # Ex: 'index', 'loja:3', 'produto:12'
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+# --- Produtos Relacionados (ver related.py) ---
+
+class ProdutoTermo(db.Model):
+    """
+    Vetor TF-IDF de cada produto: um termo (palavra do nome/descrição ou
+    '#<id>' de uma categoria) por linha, com o peso já normalizado. Peso 0 =
+    termo comum demais, guardado só para a contagem de documentos (df).
+    """
+    __tablename__ = 'produto_termo'
+    produto_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    termo = db.Column(db.String(60), primary_key=True)
+    peso = db.Column(db.Float, nullable=False)
+
+    # Lista invertida: produtos de um termo (e o df, com COUNT) sem ler a tabela
+    __table_args__ = (db.Index('ix_produto_termo_termo', 'termo', 'produto_id', 'peso'),)
+
+class ProdutoRelacionado(db.Model):
+    """Os k vizinhos mais parecidos de cada produto, já ordenados ('posicao' 0 = o mais parecido)."""
+    __tablename__ = 'produto_relacionado'
+    produto_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    posicao = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    relacionado_id = db.Column(db.Integer, nullable=False, index=True) # Quem lista este produto
+    similaridade = db.Column(db.Float, nullable=False)
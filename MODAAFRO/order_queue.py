@@ -0,0 +1,314 @@
+# order_queue.py
+
+import atexit
+import datetime
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl # Só em Unix: trava o diário do processo enquanto ele está vivo
+except ImportError:
+    fcntl = None
+
+import sqlalchemy as sa
+
+from models import db, Pedido, ItemPedido
+
+logger = logging.getLogger('modaafro.pedidos')
+
+_FIM = object() # Sinal para a thread terminar
+
+
+class FilaPedidos:
+    """
+    Gravação "write-behind" dos pedidos do checkout.
+
+    A rota só valida o carrinho e chama 'enfileirar': o pedido é anotado num
+    diário (arquivo JSONL do processo, com fsync) e entra numa fila em
+    memória. Uma única thread por processo tira da fila até
+    CHECKOUT_LOTE_MAX pedidos (ou o que chegar em CHECKOUT_INTERVALO
+    segundos) e grava todos num só commit. Assim um pico de checkouts vira
+    poucas transações curtas, em vez de uma disputa pelo lock de escrita
+    do SQLite a cada pedido (e as leituras da loja não ficam esperando).
+
+    Durabilidade:
+      - desligamento normal: 'parar' (via atexit) grava o que estiver na fila;
+      - queda do processo: o diário sobrevive e é regravado por outro
+        processo (ou por 'flask recover-orders'); pedidos já gravados são
+        ignorados pelo código, então regravar nunca duplica;
+      - pedido que o banco recusa: depois de CHECKOUT_TENTATIVAS falhas o
+        lote é dividido ao meio até isolar o pedido, que vai para
+        'rejeitados-<pid>.jsonl' (fora da recuperação automática) e não
+        trava os seguintes. Corrigido o problema, renomeie o arquivo para
+        'pedidos-<algo>.jsonl' e rode 'flask recover-orders'.
+    """
+
+    def __init__(self, app=None):
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._gravados_cond = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+        self._diario = None
+        self._pendentes = 0
+        self.enfileirados = 0
+        self.gravados = 0
+        self.lotes = 0
+        self.maior_lote = 0
+        self.erros = 0
+        self.rejeitados = 0
+        self.recuperados = 0
+        self.ultimo_commit_ms = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CHECKOUT_LOTE_MAX', 200)
+        app.config.setdefault('CHECKOUT_INTERVALO', 0.05)
+        app.config.setdefault('CHECKOUT_FSYNC', True)
+        app.config.setdefault('CHECKOUT_TENTATIVAS', 5)
+        app.config.setdefault('CHECKOUT_DIARIO_DIR', os.path.join(app.instance_path, 'pedidos'))
+        app.config.setdefault('CHECKOUT_TIMEOUT_DESLIGAR', 10)
+        self.app = app
+        os.makedirs(app.config['CHECKOUT_DIARIO_DIR'], exist_ok=True)
+        atexit.register(self.parar)
+
+    # --- Diário (write-ahead) ---
+
+    def _caminho_diario(self, pid=None):
+        return os.path.join(self.app.config['CHECKOUT_DIARIO_DIR'], f"pedidos-{pid or os.getpid()}.jsonl")
+
+    def _abrir(self):
+        """Abre o diário e a thread deste processo (de novo depois de um fork)."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._fila = queue.Queue()
+        self._pendentes = 0
+        caminho = self._caminho_diario()
+        if os.path.exists(caminho) and os.path.getsize(caminho):
+            # Sobra de um processo antigo com o mesmo pid (comum em contêineres):
+            # renomeia para que 'recuperar' o encontre
+            os.replace(caminho, caminho.replace('.jsonl', f"-{time.time_ns()}.jsonl"))
+        self._diario = open(caminho, 'a', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(self._diario, fcntl.LOCK_EX)
+        self._thread = threading.Thread(target=self._trabalhar, name='fila-pedidos', daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, pedido):
+        """
+        'pedido' é um dict: codigo, criado_em (ISO), total e itens (produto_id,
+        nome, preco_unitario, quantidade). Quando retorna, o pedido já está
+        no diário em disco (mesmo que ainda não esteja no banco).
+        """
+        linha = json.dumps(pedido, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._abrir()
+            self._diario.write(linha)
+            self._diario.flush()
+            if self.app.config['CHECKOUT_FSYNC']:
+                os.fsync(self._diario.fileno())
+            self._pendentes += 1
+            self.enfileirados += 1
+        self._fila.put(pedido)
+
+    # --- Thread de gravação ---
+
+    def _proximo_lote(self):
+        primeiro = self._fila.get()
+        if primeiro is _FIM:
+            return None
+        lote = [primeiro]
+        prazo = time.monotonic() + self.app.config['CHECKOUT_INTERVALO']
+        while len(lote) < self.app.config['CHECKOUT_LOTE_MAX']:
+            restante = prazo - time.monotonic()
+            try:
+                item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is _FIM:
+                self._fila.put(_FIM) # Grava este lote e termina na próxima volta
+                break
+            lote.append(item)
+        return lote
+
+    def _trabalhar(self):
+        with self.app.app_context():
+            try:
+                self.recuperar(somente_orfaos=True)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Falha ao recuperar diários de pedidos")
+            while True:
+                lote = self._proximo_lote()
+                if lote is None:
+                    return
+                self._gravar_lote(lote)
+
+    def _gravar_lote(self, lote):
+        """
+        Grava o lote, tentando de novo com espera crescente (banco ocupado ou
+        fora do ar; o diário garante os dados). Depois de CHECKOUT_TENTATIVAS
+        falhas, grava cada metade do mesmo jeito: um pedido que o banco recusa
+        sempre acaba sozinho e é separado em '_rejeitar'.
+        """
+        tentativas = self.app.config['CHECKOUT_TENTATIVAS']
+        for tentativa in range(1, tentativas + 1):
+            if self._gravar(lote):
+                return
+            if tentativa < tentativas:
+                time.sleep(min(5.0, 0.1 * 2 ** tentativa))
+        if len(lote) > 1:
+            meio = len(lote) // 2
+            self._gravar_lote(lote[:meio])
+            self._gravar_lote(lote[meio:])
+        else:
+            self._rejeitar(lote[0])
+
+    def _gravar(self, lote):
+        inicio = time.perf_counter()
+        try:
+            gravados = gravar_pedidos(lote)
+        except Exception:
+            db.session.rollback()
+            self.erros += 1
+            logger.exception("Falha ao gravar %d pedidos; nova tentativa em seguida", len(lote))
+            return False
+
+        with self._lock:
+            self.gravados += gravados
+            self.lotes += 1
+            self.maior_lote = max(self.maior_lote, len(lote))
+            self.ultimo_commit_ms = round((time.perf_counter() - inicio) * 1000, 2)
+            self._baixar(len(lote))
+        return True
+
+    def _rejeitar(self, pedido):
+        """Tira do diário um pedido que o banco recusa, guardando-o em 'rejeitados-<pid>.jsonl'."""
+        caminho = os.path.join(self.app.config['CHECKOUT_DIARIO_DIR'], f"rejeitados-{os.getpid()}.jsonl")
+        with open(caminho, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(pedido, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        logger.error("Pedido %s recusado pelo banco %d vezes; guardado em %s",
+                     pedido.get('codigo') if isinstance(pedido, dict) else pedido,
+                     self.app.config['CHECKOUT_TENTATIVAS'], caminho)
+        with self._lock:
+            self.rejeitados += 1
+            self._baixar(1)
+
+    def _baixar(self, quantidade):
+        """Pedidos que saíram da fila (gravados ou rejeitados); chamar com o lock."""
+        self._pendentes -= quantidade
+        if self._pendentes == 0:
+            # Tudo que está no diário já está no banco (ou nos rejeitados): pode zerar
+            self._diario.seek(0)
+            self._diario.truncate()
+            self._gravados_cond.notify_all()
+
+    # --- Desligamento / recuperação ---
+
+    def drenar(self, timeout=None):
+        """Espera a fila deste processo esvaziar. Retorna False se o tempo acabar."""
+        with self._lock:
+            return self._gravados_cond.wait_for(lambda: self._pendentes == 0, timeout)
+
+    def parar(self):
+        """Grava o que estiver na fila e encerra a thread (chamado no atexit)."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._fila.put(_FIM)
+        self._thread.join(self.app.config['CHECKOUT_TIMEOUT_DESLIGAR'])
+        if self._thread.is_alive():
+            logger.warning("Fila de pedidos não esvaziou no desligamento; %d pedidos ficam no diário %s",
+                           self._pendentes, self._caminho_diario())
+            return
+        self._diario.close()
+        if self._pendentes == 0:
+            os.remove(self._caminho_diario())
+
+    def recuperar(self, somente_orfaos=False):
+        """
+        Regrava os pedidos dos diários de processos que morreram sem esvaziar
+        a fila. Com 'somente_orfaos', pula os diários ainda travados por um
+        processo vivo (sem fcntl, no Windows, não dá para saber: aí só o
+        comando 'flask recover-orders', com o servidor parado, recupera).
+        Retorna quantos pedidos foram gravados.
+        """
+        if somente_orfaos and fcntl is None:
+            return 0
+        total = 0
+        for caminho in glob.glob(os.path.join(self.app.config['CHECKOUT_DIARIO_DIR'], 'pedidos-*.jsonl')):
+            if caminho == self._caminho_diario() and self._pid == os.getpid():
+                continue
+            with open(caminho, 'r+', encoding='utf-8') as f:
+                if fcntl:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue # Diário de um processo vivo
+                pedidos = []
+                for linha in f:
+                    try:
+                        pedidos.append(json.loads(linha))
+                    except ValueError:
+                        pass # Última linha pela metade (queda durante a escrita)
+                if pedidos:
+                    total += gravar_pedidos(pedidos)
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass # Outro processo recuperou o mesmo diário antes
+        if total:
+            self.recuperados += total
+            logger.warning("%d pedidos recuperados de diários de processos encerrados", total)
+        return total
+
+    def estatisticas(self):
+        return {
+            "nome": "fila_pedidos",
+            "pid": os.getpid(),
+            "enfileirados": self.enfileirados,
+            "gravados": self.gravados,
+            "pendentes": self._pendentes,
+            "lotes": self.lotes,
+            "media_por_lote": round(self.gravados / self.lotes, 1) if self.lotes else None,
+            "maior_lote": self.maior_lote,
+            "ultimo_commit_ms": self.ultimo_commit_ms,
+            "erros": self.erros,
+            "rejeitados": self.rejeitados,
+            "recuperados": self.recuperados,
+        }
+
+
+def gravar_pedidos(pedidos):
+    """
+    Grava uma lista de pedidos (dicts do diário) num único commit, pulando
+    os códigos que já estão no banco. Retorna quantos foram inseridos.
+    """
+    codigos = [p['codigo'] for p in pedidos]
+    existentes = set(db.session.execute(
+        sa.select(Pedido.codigo).where(Pedido.codigo.in_(codigos))
+    ).scalars())
+    novos = []
+    for p in pedidos:
+        if p['codigo'] in existentes:
+            continue
+        existentes.add(p['codigo'])
+        novos.append(Pedido(
+            codigo=p['codigo'],
+            criado_em=datetime.datetime.fromisoformat(p['criado_em']),
+            total=p['total'],
+            itens=[ItemPedido(produto_id=i['produto_id'], nome=i['nome'],
+                              preco_unitario=i['preco_unitario'], quantidade=i['quantidade'])
+                   for i in p['itens']]
+        ))
+    db.session.add_all(novos)
+    db.session.commit()
+    return len(novos)
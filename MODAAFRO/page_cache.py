@@ -0,0 +1,151 @@
+# page_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+
+
+class _Entrada:
+    __slots__ = ('corpo', 'mimetype', 'etag', 'criado_em', 'versao', 'regenerando')
+
+    def __init__(self, corpo, mimetype, versao):
+        self.corpo = corpo
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(corpo).hexdigest()
+        self.criado_em = time.time()
+        self.versao = versao
+        self.regenerando = threading.Lock()
+
+
+class CachePaginas:
+    """
+    Cache do HTML já renderizado das páginas públicas, por processo.
+
+    A chave é a rota + os parâmetros permitidos (normalizados). Cada entrada
+    guarda a versão (do catálogo e das variantes das imagens) em que foi
+    gerada; quando a versão muda (um commit do admin, imagens processadas),
+    a entrada fica "velha". Aí só UMA requisição regenera a
+    página e as demais continuam recebendo a versão velha por até
+    'stale_max' segundos (stale-while-revalidate), então um pico de acessos
+    não vira um pico de renderizações.
+    """
+
+    def __init__(self, versao, max_entradas=500, stale_max=30, max_age=0):
+        self.versao = versao
+        self.max_entradas = max_entradas
+        self.stale_max = stale_max
+        self.max_age = max_age
+        self.ativo = True
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalizar(args, permitidos):
+        """
+        Parâmetros da chave: espaços extras no 'q' são ignorados,
+        'categoria_id' e 'produto' inválidos contam como ausentes (a página
+        é a mesma) e parâmetros repetidos (facetas) valem em qualquer
+        ordem. Retorna None se houver algum parâmetro fora de 'permitidos'
+        (a página não é cacheada).
+        """
+        if set(args.keys()) - set(permitidos):
+            return None
+        chave = []
+        for nome in permitidos:
+            valores = set()
+            for valor in args.getlist(nome):
+                if nome in ('categoria_id', 'produto'):
+                    valor = valor.strip()
+                    valor = valor if valor.isascii() and valor.isdigit() else ''
+                else:
+                    valor = ' '.join(valor.split())
+                if valor:
+                    valores.add(valor)
+            if valores:
+                chave.append((nome, tuple(sorted(valores))))
+        return tuple(chave)
+
+    def _guardar(self, chave, entrada):
+        with self._lock:
+            self._entradas[chave] = entrada
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def _responder(self, entrada, response_class, estado):
+        response = response_class(entrada.corpo, mimetype=entrada.mimetype)
+        response.set_etag(entrada.etag)
+        response.last_modified = entrada.criado_em
+        response.headers['Cache-Control'] = \
+            f"public, max-age={self.max_age}, stale-while-revalidate={self.stale_max}"
+        response.headers['X-Page-Cache'] = estado
+        return response.make_conditional(request)
+
+    def __call__(self, permitidos=()):
+        """Decorator das views: @page_cache(permitidos=('q', 'categoria_id'))"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                params = self.normalizar(request.args, permitidos)
+                if not self.ativo or request.method != 'GET' or params is None:
+                    return view(*args, **kwargs)
+
+                chave = (request.endpoint, tuple(sorted(kwargs.items())), params)
+                versao = self.versao.atual() or self.versao.incrementar()
+
+                with self._lock:
+                    entrada = self._entradas.get(chave)
+                    if entrada is not None:
+                        self._entradas.move_to_end(chave)
+
+                if entrada is not None and entrada.versao == versao:
+                    self.hits += 1
+                    return self._responder(entrada, current_app.response_class, 'HIT')
+
+                regenerando = False
+                if entrada is not None:
+                    # Versão velha: se outra requisição já está regenerando e o
+                    # catálogo mudou há pouco tempo, serve a versão velha
+                    desatualizada_ha = time.time() - versao.mtime_ns / 1e9
+                    regenerando = entrada.regenerando.acquire(blocking=False)
+                    if not regenerando and desatualizada_ha < self.stale_max:
+                        self.stale_hits += 1
+                        return self._responder(entrada, current_app.response_class, 'STALE')
+
+                self.misses += 1
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    # Só guarda respostas completas e "anônimas"
+                    if response.status_code == 200 and not session.modified \
+                            and not response.direct_passthrough:
+                        entrada_nova = _Entrada(response.get_data(), response.mimetype, versao)
+                        self._guardar(chave, entrada_nova)
+                        return self._responder(entrada_nova, current_app.response_class, 'MISS')
+                    return response
+                finally:
+                    if regenerando:
+                        entrada.regenerando.release()
+            return wrapper
+        return decorator
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self):
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "nome": "page_cache",
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / total, 4) if total else None,
+            "entradas": len(self._entradas)
+        }
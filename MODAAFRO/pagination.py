@@ -0,0 +1,91 @@
+# pagination.py
+
+import base64
+import json
+import math
+
+import sqlalchemy as sa
+
+# Faixa dos inteiros do SQLite: fora dela o driver levanta OverflowError
+_INT_MIN, _INT_MAX = -2**63, 2**63 - 1
+
+
+class CursorInvalido(ValueError):
+    """O cursor recebido na URL não pôde ser decodificado."""
+
+
+def codificar_cursor(valores):
+    """Transforma os valores da chave de ordenação num token para a URL."""
+    bruto = json.dumps(list(valores), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(bruto).decode('ascii').rstrip('=')
+
+
+def _tipo_coluna(coluna):
+    """Tipo Python dos valores da coluna, ou None se o SQLAlchemy não sabe (ex: bm25())."""
+    try:
+        tipo = coluna.type.python_type
+    except NotImplementedError:
+        return None
+    return None if tipo is object else tipo # NullType
+
+
+def _valor_valido(valor, tipo):
+    """O valor do cursor cabe numa coluna do 'tipo'? (o cursor vem da URL: qualquer JSON)"""
+    if isinstance(valor, bool):
+        return tipo is bool
+    if isinstance(valor, int):
+        return tipo in (int, float, None) and _INT_MIN <= valor <= _INT_MAX
+    if isinstance(valor, float):
+        return tipo in (float, None) and math.isfinite(valor)
+    if isinstance(valor, str):
+        return tipo in (str, None)
+    return False # Listas, objetos, null
+
+
+def decodificar_cursor(token, ordem):
+    """
+    Faz o caminho inverso de 'codificar_cursor', conferindo que há um valor
+    por coluna de 'ordem' e que cada um tem o tipo da sua coluna.
+    """
+    try:
+        preenchimento = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + preenchimento))
+    except (ValueError, TypeError) as e:
+        raise CursorInvalido(str(e))
+    if not isinstance(valores, list) or len(valores) != len(ordem):
+        raise CursorInvalido('Cursor com formato inesperado')
+    if not all(_valor_valido(valor, _tipo_coluna(coluna)) for valor, coluna in zip(valores, ordem)):
+        raise CursorInvalido('Cursor com valores de tipo inesperado')
+    return valores
+
+
+def paginar_linhas(session, select, ordem, cursor=None, limite=24, descendente=False):
+    """
+    Paginação por cursor (keyset): em vez de OFFSET, filtra pelas linhas
+    que vêm DEPOIS da última chave vista, então a página 100 custa o mesmo
+    que a página 1 (desde que haja índice nas colunas de 'ordem').
+
+    'select' é um SELECT de colunas (ex: o read model da listagem), e as
+    linhas voltam como Rows leves, não entidades do ORM. 'ordem' é a lista
+    de colunas da chave de ordenação, todas no SELECT e terminando numa
+    coluna única (ex: [listagem.c.nome, listagem.c.id]). Com 'descendente'
+    todas são percorridas de trás para frente (o mesmo índice serve, lido
+    ao contrário).
+
+    Retorna (linhas, proximo_cursor); proximo_cursor é None na última página.
+    """
+    if cursor:
+        valores = decodificar_cursor(cursor, ordem)
+        chave, ultima = sa.tuple_(*ordem), sa.tuple_(*[sa.literal(v) for v in valores])
+        select = select.where(chave < ultima if descendente else chave > ultima)
+
+    ordenacao = [coluna.desc() for coluna in ordem] if descendente else ordem
+    # Busca uma linha a mais para saber se existe próxima página
+    linhas = session.execute(select.order_by(None).order_by(*ordenacao).limit(limite + 1)).all()
+
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor([linhas[-1]._mapping[coluna] for coluna in ordem])
+
+    return linhas, proximo_cursor
@@ -0,0 +1,365 @@
+# related.py
+#
+# "Produtos relacionados" do modal, pré-calculados.
+#
+# Cada produto vira um vetor TF-IDF com as palavras do nome (peso maior) e
+# da descrição, mais um termo '#<id>' por categoria, e a semelhança entre
+# dois produtos é o cosseno entre os vetores. Os vetores ficam na tabela
+# 'produto_termo' (que serve também de lista invertida: termo -> produtos)
+# e os k vizinhos de cada produto, já ordenados, em 'produto_relacionado':
+# o modal lê os relacionados com uma consulta pela chave primária.
+#
+#   'flask build-related'  refaz tudo em memória (com NumPy, se instalado);
+#   tarefa 'atualizar_relacionados' (jobs.py), enfileirada pelo admin a cada
+#   produto criado/alterado/excluído: refaz só o vetor e a lista dele, pelo
+#   SQL, e corrige as listas dos produtos afetados (que o listavam ou
+#   passam a listá-lo).
+#
+# A atualização incremental usa os df do momento: os pesos dos outros
+# produtos não são recalculados, então a lista vai se afastando um pouco do
+# cálculo completo com o tempo. Rode o 'flask build-related' de vez em
+# quando (ex: todo dia, pelo cron) e depois de importações grandes.
+
+import functools
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+import sqlalchemy as sa
+
+from listing import listagem
+from models import Produto, ProdutoRelacionado, ProdutoTermo, produto_categoria
+from search import normalizar_texto
+
+try:
+    import numpy as np # Opcional: acelera o 'flask build-related'
+except ImportError:
+    np = None
+
+termos = ProdutoTermo.__table__
+relacionados_tabela = ProdutoRelacionado.__table__
+produtos_tabela = Produto.__table__
+
+# Peso das palavras do nome em relação às da descrição
+PESO_NOME = 3.0
+# Peso (tf) de cada categoria do produto
+PESO_CATEGORIA = 2.0
+# Termos presentes em mais que esta fração do catálogo não contam (ex: "algodao"
+# numa loja de roupas de algodão); só a partir de DF_MINIMO_CATALOGO produtos
+DF_MAXIMO = 0.5
+DF_MINIMO_CATALOGO = 20
+
+TAMANHO_MINIMO = 3
+STOPWORDS = frozenset("""
+    com para por sem uma uns umas que dos das nos nas num numa seu sua seus suas
+    mais muito como pelo pela pelos pelas este esta isso esse essa ate tem voce
+""".split())
+
+# Diferença mínima de similaridade para um produto tomar a vaga de outro na
+# atualização incremental: somas em ordens diferentes (SQL x Python) variam
+# nas últimas casas, e um empate não deve reescrever centenas de listas
+EPSILON = 1e-9
+
+# Variáveis por consulta no SQLite ('IN (...)')
+TAMANHO_LOTE_SQL = 500
+
+_PALAVRA = re.compile(r'[a-z0-9]+')
+
+
+def palavras(texto):
+    """Palavras sem acento e sem as muito curtas ou vazias ("Calça de Algodão" -> calca, algodao)."""
+    return [p for p in _PALAVRA.findall(normalizar_texto(texto))
+            if len(p) >= TAMANHO_MINIMO and p not in STOPWORDS]
+
+
+def termos_brutos(nome, descricao, categoria_ids):
+    """Frequência (tf, com escala logarítmica) de cada termo do produto."""
+    contagem = Counter()
+    for palavra in palavras(nome):
+        contagem[palavra] += PESO_NOME
+    for palavra in palavras(descricao):
+        contagem[palavra] += 1
+    tf = {termo[:60]: 1 + math.log(valor) for termo, valor in contagem.items()}
+    for categoria_id in categoria_ids:
+        tf[f'#{categoria_id}'] = PESO_CATEGORIA
+    return tf
+
+
+def vetor(tf, df, total):
+    """
+    Pesos TF-IDF normalizados (norma 1). 'df' é o número de produtos com
+    cada termo (contando este) e 'total' o de produtos do catálogo. Termos
+    comuns demais ficam com peso 0.
+    """
+    comum = total * DF_MAXIMO if total >= DF_MINIMO_CATALOGO else None
+    pesos = {}
+    for termo, valor in tf.items():
+        if comum is not None and df[termo] > comum:
+            pesos[termo] = 0.0
+        else:
+            pesos[termo] = valor * (math.log((1 + total) / (1 + df[termo])) + 1)
+    norma = math.sqrt(sum(p * p for p in pesos.values()))
+    return {t: (p / norma if norma else 0.0) for t, p in pesos.items()}
+
+
+def _lotes(itens, tamanho=TAMANHO_LOTE_SQL):
+    itens = list(itens)
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
+
+
+def _ordenar(candidatos, k):
+    """[(id, similaridade)] -> os k maiores (empate: menor id primeiro)."""
+    return sorted(candidatos, key=lambda c: (-c[1], c[0]))[:k]
+
+
+# --- Cálculo completo (flask build-related) ---
+
+def _ler_catalogo(conexao, tamanho_lote):
+    """(id, nome, descrição, ids das categorias) de todos os produtos, em lotes por id."""
+    ultimo_id = 0
+    while True:
+        lote = conexao.execute(
+            sa.select(produtos_tabela.c.id, produtos_tabela.c.nome, produtos_tabela.c.descricao)
+            .where(produtos_tabela.c.id > ultimo_id).order_by(produtos_tabela.c.id).limit(tamanho_lote)
+        ).all()
+        if not lote:
+            return
+        categorias = defaultdict(list)
+        for produto_id, categoria_id in conexao.execute(
+                sa.select(produto_categoria.c.produto_id, produto_categoria.c.categoria_id)
+                .where(produto_categoria.c.produto_id.between(lote[0].id, lote[-1].id))):
+            categorias[produto_id].append(categoria_id)
+        for produto in lote:
+            yield produto.id, produto.nome, produto.descricao, categorias[produto.id]
+        ultimo_id = lote[-1].id
+
+
+def _vizinhos_python(vetores, postings, k):
+    """Para cada produto, soma os produtos dos pesos nos termos em comum (só os candidatos)."""
+    for i, vetor_produto in enumerate(vetores):
+        acumulado = defaultdict(float)
+        for termo, peso in vetor_produto:
+            for j, peso_outro in postings[termo]:
+                acumulado[j] += peso * peso_outro
+        acumulado.pop(i, None)
+        yield _ordenar(acumulado.items(), k)
+
+
+def _vizinhos_numpy(vetores, postings, k):
+    """Mesmo cálculo de '_vizinhos_python', com as listas invertidas em arrays."""
+    arrays = {termo: (np.fromiter((j for j, _ in lista), dtype=np.int64, count=len(lista)),
+                      np.fromiter((p for _, p in lista), dtype=np.float64, count=len(lista)))
+              for termo, lista in postings.items()}
+    similaridades = np.zeros(len(vetores))
+    for i, vetor_produto in enumerate(vetores):
+        for termo, peso in vetor_produto:
+            indices, pesos = arrays[termo]
+            similaridades[indices] += peso * pesos # Cada produto aparece uma vez por termo
+        similaridades[i] = 0.0
+        candidatos = np.flatnonzero(similaridades)
+        valores = similaridades[candidatos]
+        # Índices seguem a ordem dos ids: o desempate é o mesmo do cálculo em Python
+        melhores = candidatos[np.lexsort((candidatos, -valores))[:k]]
+        yield [(int(j), float(similaridades[j])) for j in melhores]
+        similaridades[candidatos] = 0.0
+
+
+def precisa_reconstruir(conexao):
+    """True se há produtos mas nenhum vetor calculado (banco criado antes dos relacionados)."""
+    tem_produtos = conexao.scalar(sa.select(produtos_tabela.c.id).limit(1)) is not None
+    tem_termos = conexao.scalar(sa.select(termos.c.produto_id).limit(1)) is not None
+    return tem_produtos and not tem_termos
+
+
+def reconstruir(conexao, k, tamanho_lote=5000):
+    """
+    Apaga e recalcula os vetores e os vizinhos de todo o catálogo. Não faz
+    commit (quem chama decide a transação). Retorna um resumo.
+    """
+    inicio = time.perf_counter()
+    ids, brutos = [], []
+    df = Counter()
+    for produto_id, nome, descricao, categoria_ids in _ler_catalogo(conexao, tamanho_lote):
+        tf = termos_brutos(nome, descricao, categoria_ids)
+        ids.append(produto_id)
+        brutos.append(tf)
+        df.update(tf.keys())
+
+    total = len(ids)
+    vetores = []
+    postings = defaultdict(list) # termo -> [(índice do produto, peso)]
+    conexao.execute(sa.delete(termos))
+    for inicio_lote in range(0, total, tamanho_lote):
+        linhas = []
+        for i in range(inicio_lote, min(inicio_lote + tamanho_lote, total)):
+            pesos = vetor(brutos[i], df, total)
+            brutos[i] = None # Libera a memória
+            linhas.extend({'produto_id': ids[i], 'termo': t, 'peso': p} for t, p in pesos.items())
+            usados = [(t, p) for t, p in pesos.items() if p > 0]
+            vetores.append(usados)
+            for termo, peso in usados:
+                postings[termo].append((i, peso))
+        if linhas:
+            conexao.execute(sa.insert(termos), linhas)
+
+    calcular = _vizinhos_numpy if np is not None else _vizinhos_python
+    conexao.execute(sa.delete(relacionados_tabela))
+    linhas = []
+    pares = 0
+    for i, vizinhos in enumerate(calcular(vetores, postings, k)):
+        linhas.extend({'produto_id': ids[i], 'posicao': posicao, 'relacionado_id': ids[j], 'similaridade': s}
+                      for posicao, (j, s) in enumerate(vizinhos))
+        if len(linhas) >= tamanho_lote:
+            conexao.execute(sa.insert(relacionados_tabela), linhas)
+            pares += len(linhas)
+            linhas = []
+    if linhas:
+        conexao.execute(sa.insert(relacionados_tabela), linhas)
+        pares += len(linhas)
+
+    return {
+        'produtos': total,
+        'termos': len(df),
+        'pares': pares,
+        'numpy': np is not None,
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
+
+
+# --- Atualização incremental (tarefa 'atualizar_relacionados') ---
+
+def _similares(conexao, produto_id, limite=None):
+    """Vizinhos de um produto pelo SQL: a lista invertida é lida pelo índice do termo."""
+    a, b = termos.alias('a'), termos.alias('b')
+    similaridade = sa.func.sum(a.c.peso * b.c.peso).label('similaridade')
+    consulta = (
+        sa.select(b.c.produto_id, similaridade)
+        .select_from(a.join(b, a.c.termo == b.c.termo))
+        .where(a.c.produto_id == produto_id, a.c.peso > 0, b.c.produto_id != produto_id)
+        .group_by(b.c.produto_id)
+        .order_by(similaridade.desc(), b.c.produto_id)
+    )
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    return [(linha.produto_id, linha.similaridade) for linha in conexao.execute(consulta)]
+
+
+def _gravar_lista(conexao, produto_id, vizinhos):
+    conexao.execute(sa.delete(relacionados_tabela).where(relacionados_tabela.c.produto_id == produto_id))
+    if vizinhos:
+        conexao.execute(sa.insert(relacionados_tabela), [
+            {'produto_id': produto_id, 'posicao': posicao, 'relacionado_id': j, 'similaridade': s}
+            for posicao, (j, s) in enumerate(vizinhos)
+        ])
+
+
+def _revetorizar(conexao, produto_id):
+    """Regrava o vetor do produto com os df atuais. Retorna False se ele não existe mais."""
+    conexao.execute(sa.delete(termos).where(termos.c.produto_id == produto_id))
+    produto = conexao.execute(
+        sa.select(produtos_tabela.c.nome, produtos_tabela.c.descricao).where(produtos_tabela.c.id == produto_id)
+    ).first()
+    if produto is None:
+        return False
+    categoria_ids = conexao.scalars(
+        sa.select(produto_categoria.c.categoria_id).where(produto_categoria.c.produto_id == produto_id)).all()
+    tf = termos_brutos(produto.nome, produto.descricao, categoria_ids)
+    df = Counter(tf.keys()) # O próprio produto
+    for lote in _lotes(tf):
+        df.update(dict(conexao.execute(
+            sa.select(termos.c.termo, sa.func.count()).where(termos.c.termo.in_(lote)).group_by(termos.c.termo)
+        ).all()))
+    total = conexao.scalar(sa.select(sa.func.count()).select_from(produtos_tabela))
+    pesos = vetor(tf, df, total)
+    if pesos:
+        conexao.execute(sa.insert(termos), [
+            {'produto_id': produto_id, 'termo': t, 'peso': p} for t, p in pesos.items()
+        ])
+    return True
+
+
+def _listas(conexao, ids):
+    """Listas atuais de vizinhos: {id: [(relacionado_id, similaridade)]}."""
+    listas = defaultdict(list)
+    for lote in _lotes(ids):
+        for linha in conexao.execute(
+                sa.select(relacionados_tabela.c.produto_id, relacionados_tabela.c.relacionado_id,
+                          relacionados_tabela.c.similaridade)
+                .where(relacionados_tabela.c.produto_id.in_(lote))
+                .order_by(relacionados_tabela.c.produto_id, relacionados_tabela.c.posicao)):
+            listas[linha.produto_id].append((linha.relacionado_id, linha.similaridade))
+    return listas
+
+
+def atualizar(conexao, produto_id, k):
+    """
+    Refaz o vetor e os vizinhos de um produto criado, alterado ou excluído
+    e corrige as listas dos outros (a semelhança é simétrica): ele entra nas
+    que agora alcança e muda de posição ou sai das que o continham. Só uma
+    lista de que ele saiu é recalculada pelo SQL (outro produto fica com a
+    vaga). Não faz commit. Retorna os ids dos produtos cuja lista mudou.
+    """
+    existe = _revetorizar(conexao, produto_id)
+    similares = _similares(conexao, produto_id) if existe else []
+    _gravar_lista(conexao, produto_id, similares[:k])
+    alterados = {produto_id}
+
+    novas = dict(similares)
+    # Produtos que o listavam + os que agora podem listá-lo
+    outros = set(conexao.scalars(
+        sa.select(relacionados_tabela.c.produto_id).where(relacionados_tabela.c.relacionado_id == produto_id)))
+    outros.update(novas)
+    outros.discard(produto_id)
+    for lote in _lotes(sorted(outros)):
+        listas = _listas(conexao, lote)
+        for outro_id in lote:
+            atual = listas.get(outro_id, [])
+            demais = [(j, s) for j, s in atual if j != produto_id]
+            similaridade = novas.get(outro_id)
+            cheia = len(atual) >= k
+            minimo = atual[-1][1] if atual else None
+            if len(demais) == len(atual): # Não estava na lista: entra se superar o último
+                if similaridade is None or (cheia and similaridade <= minimo + EPSILON):
+                    continue
+                lista = _ordenar(demais + [(produto_id, similaridade)], k)
+            elif not cheia or (similaridade is not None and similaridade >= minimo - EPSILON):
+                # Continua entre os k (ou a lista tinha todos os candidatos): só muda a posição
+                lista = _ordenar(demais + ([(produto_id, similaridade)] if similaridade else []), k)
+            else:
+                lista = _similares(conexao, outro_id, k) # Saiu: a vaga é de outro produto
+            _gravar_lista(conexao, outro_id, lista)
+            alterados.add(outro_id)
+    return alterados
+
+
+@functools.lru_cache(maxsize=None)
+def engine(uri):
+    """Engine própria dos processos do pool de tarefas (uma por processo)."""
+    return sa.create_engine(uri, connect_args={'timeout': 30} if uri.startswith('sqlite:') else {})
+
+
+# --- Leitura (modal) ---
+
+def relacionados(conexao, ids, limite=None):
+    """
+    Cards dos relacionados de cada produto: {id: [linhas]}, na ordem da
+    semelhança. Uma consulta pela chave primária (produto_id, posicao),
+    com os dados do card vindos do read model da listagem.
+    """
+    resultado = {i: [] for i in ids}
+    if not ids:
+        return resultado
+    consulta = (
+        sa.select(relacionados_tabela.c.produto_id.label('origem_id'), listagem.c.id, listagem.c.nome,
+                  listagem.c.preco, listagem.c.imagem_destaque_url)
+        .join(listagem, listagem.c.id == relacionados_tabela.c.relacionado_id)
+        .where(relacionados_tabela.c.produto_id.in_(ids))
+        .order_by(relacionados_tabela.c.produto_id, relacionados_tabela.c.posicao)
+    )
+    if limite is not None:
+        consulta = consulta.where(relacionados_tabela.c.posicao < limite)
+    for linha in conexao.execute(consulta):
+        resultado[linha.origem_id].append(linha)
+    return resultado
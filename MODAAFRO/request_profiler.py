@@ -0,0 +1,249 @@
+# request_profiler.py
+#
+# Profiling de requisições em produção, para descobrir se o tempo de uma rota
+# lenta vai para o SQL, para o Jinja ('render_template') ou para o Python.
+#
+# Sob demanda: um admin logado adiciona '?_perfil=' à URL (ou manda o header
+# 'X-Perfil') e, no lugar da página, recebe o perfil daquela requisição:
+#
+#   prof      cProfile em formato pstats (snakeviz, 'python -m pstats')
+#   texto     as funções mais caras pelo tempo acumulado, em texto
+#   amostras  pilhas amostradas a cada PROFILER_SAMPLE_INTERVAL, no formato
+#             "folded" (flamegraph.pl, speedscope)
+#
+# O parâmetro '_perfil' não faz parte da chave do cache de páginas, então a
+# página é sempre renderizada; com o header, a requisição é medida como
+# chegou (um acerto no cache aparece como tal).
+#
+# Amostragem contínua: com PROFILER_SAMPLE_RATE > 0, essa fração das
+# requisições passa pelo cProfile e as PROFILER_KEEP mais lentas ficam em
+# memória (por worker), listadas em /admin/perfis. Com a taxa em 0 e sem o
+# parâmetro, o custo por requisição é olhar um parâmetro e um header.
+
+import cProfile
+import heapq
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, before_render_template, g, request, template_rendered
+from flask_login import current_user
+
+PARAMETRO = '_perfil'
+HEADER = 'X-Perfil'
+FORMATOS = ('prof', 'texto', 'amostras')
+FUNCOES_TEXTO = 60 # Linhas do formato 'texto'
+
+
+class _Amostrador(threading.Thread):
+    """Lê a pilha de uma thread a cada 'intervalo' segundos e conta as pilhas iguais."""
+
+    def __init__(self, thread_id, intervalo):
+        super().__init__(name='perfil-amostras', daemon=True)
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+    def folded(self):
+        """Uma linha por pilha: 'raiz;...;folha <amostras>'."""
+        return ''.join(f'{pilha} {n}\n' for pilha, n in self.pilhas.most_common())
+
+
+class ProfilerRequisicoes:
+    """
+    Liga o cProfile (ou o amostrador de pilhas) numa requisição: quando um
+    admin pede (?_perfil= / X-Perfil) ou, com PROFILER_SAMPLE_RATE, numa
+    fração sorteada delas. Usa o SQLProfiler, se houver, para separar o
+    tempo de banco; o do Jinja vem dos sinais do 'render_template'.
+    """
+
+    def __init__(self, app=None, sql_profiler=None):
+        self.sql_profiler = sql_profiler
+        self._lentas = [] # heap (total_ms, id, resumo, stats): a mais rápida sai primeiro
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.amostradas = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_ENABLED', True)
+        app.config.setdefault('PROFILER_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILER_KEEP', 20)
+        app.config.setdefault('PROFILER_SAMPLE_INTERVAL', 0.001)
+        self.app = app
+        if not app.config['PROFILER_ENABLED']:
+            return
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+        app.teardown_request(self._descartar)
+        before_render_template.connect(self._antes_template, app)
+        template_rendered.connect(self._depois_template, app)
+
+    # --- Ciclo da requisição ---
+
+    def _formato_pedido(self):
+        """Formato pedido por um admin logado, ou None (pedidos de outros são ignorados)."""
+        valor = request.args.get(PARAMETRO) or request.headers.get(HEADER)
+        if not valor or not current_user.is_authenticated:
+            return None
+        return valor if valor in FORMATOS else 'prof'
+
+    def _iniciar(self):
+        formato = self._formato_pedido()
+        if formato is None:
+            taxa = self.app.config['PROFILER_SAMPLE_RATE']
+            if not taxa or random.random() >= taxa:
+                return
+        perfil = {'formato': formato, 'template': 0.0}
+        if formato == 'amostras':
+            perfil['amostrador'] = _Amostrador(threading.get_ident(), self.app.config['PROFILER_SAMPLE_INTERVAL'])
+            perfil['amostrador'].start()
+        else:
+            perfil['profiler'] = cProfile.Profile()
+            try:
+                perfil['profiler'].enable()
+            except ValueError: # Outro profiler já ativo nesta thread
+                return
+        perfil['inicio'] = time.perf_counter()
+        g.perfil = perfil
+
+    def _antes_template(self, sender, template, context, **extra):
+        if 'perfil' in g:
+            g.perfil['template_inicio'] = time.perf_counter()
+
+    def _depois_template(self, sender, template, context, **extra):
+        if 'perfil' in g and 'template_inicio' in g.perfil:
+            g.perfil['template'] += time.perf_counter() - g.perfil.pop('template_inicio')
+
+    def _finalizar(self, response):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return response
+        total = time.perf_counter() - perfil['inicio']
+        if 'profiler' in perfil:
+            perfil['profiler'].disable()
+        else:
+            perfil['amostrador'].parar()
+
+        queries, tempo_db = (self.sql_profiler.totais() if self.sql_profiler else None) or (0, 0.0)
+        resumo = {
+            'id': next(self._ids),
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'quando': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(tempo_db * 1000, 2),
+            'queries': queries,
+            'template_ms': round(perfil['template'] * 1000, 2),
+        }
+        resumo['python_ms'] = round(max(resumo['total_ms'] - resumo['db_ms'] - resumo['template_ms'], 0), 2)
+
+        if perfil['formato'] is None:
+            self._guardar(resumo, perfil['profiler'])
+            return response
+        if perfil['formato'] == 'amostras':
+            resposta = self._arquivo(perfil['amostrador'].folded().encode('utf-8'), resumo, 'folded', 'text/plain')
+        else:
+            resposta = self.responder(resumo, pstats.Stats(perfil['profiler']), perfil['formato'])
+        resposta.headers['X-Perfil-Status'] = str(response.status_code)
+        return resposta
+
+    def _descartar(self, exc):
+        # Requisição que terminou sem passar pelo after_request (erro não tratado)
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            if 'profiler' in perfil:
+                perfil['profiler'].disable()
+            else:
+                perfil['amostrador'].parar()
+
+    # --- As mais lentas (amostragem contínua) ---
+
+    def _guardar(self, resumo, profiler):
+        limite = self.app.config['PROFILER_KEEP']
+        with self._lock:
+            self.amostradas += 1
+            if len(self._lentas) >= limite and resumo['total_ms'] <= self._lentas[0][0]:
+                return # Mais rápida que todas as guardadas: nem monta as estatísticas
+        stats = pstats.Stats(profiler)
+        with self._lock:
+            item = (resumo['total_ms'], resumo['id'], resumo, stats)
+            if len(self._lentas) < limite:
+                heapq.heappush(self._lentas, item)
+            else:
+                heapq.heappushpop(self._lentas, item)
+
+    def lentas(self):
+        """Resumos das requisições guardadas, da mais lenta para a mais rápida."""
+        with self._lock:
+            return [resumo for _, _, resumo, _ in sorted(self._lentas, reverse=True)]
+
+    def obter(self, perfil_id):
+        """(resumo, pstats.Stats) de uma requisição guardada, ou None."""
+        with self._lock:
+            for _, item_id, resumo, stats in self._lentas:
+                if item_id == perfil_id:
+                    return resumo, stats
+        return None
+
+    def estatisticas(self):
+        return {
+            'nome': 'perfis',
+            'taxa': self.app.config['PROFILER_SAMPLE_RATE'],
+            'amostradas': self.amostradas,
+            'guardadas': len(self._lentas),
+        }
+
+    # --- Respostas ---
+
+    def responder(self, resumo, stats, formato='prof'):
+        """O perfil como download .prof (pstats) ou, com formato='texto', as funções mais caras."""
+        if formato != 'texto':
+            return self._arquivo(marshal.dumps(stats.stats), resumo, 'prof', 'application/octet-stream')
+        buffer = io.StringIO()
+        buffer.write(f"{resumo['method']} {resumo['path']} ({resumo['endpoint']}, status {resumo['status']})\n"
+                     f"total {resumo['total_ms']} ms = SQL {resumo['db_ms']} ms ({resumo['queries']} queries)"
+                     f" + templates {resumo['template_ms']} ms + Python {resumo['python_ms']} ms\n")
+        stats.stream = buffer
+        stats.sort_stats('cumulative').print_stats(FUNCOES_TEXTO)
+        response = Response(buffer.getvalue(), mimetype='text/plain')
+        return self._cabecalhos(response, resumo)
+
+    def _arquivo(self, dados, resumo, extensao, mimetype):
+        response = Response(dados, mimetype=mimetype)
+        nome = f"perfil-{resumo['endpoint'] or 'requisicao'}-{resumo['id']}.{extensao}"
+        response.headers['Content-Disposition'] = f'attachment; filename="{nome}"'
+        return self._cabecalhos(response, resumo)
+
+    @staticmethod
+    def _cabecalhos(response, resumo):
+        response.headers['Server-Timing'] = (f"total;dur={resumo['total_ms']}, "
+                                             f"tpl;dur={resumo['template_ms']}, app;dur={resumo['python_ms']}")
+        response.cache_control.no_store = True
+        return response
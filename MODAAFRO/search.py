@@ -0,0 +1,176 @@
+# search.py
+
+import re
+import unicodedata
+
+import sqlalchemy as sa
+
+from models import db, Produto
+
+# Tabela virtual FTS5 com o texto pesquisável de cada produto.
+# O 'rowid' da tabela é o próprio 'produto.id'.
+# 'remove_diacritics 2' faz "calça" casar com "calca" (e vice-versa).
+FTS_TABLE = 'produto_fts'
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(nome, descricao, tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+# Peso de cada coluna no ranking (bm25): o nome vale mais que a descrição
+PESO_NOME = 10.0
+PESO_DESCRICAO = 1.0
+
+_fts = sa.table(FTS_TABLE, sa.column('rowid'))
+
+# Bancos (URL do engine) em que a tabela FTS já foi vista: ela não some
+# depois de criada ('reconstruir_indice' a recria na mesma transação), então
+# basta consultar o sqlite_master até encontrá-la uma vez
+_fts_encontrada = set()
+
+
+def normalizar_texto(texto):
+    """Remove acentos e converte para minúsculas ("Calça" -> "calca")."""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acento = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return sem_acento.casefold()
+
+
+def _fts_disponivel():
+    """Verifica se o banco é SQLite e se a tabela FTS já foi criada."""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    banco = str(db.engine.url)
+    if banco in _fts_encontrada:
+        return True
+    existe = db.session.execute(
+        sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+        {'nome': FTS_TABLE}
+    ).first()
+    if existe is not None:
+        _fts_encontrada.add(banco)
+    return existe is not None
+
+
+def criar_indice():
+    """Cria a tabela FTS5 (se ainda não existir)."""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    db.session.execute(sa.text(FTS_DDL))
+    db.session.commit()
+
+
+def reconstruir_indice(tamanho_lote=1000):
+    """Apaga e reindexa todos os produtos. Retorna quantos foram indexados."""
+    if db.engine.dialect.name != 'sqlite':
+        return 0
+    db.session.execute(sa.text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    db.session.execute(sa.text(FTS_DDL))
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        # Lê em lotes (por id) para não carregar o catálogo inteiro na memória
+        lote = db.session.execute(
+            sa.select(Produto.id, Produto.nome, Produto.descricao)
+            .where(Produto.id > ultimo_id)
+            .order_by(Produto.id)
+            .limit(tamanho_lote)
+        ).all()
+        if not lote:
+            break
+        db.session.execute(
+            sa.text(f"INSERT INTO {FTS_TABLE} (rowid, nome, descricao) VALUES (:id, :nome, :descricao)"),
+            [{'id': p.id, 'nome': p.nome, 'descricao': p.descricao or ''} for p in lote]
+        )
+        total += len(lote)
+        ultimo_id = lote[-1].id
+
+    db.session.commit()
+    return total
+
+
+def indexar_produto(produto):
+    """
+    Atualiza o produto no índice. Não faz commit: a escrita entra na
+    mesma transação da rota, então o índice nunca diverge do produto.
+    """
+    if not _fts_disponivel():
+        return
+    if produto.id is None:
+        db.session.flush() # Garante que o produto já tem ID
+    db.session.execute(
+        sa.text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"),
+        {'id': produto.id}
+    )
+    db.session.execute(
+        sa.text(f"INSERT INTO {FTS_TABLE} (rowid, nome, descricao) VALUES (:id, :nome, :descricao)"),
+        {'id': produto.id, 'nome': produto.nome, 'descricao': produto.descricao or ''}
+    )
+
+
+def indexar_produtos(produtos):
+    """Versão em lote de 'indexar_produto' (ex: importação do catálogo)."""
+    if not produtos or not _fts_disponivel():
+        return
+    db.session.execute(
+        sa.text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"),
+        [{'id': p.id} for p in produtos]
+    )
+    db.session.execute(
+        sa.text(f"INSERT INTO {FTS_TABLE} (rowid, nome, descricao) VALUES (:id, :nome, :descricao)"),
+        [{'id': p.id, 'nome': p.nome, 'descricao': p.descricao or ''} for p in produtos]
+    )
+
+
+def remover_produto(produto_id):
+    """Remove o produto do índice (também sem commit)."""
+    if not _fts_disponivel():
+        return
+    db.session.execute(
+        sa.text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"),
+        {'id': produto_id}
+    )
+
+
+def _montar_expressao(termo):
+    """
+    Converte o texto digitado numa expressão MATCH do FTS5.
+    Cada palavra vira um prefixo entre aspas ("cal"*), todas obrigatórias.
+    """
+    palavras = re.findall(r'\w+', normalizar_texto(termo))
+    return ' '.join(f'"{p}"*' for p in palavras)
+
+
+def aplicar_busca(query_produtos, termo, coluna_id=Produto.id):
+    """
+    Filtra uma query de Produto pelo termo pesquisado. 'coluna_id' é a
+    coluna com o id do produto (ex: a do read model da listagem).
+
+    Retorna (query, coluna_rank). 'coluna_rank' é a relevância bm25
+    (negativa: quanto menor, mais relevante) para ser usada na ordenação;
+    sem índice FTS cai no 'ilike' antigo e a coluna é None.
+    """
+    if not _fts_disponivel():
+        search_term = f"%{termo}%"
+        condicao = db.or_(
+            Produto.nome.ilike(search_term),
+            Produto.descricao.ilike(search_term)
+        )
+        if coluna_id is not Produto.id:
+            condicao = coluna_id.in_(sa.select(Produto.id).where(condicao))
+        return query_produtos.filter(condicao), None
+
+    expressao = _montar_expressao(termo)
+    if not expressao:
+        return query_produtos.filter(sa.false()), None
+
+    ranking = sa.func.bm25(sa.literal_column(FTS_TABLE), PESO_NOME, PESO_DESCRICAO)
+    resultados = (
+        sa.select(_fts.c.rowid.label('produto_id'), ranking.label('rank'))
+        .where(sa.literal_column(FTS_TABLE).op('MATCH')(expressao))
+        .subquery()
+    )
+    query_produtos = query_produtos.join(resultados, resultados.c.produto_id == coluna_id)
+    return query_produtos, resultados.c.rank
@@ -0,0 +1,473 @@
+# snapshot.py
+#
+# Snapshot binário do catálogo, somente leitura, que todos os workers mapeiam
+# na memória com 'mmap': produtos (com imagens, categorias e relacionados),
+# categorias, banners e configurações do site.
+#
+# Sem ele, cada worker do gunicorn carrega e guarda a sua própria cópia
+# desses dados pelo SQLAlchemy: a memória cresce com o número de workers e
+# um worker novo é lento nas primeiras requisições. O arquivo mapeado fica
+# no cache de páginas do sistema operacional, uma vez só para todos, e um
+# produto é decodificado do arquivo só quando é pedido (busca binária pelo
+# id, sem carregar o resto).
+#
+# O arquivo guarda a versão do catálogo (cache.VersaoCompartilhada) de quando
+# foi gerado. Se ela não bate com a atual (ou o arquivo não existe), quem lê
+# volta para o banco e uma thread refaz o snapshot em segundo plano, num
+# arquivo temporário trocado atomicamente (os.replace); uma trava no disco
+# garante que só um worker da máquina faz isso por vez. As alterações do
+# admin já disparam a regeneração logo depois do commit. Se o processo sai
+# no meio, a geração é interrompida e apaga o temporário; os que sobram de
+# um processo morto (kill -9) são apagados quando o próximo inicia.
+#
+# Formato (inteiros na ordem de bytes da máquina: o arquivo é gerado e lido
+# no mesmo servidor):
+#
+#   cabeçalho  MAGICO, FORMATO, versão do catálogo e (início, quantidade) de cada seção
+#   textos     UTF-8 de todos os textos, referenciados por (posição, tamanho)
+#   ids        uint32 dos produtos, em ordem (busca binária)
+#   produtos   registros de tamanho fixo (_PRODUTO), na mesma ordem dos ids
+#   imagens    (posição, tamanho) dos arquivos de cada produto, em sequência
+#   listas     uint32: categorias e relacionados de cada produto, destaques
+#   categorias, banners e configurações: registros de tamanho fixo
+
+import atexit
+import bisect
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+import sqlalchemy as sa
+
+from cache import Versao
+from models import Banner, Categoria, ImagemProduto, Produto, ProdutoRelacionado, SiteSettings, produto_categoria
+
+try:
+    import fcntl # Só em Unix: um worker por vez refaz o arquivo
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger('modaafro.snapshot')
+
+MAGICO = b'MODASNAP'
+FORMATO = 1
+NULO = 0xFFFFFFFF # Texto ausente (None)
+ORDEM_NULA = -2**63
+
+# Arquivos temporários da geração; os parados há mais de uma hora são de
+# uma geração que não terminou
+PREFIXO_TEMPORARIO = '.snapshot-'
+TEMPORARIO_MAX_IDADE = 3600
+
+SECOES = ('textos', 'ids', 'produtos', 'imagens', 'categorias_produto', 'relacionados',
+          'destaques', 'categorias', 'banners', 'configuracoes')
+
+_CABECALHO = struct.Struct('=8sI3q' + 'qq' * len(SECOES))
+# id, preço, destaque, nome, descrição, imagem de destaque (posição e tamanho
+# de cada texto) e (primeiro, quantidade) das imagens, categorias e relacionados
+_PRODUTO = struct.Struct('=IdB12I')
+_TEXTO = struct.Struct('=II')
+_CATEGORIA = struct.Struct('=III')
+_BANNER = struct.Struct('=Iq4I')
+_CONFIGURACAO = struct.Struct('=4I')
+
+ProdutoSnapshot = namedtuple('ProdutoSnapshot', [
+    'id', 'nome', 'descricao', 'preco', 'destaque', 'imagem_destaque_url',
+    'imagens', 'categoria_ids', 'relacionado_ids',
+])
+ImagemSnapshot = namedtuple('ImagemSnapshot', ['url_imagem'])
+BannerSnapshot = namedtuple('BannerSnapshot', ['id', 'imagem_url', 'link_url', 'ordem'])
+
+
+class FormatoInvalido(ValueError):
+    """O arquivo não é um snapshot (ou é de um formato antigo)."""
+
+
+class GeracaoInterrompida(Exception):
+    """A geração foi cancelada pelo evento 'parar' (o processo está saindo)."""
+
+
+# --- Geração ---
+
+class _Textos:
+    """Grava os textos direto no arquivo e devolve (posição, tamanho) de cada um."""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.tamanho = 0
+
+    def gravar(self, texto):
+        if texto is None:
+            return NULO, 0
+        dados = texto.encode('utf-8')
+        posicao = self.tamanho
+        self.arquivo.write(dados)
+        self.tamanho += len(dados)
+        return posicao, len(dados)
+
+
+class _PorProduto:
+    """Percorre um SELECT ordenado por produto_id junto com os produtos (merge, sem carregar tudo)."""
+
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._atual = next(self._linhas, None)
+
+    def pegar(self, produto_id):
+        """Valores (2ª coluna) das linhas do produto; descarta as de ids menores."""
+        valores = []
+        while self._atual is not None and self._atual[0] <= produto_id:
+            if self._atual[0] == produto_id:
+                valores.append(self._atual[1])
+            self._atual = next(self._linhas, None)
+        return valores
+
+
+def _alinhar(arquivo):
+    """Completa o arquivo até um múltiplo de 8 (as seções de uint32 viram memoryview)."""
+    sobra = arquivo.tell() % 8
+    if sobra:
+        arquivo.write(b'\0' * (8 - sobra))
+    return arquivo.tell()
+
+
+def construir(conexao, caminho, versao, lote=1000, parar=None):
+    """
+    Gera o snapshot em 'caminho' a partir de 'conexao'. 'versao' é a versão
+    do catálogo lida ANTES das consultas: se algo mudar durante a geração, o
+    arquivo já nasce desatualizado e é refeito, nunca o contrário. Se o
+    evento 'parar' for acionado, levanta GeracaoInterrompida (sem deixar o
+    temporário para trás).
+    Retorna um resumo (produtos, bytes, segundos).
+    """
+    inicio = time.perf_counter()
+    pasta = os.path.dirname(caminho) or '.'
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=PREFIXO_TEMPORARIO)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'\0' * _CABECALHO.size)
+            textos = _Textos(f)
+
+            ids, registros = array('I'), bytearray()
+            imagens, categorias_produto, relacionados, destaques = bytearray(), array('I'), array('I'), array('I')
+
+            por_imagem = _PorProduto(conexao.execute(
+                sa.select(ImagemProduto.produto_id, ImagemProduto.url_imagem)
+                .order_by(ImagemProduto.produto_id, ImagemProduto.id)
+                .execution_options(yield_per=lote)))
+            por_categoria = _PorProduto(conexao.execute(
+                sa.select(produto_categoria.c.produto_id, produto_categoria.c.categoria_id)
+                .order_by(produto_categoria.c.produto_id, produto_categoria.c.categoria_id)
+                .execution_options(yield_per=lote)))
+            por_relacionado = _PorProduto(conexao.execute(
+                sa.select(ProdutoRelacionado.produto_id, ProdutoRelacionado.relacionado_id)
+                .order_by(ProdutoRelacionado.produto_id, ProdutoRelacionado.posicao)
+                .execution_options(yield_per=lote)))
+            produtos = conexao.execute(
+                sa.select(Produto.id, Produto.nome, Produto.descricao, Produto.preco,
+                          Produto.destaque, Produto.imagem_destaque_url)
+                .order_by(Produto.id)
+                .execution_options(yield_per=lote))
+
+            for p in produtos:
+                if parar is not None and parar.is_set():
+                    raise GeracaoInterrompida(caminho)
+                arquivos = por_imagem.pegar(p.id)
+                lista_categorias = por_categoria.pegar(p.id)
+                lista_relacionados = por_relacionado.pegar(p.id)
+                ids.append(p.id)
+                registros += _PRODUTO.pack(
+                    p.id, p.preco, bool(p.destaque),
+                    *textos.gravar(p.nome), *textos.gravar(p.descricao),
+                    *textos.gravar(p.imagem_destaque_url),
+                    len(imagens) // _TEXTO.size, len(arquivos),
+                    len(categorias_produto), len(lista_categorias),
+                    len(relacionados), len(lista_relacionados))
+                for arquivo in arquivos:
+                    imagens += _TEXTO.pack(*textos.gravar(arquivo))
+                categorias_produto.extend(lista_categorias)
+                relacionados.extend(lista_relacionados)
+                if p.destaque:
+                    destaques.append(p.id)
+
+            categorias = [
+                _CATEGORIA.pack(categoria_id, *textos.gravar(nome))
+                for categoria_id, nome in conexao.execute(
+                    sa.select(Categoria.id, Categoria.nome).order_by(Categoria.nome))
+            ]
+            banners = [
+                _BANNER.pack(banner_id, ORDEM_NULA if ordem is None else ordem,
+                             *textos.gravar(imagem_url), *textos.gravar(link_url))
+                for banner_id, imagem_url, link_url, ordem in conexao.execute(
+                    sa.select(Banner.id, Banner.imagem_url, Banner.link_url, Banner.ordem).order_by(Banner.ordem))
+            ]
+            configuracoes = [
+                _CONFIGURACAO.pack(*textos.gravar(chave), *textos.gravar(valor))
+                for chave, valor in conexao.execute(sa.select(SiteSettings.chave, SiteSettings.valor))
+            ]
+
+            posicoes = [(_CABECALHO.size, textos.tamanho)]
+            for dados, quantidade in (
+                    (ids, len(ids)), (registros, len(ids)), (imagens, len(imagens) // _TEXTO.size),
+                    (categorias_produto, len(categorias_produto)), (relacionados, len(relacionados)),
+                    (destaques, len(destaques)), (b''.join(categorias), len(categorias)),
+                    (b''.join(banners), len(banners)), (b''.join(configuracoes), len(configuracoes))):
+                posicoes.append((_alinhar(f), quantidade))
+                f.write(dados)
+            tamanho = f.tell()
+
+            f.seek(0)
+            f.write(_CABECALHO.pack(MAGICO, FORMATO, *versao, *(n for par in posicoes for n in par)))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, caminho)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return {'produtos': len(ids), 'bytes': tamanho, 'segundos': round(time.perf_counter() - inicio, 2)}
+
+
+def limpar_temporarios(pasta, idade=TEMPORARIO_MAX_IDADE):
+    """Apaga os temporários parados há mais de 'idade' segundos. Retorna quantos."""
+    limite = time.time() - idade
+    apagados = 0
+    try:
+        entradas = list(os.scandir(pasta))
+    except FileNotFoundError:
+        return 0
+    for entrada in entradas:
+        if not entrada.name.startswith(PREFIXO_TEMPORARIO):
+            continue
+        try:
+            if entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                apagados += 1
+        except FileNotFoundError: # Trocado ou apagado por outro worker agora há pouco
+            pass
+    return apagados
+
+
+# --- Leitura ---
+
+class Snapshot:
+    """Um arquivo de snapshot mapeado na memória. Os dados só são decodificados quando pedidos."""
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as f:
+            self.identidade = (os.fstat(f.fileno()).st_ino, os.fstat(f.fileno()).st_mtime_ns)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _CABECALHO.size:
+            raise FormatoInvalido(caminho)
+        magico, formato, inode, mtime_ns, tamanho, *posicoes = _CABECALHO.unpack_from(self._mm, 0)
+        if magico != MAGICO or formato != FORMATO:
+            raise FormatoInvalido(caminho)
+        self.versao = Versao(inode, mtime_ns, tamanho)
+        self.tamanho = len(self._mm)
+        self._secoes = dict(zip(SECOES, zip(posicoes[::2], posicoes[1::2])))
+
+        self._textos = self._secoes['textos'][0]
+        self._ids = self._uint32('ids')
+        self._categorias_produto = self._uint32('categorias_produto')
+        self._relacionados = self._uint32('relacionados')
+        self._destaques = self._uint32('destaques')
+
+        # Pequenos e lidos em toda página: decodificados uma vez
+        self.categorias = [(categoria_id, self._texto(*texto))
+                           for categoria_id, *texto in self._registros('categorias', _CATEGORIA)]
+        self.banners = [BannerSnapshot(banner_id, self._texto(p_imagem, t_imagem), self._texto(p_link, t_link),
+                                       None if ordem == ORDEM_NULA else ordem)
+                        for banner_id, ordem, p_imagem, t_imagem, p_link, t_link
+                        in self._registros('banners', _BANNER)]
+        self.configuracoes = {self._texto(p_chave, t_chave): self._texto(p_valor, t_valor)
+                              for p_chave, t_chave, p_valor, t_valor in self._registros('configuracoes', _CONFIGURACAO)}
+
+    def _uint32(self, secao):
+        inicio, quantidade = self._secoes[secao]
+        return memoryview(self._mm)[inicio:inicio + quantidade * 4].cast('I')
+
+    def _registros(self, secao, formato):
+        inicio, quantidade = self._secoes[secao]
+        return [formato.unpack_from(self._mm, inicio + i * formato.size) for i in range(quantidade)]
+
+    def _texto(self, posicao, tamanho):
+        if posicao == NULO:
+            return None
+        inicio = self._textos + posicao
+        return str(self._mm[inicio:inicio + tamanho], 'utf-8')
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _indice(self, produto_id):
+        i = bisect.bisect_left(self._ids, produto_id)
+        return i if i < len(self._ids) and self._ids[i] == produto_id else None
+
+    def _ler(self, i):
+        (produto_id, preco, destaque, p_nome, t_nome, p_desc, t_desc, p_img, t_img,
+         img_inicio, img_n, cat_inicio, cat_n, rel_inicio, rel_n) = _PRODUTO.unpack_from(
+            self._mm, self._secoes['produtos'][0] + i * _PRODUTO.size)
+        base_imagens = self._secoes['imagens'][0]
+        imagens = [ImagemSnapshot(self._texto(*_TEXTO.unpack_from(self._mm, base_imagens + j * _TEXTO.size)))
+                   for j in range(img_inicio, img_inicio + img_n)]
+        return ProdutoSnapshot(
+            produto_id, self._texto(p_nome, t_nome), self._texto(p_desc, t_desc), preco, bool(destaque),
+            self._texto(p_img, t_img), imagens,
+            self._categorias_produto[cat_inicio:cat_inicio + cat_n].tolist(),
+            self._relacionados[rel_inicio:rel_inicio + rel_n].tolist())
+
+    def produto(self, produto_id):
+        i = self._indice(produto_id)
+        return None if i is None else self._ler(i)
+
+    def produtos(self, ids):
+        """Como o carregar_produtos da app: {id: produto} dos que existem."""
+        encontrados = {}
+        for produto_id in ids:
+            produto = self.produto(produto_id)
+            if produto is not None:
+                encontrados[produto_id] = produto
+        return encontrados
+
+    def relacionados(self, ids, limite=None):
+        """Como related.relacionados: {id: [produtos]}, na ordem da semelhança."""
+        resultado = {}
+        for produto_id in ids:
+            produto = self.produto(produto_id)
+            vizinhos = produto.relacionado_ids[:limite] if produto else []
+            resultado[produto_id] = list(self.produtos(vizinhos).values())
+        return resultado
+
+    def destaques(self, limite):
+        """Os primeiros produtos em destaque (pelo id, como a consulta da página inicial)."""
+        return [self._ler(self._indice(produto_id)) for produto_id in self._destaques[:limite]]
+
+
+class SnapshotCatalogo:
+    """
+    O snapshot em uso neste worker. 'atual()' devolve o Snapshot se ele está
+    em dia com a versão do catálogo, ou None (e agenda a regeneração): quem
+    chama usa o banco nesse caso.
+    """
+
+    def __init__(self, app=None, versao=None, engine=None):
+        self.versao = versao
+        self.engine = engine # Função que devolve a engine usada na regeneração
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._parar = threading.Event()
+        self.leituras = 0
+        self.fallbacks = 0
+        self.regeneracoes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SNAPSHOT_ENABLED', True)
+        app.config.setdefault('SNAPSHOT_PATH', os.path.join(app.instance_path, 'catalogo.snapshot'))
+        app.config.setdefault('SNAPSHOT_DELAY', 1.0)
+        self.app = app
+        self.caminho = app.config['SNAPSHOT_PATH']
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        apagados = limpar_temporarios(os.path.dirname(self.caminho))
+        if apagados:
+            logger.warning("%d temporário(s) de snapshot abandonado(s) apagado(s)", apagados)
+        # A thread de regeneração é daemon: sem isso, o processo sairia no
+        # meio da geração e o temporário ficaria no disco
+        atexit.register(self.parar)
+
+    def _abrir(self):
+        """Mapeia o arquivo do disco se ele mudou desde a última vez (ou None se não existe/é inválido)."""
+        try:
+            st = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        atual = self._snapshot
+        if atual is not None and atual.identidade == (st.st_ino, st.st_mtime_ns):
+            return atual
+        try:
+            atual = Snapshot(self.caminho)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Snapshot do catálogo ilegível (%s): usando o banco", e)
+            return None
+        self._snapshot = atual # O mapeamento anterior é desfeito quando ninguém mais o usa
+        return atual
+
+    def atual(self):
+        if not self.app.config['SNAPSHOT_ENABLED']:
+            return None
+        versao = self.versao.atual()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.versao != versao:
+            snapshot = self._abrir()
+            if snapshot is None or snapshot.versao != versao:
+                self.fallbacks += 1
+                self.agendar()
+                return None
+        self.leituras += 1
+        return snapshot
+
+    # --- Regeneração ---
+
+    def agendar(self):
+        """Refaz o snapshot numa thread deste processo (se nenhuma já estiver nisso)."""
+        if not self.app.config['SNAPSHOT_ENABLED']:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._regenerar, name='snapshot-catalogo', daemon=True)
+            self._thread.start()
+
+    def _regenerar(self):
+        if self._parar.wait(self.app.config['SNAPSHOT_DELAY']): # Junta as alterações feitas em sequência
+            return
+        try:
+            with open(self.caminho + '.lock', 'a') as trava:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return # Outro worker já está refazendo
+                snapshot = self._abrir()
+                if snapshot is not None and snapshot.versao == self.versao.atual():
+                    return # Já refeito por outro worker
+                self.construir()
+        except GeracaoInterrompida:
+            pass
+        except Exception:
+            logger.exception("Erro ao refazer o snapshot do catálogo")
+
+    def construir(self):
+        """Gera o arquivo agora (também usado por 'flask build-snapshot')."""
+        versao = self.versao.atual() or self.versao.incrementar()
+        with self.app.app_context(), self.engine().connect() as conexao:
+            resumo = construir(conexao, self.caminho, versao, parar=self._parar)
+        self.regeneracoes += 1
+        logger.info("Snapshot do catálogo refeito: %s", resumo)
+        return resumo
+
+    def parar(self, timeout=30):
+        """Interrompe a regeneração em andamento e espera a thread sair (chamado no atexit)."""
+        self._parar.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def estatisticas(self):
+        snapshot = self._snapshot
+        return {
+            'nome': 'snapshot',
+            'leituras': self.leituras,
+            'fallbacks': self.fallbacks,
+            'regeneracoes': self.regeneracoes,
+            'produtos': len(snapshot) if snapshot is not None else None,
+            'bytes': snapshot.tamanho if snapshot is not None else None,
+        }
@@ -0,0 +1,142 @@
+# sql_profiler.py
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('modaafro.sql')
+
+
+class OrcamentoSQLExcedido(RuntimeError):
+    """No modo estrito: a rota passou do orçamento de queries ou tem N+1."""
+
+
+def fingerprint(statement):
+    """
+    "Impressão digital" de uma query: troca literais por '?' e junta listas
+    de IN (...), para que a mesma query com ids diferentes conte como uma só.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    return ' '.join(sql.split())
+
+
+class SQLProfiler:
+    """
+    Mede as queries de cada requisição via eventos do SQLAlchemy: quantidade,
+    tempo total no DB e queries repetidas (suspeita de N+1).
+
+    O resultado vai no header 'Server-Timing' e numa linha de log em JSON.
+    Com SQL_PROFILER_STRICT=True, a requisição falha (OrcamentoSQLExcedido)
+    se passar do orçamento da rota ou repetir a mesma query demais; é o modo
+    para rodar nos testes.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_PROFILER_ENABLED', True)
+        app.config.setdefault('SQL_PROFILER_LOG', True)
+        app.config.setdefault('SQL_PROFILER_STRICT', False)
+        app.config.setdefault('SQL_QUERY_BUDGET_DEFAULT', 20)
+        app.config.setdefault('SQL_QUERY_BUDGETS', {})
+        app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 3)
+        self.app = app
+
+        if app.config['SQL_PROFILER_LOG'] and not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s %(name)s: %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        event.listen(Engine, 'before_cursor_execute', self._antes_query)
+        event.listen(Engine, 'after_cursor_execute', self._depois_query)
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+
+    # --- Eventos do SQLAlchemy ---
+
+    def _antes_query(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'sql_stats' in g:
+            conn.info.setdefault('sql_inicio', []).append(time.perf_counter())
+
+    def _depois_query(self, conn, cursor, statement, parameters, context, executemany):
+        if not (has_request_context() and 'sql_stats' in g):
+            return
+        inicios = conn.info.get('sql_inicio')
+        if not inicios:
+            return
+        duracao = time.perf_counter() - inicios.pop()
+        stats = g.sql_stats
+        stats['queries'] += 1
+        stats['tempo'] += duracao
+        stats['fingerprints'][fingerprint(statement)] += 1
+
+    # --- Ciclo da requisição ---
+
+    def _iniciar(self):
+        if self.app.config['SQL_PROFILER_ENABLED']:
+            g.sql_stats = {'queries': 0, 'tempo': 0.0, 'fingerprints': Counter()}
+
+    def resumo(self):
+        """Estatísticas da requisição atual (ou None fora de uma requisição medida)."""
+        if not (has_request_context() and 'sql_stats' in g):
+            return None
+        stats = g.sql_stats
+        limite = self.app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        return {
+            'queries': stats['queries'],
+            'db_ms': round(stats['tempo'] * 1000, 2),
+            'repetidas': {fp: n for fp, n in stats['fingerprints'].most_common() if n >= limite}
+        }
+
+    def totais(self):
+        """(queries, segundos no DB) da requisição atual, sem montar o resumo (ex: métricas)."""
+        if not (has_request_context() and 'sql_stats' in g):
+            return None
+        return g.sql_stats['queries'], g.sql_stats['tempo']
+
+    def _orcamento(self):
+        return self.app.config['SQL_QUERY_BUDGETS'].get(
+            request.endpoint, self.app.config['SQL_QUERY_BUDGET_DEFAULT'])
+
+    def _finalizar(self, response):
+        resumo = self.resumo()
+        if resumo is None:
+            return response
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={resumo["db_ms"]};desc="{resumo["queries"]} queries"'
+        )
+
+        orcamento = self._orcamento()
+        problemas = []
+        if resumo['queries'] > orcamento:
+            problemas.append(f"{resumo['queries']} queries (orçamento: {orcamento})")
+        for fp, n in resumo['repetidas'].items():
+            problemas.append(f"possível N+1: {n}x {fp[:200]}")
+
+        if self.app.config['SQL_PROFILER_LOG']:
+            linha = {
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **resumo
+            }
+            nivel = logging.WARNING if problemas else logging.INFO
+            logger.log(nivel, json.dumps(linha, ensure_ascii=False))
+
+        if problemas and self.app.config['SQL_PROFILER_STRICT']:
+            raise OrcamentoSQLExcedido(f"{request.endpoint}: " + '; '.join(problemas))
+        return response
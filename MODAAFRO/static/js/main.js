@@ -118,14 +118,59 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- DADOS DOS PRODUTOS (cache local) ---
+    // A página pode trazer os detalhes dos produtos embutidos no HTML
+    // (<script id="produtos-detalhes">); o que faltar é buscado em lote
+    // em /produtos?ids=..., então o modal normalmente abre sem rede.
+
+    const productCache = new Map();
+
+    const embeddedProductsEl = document.getElementById('produtos-detalhes');
+    if (embeddedProductsEl) {
+        try {
+            Object.entries(JSON.parse(embeddedProductsEl.textContent)).forEach(([id, produto]) => {
+                productCache.set(String(id), produto);
+            });
+        } catch (error) {
+            console.error('Detalhes embutidos inválidos:', error);
+        }
+    }
+
+    async function prefetchProducts(ids) {
+        const missing = [...new Set(ids.map(String))].filter(id => !productCache.has(id));
+        // A API aceita até 100 produtos por chamada
+        for (let i = 0; i < missing.length; i += 100) {
+            try {
+                const response = await fetch(`/produtos?ids=${missing.slice(i, i + 100).join(',')}`);
+                if (!response.ok) continue;
+                const dados = await response.json();
+                dados.produtos.forEach(produto => productCache.set(String(produto.id), produto));
+            } catch (error) {
+                console.error('Erro ao pré-carregar produtos:', error);
+            }
+        }
+    }
+
+    async function getProductData(productId) {
+        const cached = productCache.get(String(productId));
+        if (cached) return cached;
+
+        const response = await fetch(`/produto/${productId}`);
+        if (!response.ok) throw new Error('Produto não encontrado');
+        const produto = await response.json();
+        productCache.set(String(productId), produto);
+        return produto;
+    }
+
+    function visibleProductIds(root) {
+        return [...(root || document).querySelectorAll('.product-card-link')].map(card => card.dataset.productId);
+    }
+
     async function showProductModal(productId) {
         if (!productModalBS) return; // Se o modal não existe, sai da função
 
         try {
-            const response = await fetch(`/produto/${productId}`);
-            if (!response.ok) throw new Error('Produto não encontrado');
-            
-            const produto = await response.json();
+            const produto = await getProductData(productId);
             
             // Popula o modal do produto (usando as classes que definimos no layout)
             const modal = productModalEl;
@@ -134,24 +179,53 @@ document.addEventListener('DOMContentLoaded', () => {
             modal.querySelector('.product-modal-description').textContent = produto.descricao;
             
             const destaqueImg = modal.querySelector('.product-modal-main-image img');
-            destaqueImg.src = produto.imagem_destaque;
+            setResponsiveImage(destaqueImg, produto.imagem_destaque, produto.imagem_destaque_srcset);
             destaqueImg.alt = produto.nome;
 
             const gallery = modal.querySelector('.product-modal-gallery');
             gallery.innerHTML = '';
             
+            // Variantes por URL original (miniatura leve + srcset da imagem grande)
+            const variantes = {};
+            (produto.imagens_variantes || []).forEach(v => { variantes[v.url] = v; });
+
             const allImages = [produto.imagem_destaque, ...produto.imagens.filter(img => img !== produto.imagem_destaque)];
             
             allImages.forEach((imgUrl, index) => {
                 if (imgUrl) { // Garante que a URL não é nula
+                    const variante = variantes[imgUrl] || {};
                     gallery.innerHTML += `
-                        <img src="${imgUrl}" alt="${produto.nome}" 
+                        <img src="${variante.thumb || imgUrl}" alt="${escapeHTML(produto.nome)}" 
+                             data-full="${imgUrl}" data-srcset="${preferredSrcset(variante.srcset)}"
                              style="width: 80px; height: 80px; object-fit: cover; cursor: pointer;" 
                              class="rounded border ${index === 0 ? 'border-primary border-2' : ''}">
                     `;
                 }
             });
 
+            // Produtos relacionados (calculados no servidor): clicar abre o modal deles
+            const relacionados = produto.relacionados || [];
+            const relatedEl = modal.querySelector('.product-modal-related');
+            relatedEl.querySelector('.product-modal-related-list').innerHTML = relacionados.map(relacionado => {
+                const srcset = preferredSrcset(relacionado.imagem_srcset);
+                return `
+                    <div class="col">
+                        <div class="card h-100 product-card-link" data-product-id="${relacionado.id}" style="cursor: pointer;">
+                            <img src="${relacionado.imagem_destaque || '/static/images/placeholder.png'}"
+                                 ${srcset ? `srcset="${srcset}" sizes="150px"` : ''} class="card-img-top"
+                                 alt="${escapeHTML(relacionado.nome)}" style="height: 120px; object-fit: cover;" loading="lazy">
+                            <div class="card-body p-2">
+                                <p class="card-title small mb-1">${escapeHTML(relacionado.nome)}</p>
+                                <p class="card-text fw-bold text-primary small mb-0">R$ ${relacionado.preco}</p>
+                            </div>
+                        </div>
+                    </div>
+                `;
+            }).join('');
+            relatedEl.hidden = relacionados.length === 0;
+            modal.querySelector('.modal-body').scrollTop = 0;
+            prefetchProducts(relacionados.map(relacionado => relacionado.id));
+
             const addToCartBtn = modal.querySelector('.add-to-cart-modal-btn');
             addToCartBtn.replaceWith(addToCartBtn.cloneNode(true)); // Limpa listeners antigos
             
@@ -168,16 +242,38 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- IMAGENS RESPONSIVAS ---
+    // O servidor manda um srcset por formato ({webp: "...", jpeg: "..."});
+    // num <img> simples usamos o WebP quando existir (suportado pelos navegadores atuais).
+
+    function preferredSrcset(srcsets) {
+        if (!srcsets) return '';
+        return srcsets.webp || srcsets.jpeg || '';
+    }
+
+    function setResponsiveImage(img, src, srcsets) {
+        img.src = src || '';
+        const srcset = preferredSrcset(srcsets);
+        if (srcset) {
+            img.srcset = srcset;
+            img.sizes = '(min-width: 768px) 400px, 100vw';
+        } else {
+            img.removeAttribute('srcset');
+        }
+    }
+
     function closeProductModal() {
         if (productModalBS) {
             productModalBS.hide(); // ESCONDE O MODAL (API do Bootstrap)
         }
     }
     
-    // --- CHECKOUT WHATSAPP (Sem mudanças) ---
+    // --- CHECKOUT WHATSAPP ---
+    // O servidor recalcula os preços (os do localStorage podem estar velhos),
+    // registra o pedido e devolve o link do WhatsApp já com o código.
 
-    function handleWhatsAppCheckout() {
-        if (cart.length === 0) return;
+    function localWhatsAppURL() {
+        // Fallback (servidor fora do ar): monta a mensagem com os preços do carrinho
         let mensagem = "Olá! Gostaria de fazer o seguinte pedido:\n\n";
         let totalGeral = 0;
         cart.forEach(item => {
@@ -189,9 +285,52 @@ document.addEventListener('DOMContentLoaded', () => {
             mensagem += "--------------------\n";
         });
         mensagem += `\n*TOTAL DO PEDIDO: R$ ${totalGeral.toFixed(2)}*`;
-        const encodedMessage = encodeURIComponent(mensagem);
-        const whatsappURL = `https://wa.me/${whatsappNumber}?text=${encodedMessage}`;
-        window.open(whatsappURL, '_blank');
+        return `https://wa.me/${whatsappNumber}?text=${encodeURIComponent(mensagem)}`;
+    }
+
+    async function handleWhatsAppCheckout() {
+        if (cart.length === 0) return;
+        // Abre a janela já no clique (depois do 'await' o navegador bloquearia o pop-up)
+        const janela = window.open('', '_blank');
+        whatsappCheckoutButton.disabled = true;
+        let whatsappURL = null;
+
+        try {
+            const response = await fetch('/checkout', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ itens: cart.map(item => ({ id: item.id, quantidade: item.quantity })) })
+            });
+            const data = await response.json();
+            if (response.ok || response.status === 409) {
+                // Atualiza o carrinho com os preços do servidor e tira o que não existe mais
+                const precos = new Map((data.itens || []).map(item => [item.produto_id, item.preco_unitario]));
+                cart = cart.filter(item => precos.has(item.id));
+                cart.forEach(item => { item.preco = precos.get(item.id); });
+                saveCart();
+                updateCartUI();
+            }
+            if (response.ok) {
+                whatsappURL = data.whatsapp_url;
+            } else if (response.status >= 500) {
+                whatsappURL = localWhatsAppURL();
+            } else {
+                alert(data.error || 'Não foi possível finalizar o pedido.');
+            }
+        } catch (error) {
+            console.error("Erro no checkout:", error);
+            whatsappURL = localWhatsAppURL();
+        } finally {
+            whatsappCheckoutButton.disabled = cart.length === 0;
+        }
+
+        if (whatsappURL && janela) {
+            janela.location = whatsappURL;
+        } else if (whatsappURL) {
+            window.location.href = whatsappURL;
+        } else if (janela) {
+            janela.close();
+        }
     }
 
     // --- EVENT LISTENERS (Delegação de Eventos) ---
@@ -244,10 +383,204 @@ document.addEventListener('DOMContentLoaded', () => {
             
             gallery.querySelectorAll('img').forEach(img => img.classList.remove('border-primary', 'border-2'));
             galleryImg.classList.add('border-primary', 'border-2');
-            mainImage.src = galleryImg.src;
+            mainImage.src = galleryImg.dataset.full || galleryImg.src;
+            if (galleryImg.dataset.srcset) {
+                mainImage.srcset = galleryImg.dataset.srcset;
+            } else {
+                mainImage.removeAttribute('srcset');
+            }
         }
     });
 
+    // --- SCROLL INFINITO DA LOJA ---
+    // A primeira página vem renderizada pelo servidor; as seguintes são
+    // buscadas em /loja/produtos usando o cursor da página anterior.
+
+    const productsGrid = document.getElementById('produtos-grid');
+    const paginationEl = document.getElementById('loja-paginacao');
+    let loadingPage = false;
+
+    function escapeHTML(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function renderProductCard(produto) {
+        const imagem = produto.imagem_destaque || '/static/images/placeholder.png';
+        const srcset = preferredSrcset(produto.imagem_srcset);
+        const srcsetAttr = srcset ? `srcset="${srcset}" sizes="(min-width: 768px) 300px, (min-width: 576px) 50vw, 100vw"` : '';
+        return `
+            <div class="col">
+                <div class="card h-100 shadow-sm product-card-link" data-product-id="${produto.id}" style="cursor: pointer;">
+                    <img src="${imagem}" ${srcsetAttr} class="card-img-top" alt="${escapeHTML(produto.nome)}"
+                         style="height: 300px; object-fit: cover;" loading="lazy">
+                    <div class="card-body">
+                        <h5 class="card-title fs-6">${escapeHTML(produto.nome)}</h5>
+                        <p class="card-text fw-bold text-primary fs-5">R$ ${produto.preco}</p>
+                    </div>
+                </div>
+            </div>
+        `;
+    }
+
+    async function loadNextPage() {
+        if (loadingPage || !paginationEl || !paginationEl.dataset.cursor) return;
+        loadingPage = true;
+
+        try {
+            const url = new URL(paginationEl.dataset.url, window.location.origin);
+            url.searchParams.set('cursor', paginationEl.dataset.cursor);
+            const response = await fetch(url);
+            if (!response.ok) throw new Error('Falha ao carregar produtos');
+
+            const pagina = await response.json();
+            productsGrid.insertAdjacentHTML('beforeend', pagina.produtos.map(renderProductCard).join(''));
+            prefetchProducts(pagina.produtos.map(produto => produto.id)); // Modal pronto para os novos cards
+
+            if (pagina.proximo_cursor) {
+                paginationEl.dataset.cursor = pagina.proximo_cursor;
+            } else {
+                paginationEl.remove(); // Última página
+            }
+        } catch (error) {
+            console.error('Erro ao carregar a próxima página:', error);
+        } finally {
+            loadingPage = false;
+        }
+    }
+
+    if (productsGrid && paginationEl) {
+        // Com JS, o link "Carregar mais" também anexa em vez de trocar de página
+        paginationEl.querySelector('#loja-carregar-mais').addEventListener('click', (e) => {
+            e.preventDefault();
+            loadNextPage();
+        });
+
+        if ('IntersectionObserver' in window) {
+            const observer = new IntersectionObserver((entries) => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadNextPage();
+                }
+            }, { rootMargin: '600px' });
+            observer.observe(paginationEl);
+        }
+    }
+
+    // --- SUGESTÕES DA BUSCA ---
+    // Depois de uma pausa curta na digitação, consulta /loja/sugestoes (índice
+    // em memória no servidor). Respostas ficam em cache por texto, e a
+    // consulta anterior é cancelada quando o texto muda.
+
+    const searchInput = document.querySelector('input[data-sugestoes-url]');
+    const suggestionsEl = document.getElementById('busca-sugestoes');
+    const SUGGESTIONS_DELAY = 150; // ms sem digitar antes de consultar
+
+    if (searchInput && suggestionsEl) {
+        const suggestionsCache = new Map();
+        const minChars = parseInt(searchInput.dataset.sugestoesMin, 10) || 2;
+        let suggestionsTimer = null;
+        let suggestionsController = null;
+        let activeSuggestion = -1;
+
+        function hideSuggestions() {
+            suggestionsEl.hidden = true;
+            suggestionsEl.innerHTML = '';
+            activeSuggestion = -1;
+        }
+
+        function renderSuggestions(dados) {
+            const itens = [
+                ...dados.categorias.map(categoria => `
+                    <a href="${categoria.url}" class="list-group-item list-group-item-action">
+                        <small class="text-muted">Categoria:</small> ${escapeHTML(categoria.nome)}
+                    </a>`),
+                ...dados.produtos.map(produto => `
+                    <a href="#" class="list-group-item list-group-item-action" data-product-id="${produto.id}">
+                        ${escapeHTML(produto.nome)}
+                    </a>`),
+            ];
+            suggestionsEl.innerHTML = itens.join('');
+            suggestionsEl.hidden = itens.length === 0;
+            activeSuggestion = -1;
+        }
+
+        async function fetchSuggestions(termo) {
+            if (suggestionsCache.has(termo)) {
+                renderSuggestions(suggestionsCache.get(termo));
+                return;
+            }
+            if (suggestionsController) suggestionsController.abort();
+            suggestionsController = new AbortController();
+            try {
+                const url = new URL(searchInput.dataset.sugestoesUrl, window.location.origin);
+                url.searchParams.set('q', termo);
+                const response = await fetch(url, { signal: suggestionsController.signal });
+                if (!response.ok) return;
+                const dados = await response.json();
+                suggestionsCache.set(termo, dados);
+                if (searchInput.value === termo) renderSuggestions(dados);
+            } catch (error) {
+                if (error.name !== 'AbortError') console.error('Erro ao buscar sugestões:', error);
+            }
+        }
+
+        searchInput.addEventListener('input', () => {
+            clearTimeout(suggestionsTimer);
+            const termo = searchInput.value;
+            if (termo.trim().length < minChars) {
+                hideSuggestions();
+                return;
+            }
+            suggestionsTimer = setTimeout(() => fetchSuggestions(termo), SUGGESTIONS_DELAY);
+        });
+
+        // Setas escolhem, Enter abre a sugestão escolhida (sem escolha, a busca normal)
+        searchInput.addEventListener('keydown', (e) => {
+            const itens = [...suggestionsEl.querySelectorAll('.list-group-item')];
+            if (suggestionsEl.hidden || !itens.length) return;
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault();
+                if (e.key === 'ArrowDown') {
+                    activeSuggestion = (activeSuggestion + 1) % itens.length;
+                } else {
+                    activeSuggestion = activeSuggestion <= 0 ? itens.length - 1 : activeSuggestion - 1;
+                }
+                itens.forEach((item, i) => item.classList.toggle('active', i === activeSuggestion));
+            } else if (e.key === 'Enter' && activeSuggestion >= 0) {
+                e.preventDefault();
+                itens[activeSuggestion].click();
+            } else if (e.key === 'Escape') {
+                hideSuggestions();
+            }
+        });
+
+        suggestionsEl.addEventListener('click', (e) => {
+            const produto = e.target.closest('[data-product-id]');
+            if (produto) {
+                e.preventDefault();
+                hideSuggestions();
+                showProductModal(produto.dataset.productId);
+            }
+        });
+
+        document.addEventListener('click', (e) => {
+            if (!e.target.closest('.busca-sugestoes-container')) hideSuggestions();
+        });
+    }
+
     // --- INICIALIZAÇÃO ---
     updateCartUI(); // Atualiza o carrinho ao carregar a página
+
+    // Link direto de um produto (/loja?produto=<id>, usado no sitemap e no feed): abre o modal
+    const produtoAberto = new URLSearchParams(window.location.search).get('produto');
+    if (produtoAberto && /^\d+$/.test(produtoAberto)) {
+        showProductModal(produtoAberto);
+    }
+
+    // Sem detalhes embutidos, pré-carrega os produtos da página quando o navegador estiver ocioso
+    if (!embeddedProductsEl && productModalEl) {
+        const idle = window.requestIdleCallback || ((fn) => setTimeout(fn, 200));
+        idle(() => prefetchProducts(visibleProductIds()));
+    }
 });
\ No newline at end of file
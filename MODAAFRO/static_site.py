@@ -0,0 +1,347 @@
+# static_site.py
+#
+# Exportação da vitrine para arquivos estáticos ('flask build-static'), que
+# o nginx serve direto, sem passar pelo Python:
+#
+#   index.html                   <- /
+#   sobre/index.html             <- /sobre
+#   loja/index.html              <- /loja (primeira página)
+#   loja/categoria/<id>/index.html <- /loja?categoria_id=<id>
+#   produto/<id>.json            <- /produto/<id> (modal)
+#   uploads/...                  <- /uploads/... (imagens e variantes)
+#   static/...                   <- /static/... (css, js)
+#
+# Busca, facetas combinadas, scroll infinito, checkout e admin continuam
+# indo para a aplicação (o nginx só usa o arquivo quando ele existe).
+#
+# Modo incremental: com STATIC_EXPORT_DIR configurado, todo commit que
+# altera produtos, imagens, categorias, banners ou configurações anota
+# as páginas afetadas na tabela 'pagina_estatica_pendente' (na mesma
+# transação); 'flask build-static --incremental' refaz só essas páginas.
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+import listing
+from models import (
+    db, Banner, Categoria, ImagemProduto, PaginaEstaticaPendente, Produto, SiteSettings,
+)
+
+TODAS = '*'           # Todas as páginas HTML (ex: o menu de categorias mudou)
+TODAS_CATEGORIAS = 'loja:*'
+
+
+def caminho_arquivo(pagina):
+    """Chave da página ('index', 'loja:3', 'produto:7'...) -> arquivo relativo ao destino."""
+    if pagina == 'index':
+        return 'index.html'
+    if pagina in ('sobre', 'loja'):
+        return os.path.join(pagina, 'index.html')
+    tipo, _, chave = pagina.partition(':')
+    if tipo == 'loja':
+        return os.path.join('loja', 'categoria', chave, 'index.html')
+    if tipo == 'produto':
+        return os.path.join('produto', f'{chave}.json')
+    raise ValueError(f"Página desconhecida: {pagina}")
+
+
+def url_pagina(pagina):
+    if pagina == 'index':
+        return '/'
+    if pagina in ('sobre', 'loja'):
+        return f'/{pagina}'
+    return f"/loja?categoria_id={pagina.partition(':')[2]}"
+
+
+def gravar_atomico(caminho, conteudo):
+    """Grava num temporário e troca de uma vez: o nginx nunca lê um arquivo pela metade."""
+    pasta = os.path.dirname(caminho)
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(conteudo)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, caminho)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def sincronizar_pasta(origem, destino, ignorar=()):
+    """
+    Espelha 'origem' em 'destino' (como um rsync): copia o que é novo ou
+    mudou (tamanho/mtime) e apaga o que não existe mais. Usa hard link
+    quando dá (os uploads nunca mudam de conteúdo). Retorna quantos copiou.
+    """
+    copiados = 0
+    vistos = set()
+    for raiz, pastas, arquivos in os.walk(origem):
+        pastas[:] = [p for p in pastas if os.path.join(raiz, p) not in ignorar]
+        relativa = os.path.relpath(raiz, origem)
+        for nome in arquivos:
+            if nome.startswith('.'):
+                continue
+            rel = os.path.normpath(os.path.join(relativa, nome))
+            vistos.add(rel)
+            de, para = os.path.join(origem, rel), os.path.join(destino, rel)
+            st = os.stat(de)
+            try:
+                st_para = os.stat(para)
+                if st_para.st_size == st.st_size and st_para.st_mtime_ns == st.st_mtime_ns:
+                    continue
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(para), exist_ok=True)
+            remover(para)
+            try:
+                os.link(de, para)
+            except OSError: # Outro sistema de arquivos: copia
+                shutil.copy2(de, para)
+            copiados += 1
+    if os.path.isdir(destino):
+        for raiz, _, arquivos in os.walk(destino):
+            for nome in arquivos:
+                rel = os.path.normpath(os.path.relpath(os.path.join(raiz, nome), destino))
+                if rel not in vistos:
+                    os.remove(os.path.join(destino, rel))
+    return copiados
+
+
+class SiteEstatico:
+    """Anota as páginas afetadas por cada commit e gera/atualiza o site estático."""
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('STATIC_EXPORT_DIR', None)
+        app.config.setdefault('STATIC_EXPORT_BATCH', 500)
+        self.app = app
+        if app.config['STATIC_EXPORT_DIR']:
+            # Só anota quando a exportação está em uso (senão a tabela só cresceria)
+            event.listen(db.session, 'after_flush', self._anotar)
+
+    # --- Páginas afetadas ---
+
+    def _anotar(self, sess, flush_context):
+        produtos = {} # id -> categorias afetadas (None = não se sabe: todas)
+        novos = set() # Criados neste flush: nenhum banner linca para eles ainda
+        paginas = set()
+        for obj in list(sess.new) + list(sess.dirty) + list(sess.deleted):
+            if isinstance(obj, Produto):
+                estado = sa.inspect(obj)
+                if obj in sess.deleted or 'categorias' in estado.unloaded:
+                    categorias = None
+                else:
+                    categorias = {c.id for c in estado.attrs.categorias.history.sum() if c.id is not None}
+                if produtos.get(obj.id, set()) is not None:
+                    produtos[obj.id] = categorias if categorias is None else produtos.get(obj.id, set()) | categorias
+                if any(estado.attrs.destaque.history.sum()):
+                    paginas.add('index')
+                if obj in sess.new:
+                    novos.add(obj.id)
+            elif isinstance(obj, ImagemProduto):
+                if obj.produto_id is not None:
+                    produtos[obj.produto_id] = None
+            elif isinstance(obj, Banner):
+                paginas.add('index')
+            elif isinstance(obj, (Categoria, SiteSettings)):
+                if obj in sess.dirty and not sess.is_modified(obj, include_collections=False):
+                    continue # Só a coleção 'produtos' (backref de um produto alterado)
+                paginas.add(TODAS) # Menu de categorias / rodapé / cores: todas as páginas
+
+        if produtos:
+            paginas.add('loja')
+            for produto_id, categorias in produtos.items():
+                paginas.add(f'produto:{produto_id}')
+                if categorias is None:
+                    paginas.add(TODAS_CATEGORIAS)
+                else:
+                    paginas.update(f'loja:{c}' for c in categorias)
+            existentes = [i for i in produtos if i not in novos]
+            if 'index' not in paginas and existentes and self._na_pagina_inicial(sess, existentes):
+                paginas.add('index')
+
+        if paginas:
+            # Pela conexão (SQL puro): dentro do flush a sessão não aceita novos objetos
+            sess.connection().execute(
+                PaginaEstaticaPendente.__table__.insert(),
+                [{'pagina': p} for p in sorted(paginas)]
+            )
+
+    @staticmethod
+    def _na_pagina_inicial(sess, produtos):
+        """Algum dos produtos aparece na página inicial (em destaque ou lincado num banner)?"""
+        produto, banner = Produto.__table__, Banner.__table__
+        ids = list(produtos)
+        em_destaque = sa.select(produto.c.id).where(produto.c.id.in_(ids), produto.c.destaque.is_(True))
+        lincado = sa.select(banner.c.id).where(banner.c.link_url.in_([f'#product-modal-trigger-{i}' for i in ids]))
+        return sess.connection().scalar(sa.select(sa.or_(em_destaque.exists(), lincado.exists())))
+
+    def registrar(self, paginas):
+        """Anota páginas a refazer fora de um flush (ex: variantes de imagem prontas). Faz commit."""
+        if not self.app.config['STATIC_EXPORT_DIR'] or not paginas:
+            return
+        db.session.execute(sa.insert(PaginaEstaticaPendente), [{'pagina': p} for p in sorted(set(paginas))])
+        db.session.commit()
+
+    def registrar_tarefa(self, referencia):
+        """
+        Tarefa de imagem concluída (jobs.py): as variantes mudam os srcsets
+        dos cards e do modal do produto, ou dos banners da página inicial.
+        """
+        if not self.app.config['STATIC_EXPORT_DIR'] or not referencia:
+            return
+        tipo, _, chave = referencia.partition(':')
+        if tipo == 'banner':
+            self.registrar(['index'])
+        elif tipo == 'produto' and chave.isdigit():
+            linha = db.session.execute(
+                sa.select(listing.listagem.c.categoria_ids, listing.listagem.c.destaque)
+                .where(listing.listagem.c.id == int(chave))
+            ).first()
+            paginas = [f'produto:{chave}']
+            if linha is not None:
+                paginas += ['loja'] + [f'loja:{c}' for c in listing.ler_categorias(linha.categoria_ids)]
+                if linha.destaque or self._na_pagina_inicial(db.session, [int(chave)]):
+                    paginas.append('index')
+            self.registrar(paginas)
+
+    # --- Geração ---
+
+    def construir(self, detalhe_produto, carregar_produtos, destino=None, incremental=False, log=print):
+        """
+        Gera o site em 'destino' (padrão: STATIC_EXPORT_DIR). Completo: todas
+        as páginas e todos os produtos. Incremental: só as páginas anotadas
+        desde a última vez (se o destino ainda não tem site, faz o completo).
+        'detalhe_produto'/'carregar_produtos' são os mesmos usados pela rota
+        /produto/<id>. Retorna um dict com o resumo.
+        """
+        destino = os.path.abspath(destino or self.app.config['STATIC_EXPORT_DIR'])
+        inicio = time.perf_counter()
+        resumo = {'paginas': 0, 'produtos': 0, 'removidos': 0, 'arquivos': 0}
+
+        ultima_anotacao = db.session.scalar(sa.select(sa.func.max(PaginaEstaticaPendente.id)))
+        if incremental and os.path.exists(os.path.join(destino, 'index.html')):
+            pendentes = set(db.session.scalars(
+                sa.select(PaginaEstaticaPendente.pagina).where(PaginaEstaticaPendente.id <= (ultima_anotacao or 0))
+            ))
+        else:
+            incremental = False
+            pendentes = {TODAS, TODAS_CATEGORIAS}
+        db.session.rollback()
+
+        categorias = list(db.session.scalars(sa.select(Categoria.id)))
+        html = {p for p in pendentes if not p.startswith('produto:') and p not in (TODAS, TODAS_CATEGORIAS)}
+        if TODAS in pendentes:
+            html |= {'index', 'sobre', 'loja'}
+        if TODAS in pendentes or TODAS_CATEGORIAS in pendentes:
+            html |= {f'loja:{c}' for c in categorias}
+            resumo['removidos'] += self._remover_categorias_antigas(destino, categorias)
+
+        cliente = self.app.test_client()
+        for pagina in sorted(html):
+            if pagina.startswith('loja:') and int(pagina.partition(':')[2]) not in categorias:
+                shutil.rmtree(os.path.dirname(os.path.join(destino, caminho_arquivo(pagina))), ignore_errors=True)
+                resumo['removidos'] += 1
+                continue
+            resposta = cliente.get(url_pagina(pagina))
+            if resposta.status_code != 200:
+                log(f"  {url_pagina(pagina)}: HTTP {resposta.status_code}, página não gerada")
+                continue
+            gravar_atomico(os.path.join(destino, caminho_arquivo(pagina)), resposta.get_data())
+            resumo['paginas'] += 1
+
+        if incremental:
+            ids = sorted(int(p.partition(':')[2]) for p in pendentes if p.startswith('produto:'))
+        else:
+            ids = None # Todos
+        gerados, removidos = self._gerar_produtos(destino, ids, detalhe_produto, carregar_produtos)
+        resumo['produtos'] += gerados
+        resumo['removidos'] += removidos
+
+        pasta_uploads = os.path.abspath(self.app.config['UPLOAD_FOLDER'])
+        resumo['arquivos'] += sincronizar_pasta(pasta_uploads, os.path.join(destino, 'uploads'))
+        pasta_assets = os.path.abspath(self.app.config['ASSETS_DIR']) # 'flask build-assets'
+        resumo['arquivos'] += sincronizar_pasta(pasta_assets, os.path.join(destino, 'assets'))
+        resumo['arquivos'] += sincronizar_pasta(self.app.static_folder, os.path.join(destino, 'static'),
+                                                ignorar={pasta_uploads, pasta_assets})
+
+        if ultima_anotacao is not None:
+            # Só apaga o que foi lido: anotações feitas durante a geração ficam para a próxima
+            db.session.execute(sa.delete(PaginaEstaticaPendente).where(PaginaEstaticaPendente.id <= ultima_anotacao))
+            db.session.commit()
+        resumo['segundos'] = round(time.perf_counter() - inicio, 2)
+        return resumo
+
+    def _gerar_produtos(self, destino, ids, detalhe_produto, carregar_produtos):
+        """JSON do modal de cada produto ('ids' None = todos, apagando os que sumiram)."""
+        pasta = os.path.join(destino, 'produto')
+        lote_max = self.app.config['STATIC_EXPORT_BATCH']
+        gerados, removidos = 0, 0
+        existentes = set()
+
+        def lotes():
+            if ids is not None:
+                for i in range(0, len(ids), lote_max):
+                    yield ids[i:i + lote_max]
+                return
+            ultimo_id = 0
+            while True:
+                lote = list(db.session.scalars(
+                    sa.select(Produto.id).where(Produto.id > ultimo_id).order_by(Produto.id).limit(lote_max)))
+                if not lote:
+                    return
+                ultimo_id = lote[-1]
+                yield lote
+
+        with self.app.test_request_context(): # 'url_for' das imagens
+            for lote in lotes():
+                produtos = carregar_produtos(lote)
+                for produto_id in lote:
+                    caminho = os.path.join(pasta, f'{produto_id}.json')
+                    if produto_id in produtos:
+                        conteudo = json.dumps(detalhe_produto(produtos[produto_id]), ensure_ascii=False)
+                        gravar_atomico(caminho, conteudo.encode('utf-8'))
+                        existentes.add(f'{produto_id}.json')
+                        gerados += 1
+                    elif os.path.exists(caminho): # Produto excluído
+                        remover(caminho)
+                        removidos += 1
+                db.session.expunge_all() # Libera a memória do lote
+
+        if ids is None and os.path.isdir(pasta):
+            for nome in os.listdir(pasta):
+                if nome.endswith('.json') and nome not in existentes:
+                    remover(os.path.join(pasta, nome))
+                    removidos += 1
+        return gerados, removidos
+
+    @staticmethod
+    def _remover_categorias_antigas(destino, categorias):
+        pasta = os.path.join(destino, 'loja', 'categoria')
+        if not os.path.isdir(pasta):
+            return 0
+        validas = {str(c) for c in categorias}
+        removidas = 0
+        for nome in os.listdir(pasta):
+            if nome not in validas:
+                shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+                removidas += 1
+        return removidas
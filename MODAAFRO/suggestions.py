@@ -0,0 +1,110 @@
+# suggestions.py
+#
+# Sugestões da caixa de busca enquanto se digita (/loja/sugestoes?q=cal):
+# nomes de produtos e de categorias que começam com o texto, sem ir ao banco.
+#
+# O índice fica em memória, em listas ordenadas percorridas com busca
+# binária ('bisect'): uma com o nome inteiro normalizado (sem acento, em
+# minúsculas) e outra com o nome a partir de cada uma das outras palavras,
+# para "jeans" achar "Calça Jeans Azul". Os nomes que começam com o texto
+# vêm primeiro. Como o índice das facetas, é refeito no primeiro pedido
+# depois que a versão do catálogo muda (qualquer alteração no admin).
+
+import re
+from array import array
+from bisect import bisect_left
+
+import sqlalchemy as sa
+
+import listing
+from models import db, Categoria
+from search import normalizar_texto
+
+# Só o começo dos nomes entra na chave (ninguém digita mais que isso)
+TAMANHO_CHAVE = 60
+
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar(texto):
+    """'  Calça-Jeans ' -> 'calca jeans ' (espaço final mantido: a palavra terminou)."""
+    return _SEPARADORES.sub(' ', normalizar_texto(texto)).lstrip()
+
+
+class _Prefixos:
+    """Chaves ordenadas + o id de cada uma (arrays paralelos)."""
+
+    __slots__ = ('chaves', 'ids')
+
+    def __init__(self, pares):
+        pares.sort()
+        self.chaves = [chave for chave, _ in pares]
+        self.ids = array('q', (i for _, i in pares))
+
+    def buscar(self, prefixo, limite, vistos):
+        """Até 'limite' ids novos (fora de 'vistos') com chave começando por 'prefixo'."""
+        encontrados = []
+        posicao = bisect_left(self.chaves, prefixo)
+        while len(encontrados) < limite and posicao < len(self.chaves):
+            if not self.chaves[posicao].startswith(prefixo):
+                break
+            item_id = self.ids[posicao]
+            if item_id not in vistos:
+                vistos.add(item_id)
+                encontrados.append(item_id)
+            posicao += 1
+        return encontrados
+
+
+def _chaves(itens):
+    """[(id, nome)] -> pares (chave, id) do nome inteiro e a partir de cada palavra seguinte."""
+    inicio, meio = [], []
+    for item_id, nome in itens:
+        chave = normalizar(nome).rstrip()[:TAMANHO_CHAVE]
+        if not chave:
+            continue
+        chave += ' ' # "calca " (palavra completa) também casa com o nome "Calça"
+        inicio.append((chave, item_id))
+        posicao = chave.find(' ')
+        while posicao != len(chave) - 1:
+            meio.append((chave[posicao + 1:], item_id))
+            posicao = chave.find(' ', posicao + 1)
+    return _Prefixos(inicio), _Prefixos(meio)
+
+
+class IndiceSugestoes:
+    """Prefixos dos nomes de produtos e categorias."""
+
+    __slots__ = ('produtos', 'categorias', 'nomes_produtos', 'nomes_categorias')
+
+    def __init__(self, produtos, categorias):
+        self.nomes_produtos = dict(produtos)
+        self.nomes_categorias = dict(categorias)
+        self.produtos = _chaves(produtos)
+        self.categorias = _chaves(categorias)
+
+    @classmethod
+    def construir(cls):
+        """Lê os nomes do read model da listagem e da tabela de categorias."""
+        colunas = listing.listagem.c
+        produtos = db.session.execute(sa.select(colunas.id, colunas.nome)).all()
+        categorias = db.session.execute(sa.select(Categoria.id, Categoria.nome)).all()
+        return cls(produtos, categorias)
+
+    @staticmethod
+    def _buscar(listas, prefixo, limite):
+        vistos = set()
+        encontrados = []
+        for prefixos in listas: # Nome começando pelo texto, depois uma palavra do meio
+            encontrados += prefixos.buscar(prefixo, limite - len(encontrados), vistos)
+        return encontrados
+
+    def sugerir(self, texto, limite_produtos=8, limite_categorias=3):
+        """(categorias, produtos) que começam com 'texto', como listas de (id, nome)."""
+        prefixo = normalizar(texto)[:TAMANHO_CHAVE]
+        if not prefixo.strip():
+            return [], []
+        categorias = self._buscar(self.categorias, prefixo, limite_categorias)
+        produtos = self._buscar(self.produtos, prefixo, limite_produtos)
+        return ([(i, self.nomes_categorias[i]) for i in categorias],
+                [(i, self.nomes_produtos[i]) for i in produtos])
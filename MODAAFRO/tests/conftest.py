@@ -0,0 +1,97 @@
+# conftest.py
+#
+# O app é configurado na importação (config.py lê o ambiente), então as
+# variáveis apontam para uma pasta temporária antes do 'import app': banco,
+# uploads, caches e snapshot ficam isolados da instância de desenvolvimento.
+# O SQLProfiler roda em modo estrito: uma rota que passar do orçamento de
+# queries (SQL_QUERY_BUDGETS) ou fizer N+1 falha o teste.
+
+import atexit
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PASTA = tempfile.mkdtemp(prefix='modaafro-testes-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(PASTA, 'teste.db'),
+    'UPLOAD_FOLDER': os.path.join(PASTA, 'uploads'),
+    'CACHE_DIR': os.path.join(PASTA, 'cache'),
+    'METRICS_DIR': os.path.join(PASTA, 'metrics'),
+    'CHECKOUT_DIARIO_DIR': os.path.join(PASTA, 'pedidos'),
+    'SNAPSHOT_PATH': os.path.join(PASTA, 'catalogo.snapshot'),
+    'JOBS_EMBEDDED': '0',
+    'SQL_PROFILER_STRICT': '1',
+    'SQL_PROFILER_LOG': '0',
+    'SQLITE_PROFILE': 'producao', # O de produção: WAL e conexões de leitura separadas
+})
+os.makedirs(os.environ['UPLOAD_FOLDER'], exist_ok=True)
+atexit.register(shutil.rmtree, PASTA, ignore_errors=True) # Depois do atexit das métricas (ordem inversa)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from models import Categoria, db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    runner = flask_app.test_cli_runner()
+    for comando in ('init-db', 'create-admin'):
+        resultado = runner.invoke(args=[comando])
+        assert resultado.exit_code == 0, resultado.output
+    with flask_app.app_context():
+        db.session.add_all([Categoria(nome='Calças'), Categoria(nome='Vestidos')])
+        db.session.commit()
+    return flask_app
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin(app):
+    cliente = app.test_client()
+    resposta = cliente.post('/admin/login', data={'username': 'admin', 'password': 'admin123'})
+    assert resposta.status_code == 302
+    return cliente
+
+
+@pytest.fixture
+def caches_frios(app, monkeypatch):
+    """Sem snapshot nem cache de páginas, e com os caches em memória invalidados a cada requisição."""
+    import app as modulo
+    monkeypatch.setitem(app.config, 'SNAPSHOT_ENABLED', False)
+    monkeypatch.setattr(modulo.page_cache, 'ativo', False)
+
+    def invalidar():
+        modulo.catalogo_versao.incrementar()
+        modulo.site_context_cache.invalidar()
+    return invalidar
+
+
+def imagem_jpeg(cor='red', tamanho=(800, 600)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', tamanho, cor).save(buffer, 'JPEG')
+    buffer.seek(0)
+    return buffer
+
+
+def criar_produto(admin, nome, imagens=1, categoria=1, destaque=False, cores=('red', 'green', 'blue', 'white')):
+    """Cadastra pelo admin um produto com 'imagens' fotos (uma cor cada); retorna o id."""
+    dados = {
+        'nome': nome, 'descricao': f'{nome} de algodão', 'preco': '99.90', 'categorias': str(categoria),
+        'novas_imagens': [(imagem_jpeg(cor), f'{cor}.jpg') for cor in cores[:imagens]],
+    }
+    if destaque:
+        dados['destaque'] = 'y'
+    resposta = admin.post('/admin/produto/novo', content_type='multipart/form-data', data=dados)
+    assert resposta.status_code == 302
+    return int(re.search(r'/(\d+)$', resposta.headers['Location']).group(1))
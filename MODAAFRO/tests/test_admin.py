@@ -0,0 +1,69 @@
+import re
+
+import pytest
+
+from conftest import criar_produto
+
+
+@pytest.mark.parametrize('termo', ['²', '١', '12', 'calça', '%'])
+def test_busca_de_produtos_no_admin(admin, termo):
+    assert admin.get('/admin/produtos', query_string={'q': termo}).status_code == 200
+    resposta = admin.get('/admin/produtos/sugestoes', query_string={'q': termo})
+    assert resposta.status_code == 200
+    assert resposta.get_json() == {'produtos': []}
+
+
+def test_arquivo_compartilhado_so_e_excluido_sem_referencias(app, admin):
+    from models import Tarefa, db
+
+    def exclusoes():
+        with app.app_context():
+            return db.session.scalars(db.select(Tarefa.argumentos).filter_by(tipo='excluir_imagem')).all()
+
+    # Mesma foto nos dois produtos: um arquivo só (ver uploads.py)
+    primeiro = criar_produto(admin, 'Bata', imagens=1, cores=('orange',))
+    segundo = criar_produto(admin, 'Bata estampada', imagens=1, cores=('orange',))
+    antes = len(exclusoes())
+    assert admin.post(f'/admin/produto/excluir/{primeiro}').status_code == 302
+    assert len(exclusoes()) == antes
+    assert admin.post(f'/admin/produto/excluir/{segundo}').status_code == 302
+    assert len(exclusoes()) == antes + 1
+
+
+def test_categoria_com_produtos_nao_e_excluida(app, admin):
+    from models import Categoria, db
+
+    with app.app_context():
+        categoria = Categoria(nome='Turbantes')
+        db.session.add(categoria)
+        db.session.commit()
+        categoria_id = categoria.id
+    criar_produto(admin, 'Turbante', categoria=categoria_id)
+    criar_produto(admin, 'Turbante estampado', categoria=categoria_id)
+    pagina = admin.get('/admin/categorias').get_data(as_text=True)
+    assert re.search(r'>Turbantes</td>\s*<td[^>]*>2</td>', pagina)
+
+    admin.get(f'/admin/categoria/excluir/{categoria_id}')
+    with app.app_context():
+        assert db.session.get(Categoria, categoria_id) is not None
+
+
+ID_ENORME = '99999999999999999999999'
+
+
+@pytest.mark.parametrize('params', [{'categoria_id': ID_ENORME}, {'categoria_id': '²'}, {'q': ID_ENORME},
+                                    {'categoria_id': 'abc', 'q': '12'}])
+def test_filtros_do_admin_com_id_invalido(admin, params):
+    assert admin.get('/admin/produtos', query_string=params).status_code == 200
+
+
+def test_sugestoes_do_admin_com_id_enorme(admin):
+    resposta = admin.get('/admin/produtos/sugestoes', query_string={'q': ID_ENORME})
+    assert resposta.status_code == 200 and resposta.get_json() == {'produtos': []}
+
+
+@pytest.mark.parametrize('url', ['/admin/produto/editar/{}', '/admin/produto/excluir/{}',
+                                 '/admin/categoria/editar/{}', '/admin/categoria/excluir/{}',
+                                 '/admin/banner/excluir/{}'])
+def test_rotas_do_admin_com_id_enorme(admin, url):
+    assert admin.get(url.format(ID_ENORME)).status_code == 404
@@ -0,0 +1,99 @@
+import gzip
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import assets
+
+
+def test_minificar_js_preserva_strings_regex_e_templates():
+    codigo = (
+        "// topo do arquivo\n"
+        "function   soma(a, b) {\n"
+        "    /* bloco */ return a / b; // divisão\n"
+        "}\n"
+        "const url = 'http://x.com/a // b';\n"
+        "const re = /[/*]+\\/\\d/g;\n"
+        "const t = `linha   ${soma(1, 2)}   /* não é comentário */`;\n"
+    )
+    minificado = assets.minificar_js(codigo)
+    assert 'topo' not in minificado and 'bloco' not in minificado and 'divisão' not in minificado
+    assert "'http://x.com/a // b'" in minificado
+    assert '/[/*]+\\/\\d/g' in minificado
+    assert '`linha   ${soma(1, 2)}   /* não é comentário */`' in minificado
+    assert 'return a / b;' in minificado
+
+
+def test_minificar_css():
+    codigo = '/* topo */\nbody {\n  color : red ;\n  font-family: "Open  Sans";\n}\na > b , c { margin: 0 }\n'
+    assert assets.minificar_css(codigo) == 'body{color:red;font-family:"Open  Sans"}a>b,c{margin:0}\n'
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node não instalado')
+def test_main_js_minificado_continua_valido(app, tmp_path):
+    with open(os.path.join(app.static_folder, 'js', 'main.js'), encoding='utf-8') as f:
+        (tmp_path / 'main.min.js').write_text(assets.minificar_js(f.read()), encoding='utf-8')
+    resultado = subprocess.run(['node', '--check', str(tmp_path / 'main.min.js')], capture_output=True, text=True)
+    assert resultado.returncode == 0, resultado.stderr
+
+
+@pytest.fixture
+def build(app, tmp_path, monkeypatch):
+    """Origem com um CSS e um JS, e o ASSETS_DIR do app apontando para o build."""
+    origem, destino = tmp_path / 'static', tmp_path / 'dist'
+    (origem / 'css').mkdir(parents=True)
+    (origem / 'js').mkdir()
+    (origem / 'css/style.css').write_text('body {\n  color: red;\n}\n' * 50, encoding='utf-8')
+    (origem / 'js/main.js').write_text('// app\nconsole.log("oi");\n' * 50, encoding='utf-8')
+    monkeypatch.setitem(app.config, 'ASSETS_DIR', str(destino))
+
+    def construir(**kwargs):
+        return assets.construir(str(origem), str(destino), ('css/style.css', 'js/main.js'), **kwargs)
+    return origem, destino, construir
+
+
+def test_build_com_hash_no_nome_e_pre_comprimido(build):
+    origem, destino, construir = build
+    manifesto, _ = construir()
+    assert manifesto == json.loads((destino / 'manifest.json').read_text())
+    final = manifesto['css/style.css']
+    assert final.startswith('css/style.') and final.endswith('.css') and final != 'css/style.css'
+    conteudo = (destino / final).read_bytes()
+    assert gzip.decompress((destino / (final + '.gz')).read_bytes()) == conteudo
+    assert construir()[0] == manifesto # Mesmo conteúdo, mesmo nome
+
+    (origem / 'css/style.css').write_text('body { color: blue; }\n', encoding='utf-8')
+    novo, _ = construir()
+    assert novo['css/style.css'] != final and (destino / final).exists() # O antigo fica (páginas em cache)
+    construir(limpar=True)
+    assert not (destino / final).exists() and not (destino / (final + '.gz')).exists()
+
+
+def test_asset_url_e_rota_com_accept_encoding(app, cliente, build):
+    _, destino, construir = build
+    with app.test_request_context():
+        assert _assets().url('css/style.css') == '/static/css/style.css' # Sem build: o /static normal
+    manifesto, _ = construir()
+    final = manifesto['css/style.css']
+    with app.test_request_context():
+        url = _assets().url('css/style.css')
+    assert url == f'/assets/{final}'
+
+    resposta = cliente.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert resposta.headers['Content-Encoding'] == 'gzip' and resposta.mimetype == 'text/css'
+    assert gzip.decompress(resposta.data) == (destino / final).read_bytes()
+    assert 'Accept-Encoding' in resposta.vary and resposta.cache_control.immutable
+
+    resposta = cliente.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in resposta.headers and resposta.data == (destino / final).read_bytes()
+
+    for caminho in ('manifest.json', f'{final}.gz', 'css/nao-existe.css'):
+        assert cliente.get(f'/assets/{caminho}').status_code == 404
+
+
+def _assets():
+    import app as modulo
+    return modulo.arquivos_estaticos
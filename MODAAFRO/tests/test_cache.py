@@ -0,0 +1,53 @@
+import threading
+import uuid
+
+from cache import CacheVersionado, VersaoCompartilhada
+
+
+def test_invalidar_num_worker_vale_para_os_outros(tmp_path):
+    # Dois workers: cada um com o seu cache em memória, a mesma versão em arquivo
+    caminho = str(tmp_path / 'site_context.version')
+    worker1 = CacheVersionado('site_context', VersaoCompartilhada(caminho))
+    worker2 = CacheVersionado('site_context', VersaoCompartilhada(caminho))
+    banco = {'categorias': ['Calças']}
+    carregar = lambda: list(banco['categorias'])
+
+    assert worker1.obter(carregar) == worker2.obter(carregar) == ['Calças']
+    assert worker2.obter(carregar) == ['Calças'] and worker2.hits == 1
+
+    banco['categorias'].append('Vestidos')
+    assert worker2.obter(carregar) == ['Calças'] # Ninguém avisou: continua em cache
+    worker1.invalidar() # A rota do admin que fez o commit roda no worker 1
+    assert worker2.obter(carregar) == ['Calças', 'Vestidos']
+    assert worker1.obter(carregar) == ['Calças', 'Vestidos']
+    assert (worker1.misses, worker2.misses) == (2, 2)
+
+
+def test_valor_carregado_durante_uma_invalidacao_nao_fica_em_cache(tmp_path):
+    cache = CacheVersionado('site_context', VersaoCompartilhada(str(tmp_path / 'v.version')))
+    carregando, liberar = threading.Event(), threading.Event()
+
+    def carregar_devagar():
+        carregando.set()
+        liberar.wait(5)
+        return 'antigo'
+
+    leitor = threading.Thread(target=cache.obter, args=(carregar_devagar,))
+    leitor.start()
+    carregando.wait(5)
+    cache.invalidar() # Commit no meio da leitura
+    liberar.set()
+    leitor.join(5)
+    assert cache.obter(lambda: 'novo') == 'novo'
+
+
+def test_categoria_nova_aparece_no_menu(admin, cliente, caches_frios):
+    import app as modulo
+    nome = f'Turbantes {uuid.uuid4().hex[:8]}'
+    assert nome not in cliente.get('/sobre').get_data(as_text=True)
+    misses = modulo.site_context_cache.misses
+    cliente.get('/sobre')
+    assert modulo.site_context_cache.misses == misses # Da segunda vez vem do cache
+
+    assert admin.post('/admin/categorias', data={'nome': nome}).status_code == 302
+    assert nome in cliente.get('/sobre').get_data(as_text=True)
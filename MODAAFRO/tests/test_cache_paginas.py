@@ -0,0 +1,98 @@
+import uuid
+
+import pytest
+from flask import Flask, request
+
+from cache import VersaoCompartilhada
+from conftest import criar_produto
+from page_cache import CachePaginas
+
+
+@pytest.fixture
+def pagina(tmp_path):
+    """App mínimo com uma página cacheada; 'renderizacoes' conta as chamadas da view."""
+    versao = VersaoCompartilhada(str(tmp_path / 'catalogo.version'))
+    cache = CachePaginas(versao, max_entradas=2, stale_max=30)
+    app = Flask(__name__)
+    app.secret_key = 'teste'
+    estado = {'texto': 'v1', 'renderizacoes': 0}
+
+    @app.route('/')
+    @cache(permitidos=('q',))
+    def index():
+        estado['renderizacoes'] += 1
+        return f"{estado['texto']} {request.args.get('q', '')}"
+
+    return app.test_client(), cache, versao, estado
+
+
+def test_segunda_requisicao_vem_do_cache(pagina):
+    cliente, _, _, estado = pagina
+    primeira = cliente.get('/')
+    assert primeira.headers['X-Page-Cache'] == 'MISS'
+    segunda = cliente.get('/')
+    assert (segunda.headers['X-Page-Cache'], segunda.data) == ('HIT', b'v1 ')
+    assert segunda.get_etag() == primeira.get_etag() and segunda.last_modified
+    assert 'stale-while-revalidate=30' in segunda.headers['Cache-Control']
+    assert estado['renderizacoes'] == 1
+
+    condicional = cliente.get('/', headers={'If-None-Match': primeira.headers['ETag']})
+    assert condicional.status_code == 304 and estado['renderizacoes'] == 1
+
+
+def test_chave_pelos_parametros_normalizados(pagina):
+    cliente, _, _, estado = pagina
+    cliente.get('/?q=bata  azul')
+    assert cliente.get('/?q=  bata azul').headers['X-Page-Cache'] == 'HIT'
+    assert cliente.get('/?q=kente').headers['X-Page-Cache'] == 'MISS'
+    # Parâmetro fora dos permitidos: não passa pelo cache
+    assert 'X-Page-Cache' not in cliente.get('/?utm_source=x').headers
+    assert estado['renderizacoes'] == 3
+
+
+def test_nova_versao_regenera_a_pagina(pagina):
+    cliente, _, versao, estado = pagina
+    cliente.get('/')
+    estado['texto'] = 'v2'
+    versao.incrementar() # Commit do admin, em qualquer worker
+    resposta = cliente.get('/')
+    assert (resposta.headers['X-Page-Cache'], resposta.data) == ('MISS', b'v2 ')
+    assert cliente.get('/').headers['X-Page-Cache'] == 'HIT'
+
+
+def test_versao_velha_servida_enquanto_outra_requisicao_regenera(pagina):
+    cliente, cache, versao, estado = pagina
+    cliente.get('/')
+    estado['texto'] = 'v2'
+    versao.incrementar()
+    entrada = next(iter(cache._entradas.values()))
+    assert entrada.regenerando.acquire(blocking=False) # Outra requisição está renderizando
+    try:
+        resposta = cliente.get('/')
+        assert (resposta.headers['X-Page-Cache'], resposta.data) == ('STALE', b'v1 ')
+
+        # Passado o 'stale_max', não serve mais a velha: renderiza mesmo assim
+        cache.stale_max = 0
+        resposta = cliente.get('/')
+        assert (resposta.headers['X-Page-Cache'], resposta.data) == ('MISS', b'v2 ')
+    finally:
+        entrada.regenerando.release()
+
+
+def test_paginas_menos_usadas_saem_primeiro(pagina):
+    cliente, cache, _, _ = pagina
+    for q in ('a', 'b', 'a', 'c'): # max_entradas=2
+        cliente.get(f'/?q={q}')
+    assert cliente.get('/?q=a').headers['X-Page-Cache'] == 'HIT'
+    assert cliente.get('/?q=b').headers['X-Page-Cache'] == 'MISS'
+
+
+def test_produto_novo_aparece_na_pagina_cacheada(app, admin, cliente):
+    import app as modulo
+    modulo.page_cache.limpar()
+    cliente.get('/')
+    assert cliente.get('/').headers['X-Page-Cache'] == 'HIT'
+    nome = f'Bata {uuid.uuid4().hex[:8]}'
+    criar_produto(admin, nome, destaque=True)
+    resposta = cliente.get('/')
+    assert resposta.headers['X-Page-Cache'] == 'MISS' and nome in resposta.get_data(as_text=True)
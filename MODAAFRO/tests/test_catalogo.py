@@ -0,0 +1,104 @@
+import csv
+import json
+import uuid
+
+import pytest
+
+import catalog_io
+
+
+def _importar(app, caminho, **kwargs):
+    with app.app_context():
+        return catalog_io.importar(str(caminho), workers=1, log=lambda *a: None, **kwargs)
+
+
+def _exportados(app, tmp_path, formato, prefixo):
+    destino = tmp_path / f'exportado.{formato}'
+    with app.app_context():
+        catalog_io.exportar(str(destino), formato=formato)
+    with open(destino, newline='', encoding='utf-8') as f:
+        linhas = csv.DictReader(f) if formato == 'csv' else map(json.loads, f)
+        return [linha for linha in linhas if linha['nome'].startswith(prefixo)]
+
+
+@pytest.mark.parametrize('preco', ['nan', 'inf', '-inf', 'NaN', '1e999', '0', '-3', 'abc', ''])
+def test_preco_invalido(preco):
+    with pytest.raises(catalog_io.LinhaInvalida):
+        catalog_io.normalizar_linha({'nome': 'Bata', 'preco': preco})
+
+
+def test_jsonl_malformado_conta_como_erro(app, tmp_path):
+    prefixo = uuid.uuid4().hex[:8]
+    arquivo = tmp_path / 'catalogo.jsonl'
+    arquivo.write_text('\n'.join([
+        json.dumps({'nome': f'{prefixo} Bata', 'preco': 10}),
+        '{"nome": "quebrada", "preco":',
+        json.dumps({'nome': f'{prefixo} Turbante', 'preco': 'inf'}),
+        '[1, 2]',
+        json.dumps({'nome': f'{prefixo} Kaftan', 'preco': '25,50', 'categorias': ['Vestidos']}),
+    ]) + '\n', encoding='utf-8')
+
+    resumo = _importar(app, arquivo)
+    assert (resumo['importados'], resumo['erros']) == (2, 3)
+    nomes = [linha['nome'] for linha in _exportados(app, tmp_path, 'jsonl', prefixo)]
+    assert nomes == [f'{prefixo} Bata', f'{prefixo} Kaftan']
+
+
+@pytest.mark.parametrize('formato', ['csv', 'jsonl'])
+def test_importacao_e_exportacao_ida_e_volta(app, tmp_path, formato):
+    prefixo = uuid.uuid4().hex[:8]
+    produtos = [
+        {'nome': f'{prefixo} Vestido Ankara', 'descricao': 'Estampa, "wax" e vírgulas', 'preco': 189.9,
+         'destaque': True, 'categorias': ['Vestidos', f'{prefixo} Nova']},
+        {'nome': f'{prefixo} Turbante', 'descricao': '', 'preco': 35.0, 'destaque': False, 'categorias': []},
+    ]
+    origem = tmp_path / f'origem.{formato}'
+    with open(origem, 'w', newline='', encoding='utf-8') as f:
+        if formato == 'csv':
+            escritor = csv.DictWriter(f, fieldnames=catalog_io.COLUNAS)
+            escritor.writeheader()
+            for p in produtos:
+                escritor.writerow(dict(p, destaque='1' if p['destaque'] else '0',
+                                       categorias='|'.join(p['categorias'])))
+        else:
+            f.writelines(json.dumps(p) + '\n' for p in produtos)
+
+    resumo = _importar(app, origem)
+    assert (resumo['importados'], resumo['erros'], resumo['categorias_criadas']) == (2, 0, 1)
+
+    exportados = _exportados(app, tmp_path, formato, prefixo)
+    relidos = [catalog_io.normalizar_linha(linha) for linha in exportados]
+    assert [{k: r[k] for k in ('nome', 'preco', 'destaque', 'categorias')} for r in relidos] == \
+           [{k: p[k] for k in ('nome', 'preco', 'destaque', 'categorias')} for p in produtos]
+    assert [r['descricao'] for r in relidos] == ['Estampa, "wax" e vírgulas', None]
+
+
+def test_importacao_interrompida_retoma_do_lote_seguinte(app, tmp_path, monkeypatch):
+    prefixo = uuid.uuid4().hex[:8]
+    arquivo = tmp_path / 'catalogo.jsonl'
+    arquivo.write_text(''.join(json.dumps({'nome': f'{prefixo} Peça {n}', 'preco': n + 1}) + '\n'
+                               for n in range(7)), encoding='utf-8')
+
+    # Cai no commit do terceiro lote: os dois primeiros (4 linhas) já estão salvos
+    atualizar = catalog_io.listing.atualizar_produtos
+    lotes = []
+    def atualizar_e_cair(produtos):
+        lotes.append(len(produtos))
+        if len(lotes) == 3:
+            raise RuntimeError('queda')
+        atualizar(produtos)
+    monkeypatch.setattr(catalog_io.listing, 'atualizar_produtos', atualizar_e_cair)
+    with pytest.raises(RuntimeError):
+        _importar(app, arquivo, tamanho_lote=2)
+    with app.app_context():
+        catalog_io.db.session.rollback()
+    monkeypatch.setattr(catalog_io.listing, 'atualizar_produtos', atualizar)
+
+    resumo = _importar(app, arquivo, tamanho_lote=2)
+    assert (resumo['pulados'], resumo['importados']) == (4, 3)
+    nomes = [linha['nome'] for linha in _exportados(app, tmp_path, 'jsonl', prefixo)]
+    assert nomes == [f'{prefixo} Peça {n}' for n in range(7)] # Cada linha uma vez só
+
+    # Terminado, o mesmo arquivo não é importado de novo (a menos que se peça)
+    assert _importar(app, arquivo)['importados'] == 0
+    assert _importar(app, arquivo, retomar=False)['importados'] == 7
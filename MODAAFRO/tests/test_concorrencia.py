@@ -0,0 +1,80 @@
+# Leituras da loja durante uma escrita em massa, no perfil 'producao' do
+# SQLite (ligado no conftest): com WAL e as conexões de leitura separadas,
+# as rotas públicas não esperam a escrita terminar, e outra escrita espera
+# a vez (busy_timeout / fila do pool) em vez de falhar com "database is locked".
+
+import threading
+import time
+
+import pytest
+
+from conftest import criar_produto
+
+SEGURANDO = 2.0 # Segundos com a transação de escrita aberta
+LIMITE_LEITURA = 0.5 # Nenhuma leitura pode ficar esperando a escrita
+
+ROTAS_LEITURA = ['/', '/loja', '/loja?q=bata', '/loja/produtos', '/sitemap.xml']
+
+
+@pytest.fixture
+def escrita_em_massa(app):
+    """
+    Insere 20.000 produtos numa transação que fica aberta SEGURANDO segundos
+    na conexão de escrita do worker (a única: o pool de escrita tem 1), com
+    o lock exclusivo do arquivo; no fim, desfaz tudo.
+    """
+    from models import db
+    assert app.config['SQLITE_PROFILE'] == 'producao'
+    pronta = threading.Event()
+
+    def escrever():
+        with app.app_context(), db.engine.connect() as conexao:
+            conexao.exec_driver_sql('BEGIN EXCLUSIVE')
+            conexao.exec_driver_sql(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 20000) "
+                "INSERT INTO produto (nome, descricao, preco, destaque) "
+                "SELECT 'Carga ' || i, 'Produto de carga', 10.0, 0 FROM n"
+            )
+            pronta.set()
+            time.sleep(SEGURANDO)
+            conexao.rollback()
+
+    thread = threading.Thread(target=escrever)
+    thread.start()
+    assert pronta.wait(10)
+    yield thread
+    thread.join()
+
+
+def test_leituras_nao_esperam_a_escrita(admin, cliente, caches_frios, escrita_em_massa):
+    tempos = {}
+    for url in ROTAS_LEITURA:
+        caches_frios()
+        inicio = time.perf_counter()
+        with cliente.get(url) as resposta:
+            assert resposta.status_code == 200, url
+        tempos[url] = time.perf_counter() - inicio
+    assert escrita_em_massa.is_alive() # Todas as leituras aconteceram com a escrita aberta
+    assert max(tempos.values()) < LIMITE_LEITURA, tempos
+
+
+def test_outra_escrita_espera_a_vez(admin, escrita_em_massa):
+    inicio = time.perf_counter()
+    resposta = admin.post('/admin/categorias', data={'nome': 'Acessórios'})
+    assert resposta.status_code == 302
+    assert time.perf_counter() - inicio < SEGURANDO + 5
+
+
+@pytest.fixture(autouse=True)
+def catalogo(admin):
+    criar_produto(admin, 'Bata bordada')
+
+
+def test_checkout_usa_a_conexao_de_escrita(cliente):
+    # Recalcula o carrinho e registra o pedido: não é uma rota só de leitura
+    import db_engine
+    with cliente:
+        cliente.get('/loja')
+        assert db_engine.somente_leitura()
+        cliente.post('/checkout', json={'itens': []})
+        assert not db_engine.somente_leitura()
@@ -0,0 +1,24 @@
+import gzip
+
+import pytest
+
+
+@pytest.mark.parametrize('url, content_type', [
+    ('/sitemap.xml', 'application/xml; charset=utf-8'),
+    ('/feed/produtos.csv', 'text/csv; charset=utf-8'),
+    ('/feed/produtos.xml', 'application/xml; charset=utf-8'),
+])
+def test_content_type_com_um_charset_so(cliente, url, content_type):
+    for encoding in ('identity', 'gzip'):
+        with cliente.get(url, headers={'Accept-Encoding': encoding}) as resposta:
+            assert resposta.status_code == 200
+            assert resposta.headers['Content-Type'] == content_type
+
+
+def test_feed_gzip_e_304(cliente):
+    resposta = cliente.get('/feed/produtos.csv', headers={'Accept-Encoding': 'gzip'})
+    assert resposta.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resposta.data).startswith(b'id,nome,preco')
+    resposta = cliente.get('/feed/produtos.csv', headers={'Accept-Encoding': 'gzip',
+                                                          'If-None-Match': resposta.headers['ETag']})
+    assert resposta.status_code == 304
@@ -0,0 +1,68 @@
+import pytest
+
+# '²' e '١' (dígito arábico) passam no str.isdigit() mas o int() recusa o primeiro
+VALORES_INVALIDOS = ['abc', '', ' ', '-1', '1.5', '²', '١', '1²', '%', '99999']
+
+
+@pytest.mark.parametrize('valor', VALORES_INVALIDOS)
+@pytest.mark.parametrize('url', ['/loja', '/loja/produtos'])
+def test_categoria_id_invalido_e_ignorado(cliente, url, valor):
+    resposta = cliente.get(url, query_string={'categoria_id': valor})
+    assert resposta.status_code == 200
+
+
+def test_categoria_id_invalido_junto_de_valido(cliente):
+    resposta = cliente.get('/loja/produtos', query_string=[('categoria_id', '²'), ('categoria_id', '1')])
+    assert resposta.status_code == 200
+
+
+
+def test_banner_com_link_de_produto_invalido(app, cliente):
+    from models import Banner, db
+    with app.app_context():
+        banner = Banner(imagem_url='banner.jpg', link_url='#product-modal-trigger-²', ordem=1)
+        db.session.add(banner)
+        db.session.commit()
+        banner_id = banner.id
+    try:
+        assert cliente.get('/').status_code == 200
+    finally:
+        with app.app_context():
+            db.session.delete(db.session.get(Banner, banner_id))
+            db.session.commit()
+
+
+ID_ENORME = '99999999999999999999999' # Acima do maior inteiro do SQLite
+
+
+@pytest.mark.parametrize('ids', [ID_ENORME, '²', '1,abc', '-1', '1.5', ','.join(['1'] * 101)])
+def test_api_de_produtos_recusa_ids_invalidos(cliente, caches_frios, ids):
+    caches_frios()
+    assert cliente.get('/produtos', query_string={'ids': ids}).status_code == 400
+
+
+def test_api_de_produtos_com_id_no_limite(cliente, caches_frios):
+    caches_frios()
+    resposta = cliente.get('/produtos', query_string={'ids': str(2**63 - 1)})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['nao_encontrados'] == [2**63 - 1]
+
+
+@pytest.mark.parametrize('produto_id', [ID_ENORME, str(2**63)])
+def test_produto_com_id_enorme_nao_existe(cliente, caches_frios, produto_id):
+    caches_frios()
+    assert cliente.get(f'/produto/{produto_id}').status_code == 404
+
+
+@pytest.mark.parametrize('valor', [ID_ENORME, '²', 'abc', '-1', ''])
+def test_loja_com_produto_invalido_abre_sem_modal(cliente, caches_frios, valor):
+    caches_frios()
+    assert cliente.get('/loja', query_string={'produto': valor}).status_code == 200
+
+
+def test_produto_invalido_usa_a_mesma_chave_de_cache():
+    from page_cache import CachePaginas
+    from werkzeug.datastructures import MultiDict
+    permitidos = ('q', 'produto')
+    assert CachePaginas.normalizar(MultiDict({'produto': 'abc'}), permitidos) == \
+        CachePaginas.normalizar(MultiDict(), permitidos)
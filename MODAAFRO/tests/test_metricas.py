@@ -0,0 +1,17 @@
+def test_metrics_no_formato_do_prometheus(cliente):
+    cliente.get('/sobre')
+    resposta = cliente.get('/metrics')
+    assert resposta.status_code == 200
+    assert resposta.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    assert '# TYPE ' in resposta.get_data(as_text=True)
+
+
+def test_contadores_grandes_sem_notacao_cientifica(app, cliente, monkeypatch):
+    import app as modulo
+    estado = {'contadores': {'modaafro_uploads_served_bytes_total': {'': 1234567},
+                             'modaafro_db_queries_total': {'endpoint="loja"': 2.5}},
+              'histogramas': {}}
+    monkeypatch.setattr(modulo.metricas, 'coletar', lambda: estado)
+    texto = cliente.get('/metrics').get_data(as_text=True)
+    assert '\nmodaafro_uploads_served_bytes_total 1234567\n' in texto
+    assert '\nmodaafro_db_queries_total{endpoint="loja"} 2.5\n' in texto
@@ -0,0 +1,83 @@
+# As rotas rodam com o SQLProfiler em modo estrito (ver conftest.py): passar
+# do orçamento de queries (SQL_QUERY_BUDGETS) ou repetir a mesma query
+# (N+1) levanta OrcamentoSQLExcedido e o teste falha.
+
+import pytest
+from sqlalchemy import event
+
+from conftest import criar_produto, imagem_jpeg
+
+ROTAS_PUBLICAS = ['/', '/sobre', '/loja', '/loja?categoria_id=1&categoria_id=2', '/loja?q=vestido',
+                  '/loja/produtos', '/loja/sugestoes?q=ves', '/sitemap.xml', '/feed/produtos.csv']
+
+
+@pytest.fixture
+def produtos(app, admin):
+    """Três produtos em destaque e um banner lincado a um quarto (o caso mais caro do index)."""
+    from models import Banner, db
+    ids = [criar_produto(admin, f'Vestido {n}', imagens=2, categoria=n % 2 + 1, destaque=n < 3) for n in range(4)]
+    with app.app_context():
+        db.session.add(Banner(imagem_url='banner.jpg', link_url=f'#product-modal-trigger-{ids[3]}', ordem=1))
+        db.session.commit()
+    yield ids
+    with app.app_context():
+        db.session.execute(db.delete(Banner))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('logado', [False, True])
+@pytest.mark.parametrize('url', ROTAS_PUBLICAS)
+def test_rotas_publicas_lendo_do_banco(cliente, admin, produtos, caches_frios, url, logado):
+    caches_frios()
+    assert (admin if logado else cliente).get(url).status_code == 200
+
+
+def test_tabela_fts_e_procurada_uma_vez_so(app, cliente, caches_frios):
+    import search
+    from models import db
+    consultas = []
+
+    def anotar(conn, cursor, statement, *args):
+        if 'sqlite_master' in statement:
+            consultas.append(statement)
+
+    search._fts_encontrada.clear()
+    with app.app_context():
+        motores = [db.engine, db.engines['leitura']] if 'leitura' in db.engines else [db.engine]
+    for motor in motores:
+        event.listen(motor, 'before_cursor_execute', anotar)
+    try:
+        for termo in ('vestido', 'saia', 'bata'):
+            caches_frios()
+            assert cliente.get('/loja', query_string={'q': termo}).status_code == 200
+    finally:
+        for motor in motores:
+            event.remove(motor, 'before_cursor_execute', anotar)
+    assert len(consultas) == 1
+
+
+def test_api_de_produtos_lendo_do_banco(cliente, produtos, caches_frios):
+    caches_frios()
+    assert cliente.get(f'/produto/{produtos[0]}').status_code == 200
+    ids = ','.join(map(str, produtos))
+    assert cliente.get(f'/produtos?ids={ids}').status_code == 200
+    resposta = cliente.post('/checkout', json={'itens': [{'id': i, 'quantidade': 1} for i in produtos]})
+    assert resposta.status_code == 202
+
+
+def test_cadastro_edicao_e_exclusao_de_produto(admin):
+    from models import ImagemProduto, db
+    produto_id = criar_produto(admin, 'Saia longa', imagens=4)
+    assert admin.get(f'/admin/produto/editar/{produto_id}').status_code == 200
+
+    with admin.application.app_context():
+        imagens = db.session.scalars(db.select(ImagemProduto.id).filter_by(produto_id=produto_id)).all()
+    resposta = admin.post(f'/admin/produto/editar/{produto_id}', content_type='multipart/form-data', data={
+        'nome': 'Saia longa', 'descricao': 'Saia longa de linho', 'preco': '120.00', 'categorias': '2',
+        'excluir_imagem': [str(i) for i in imagens[:3]],
+        'novas_imagens': [(imagem_jpeg(cor), f'{cor}.jpg') for cor in ['black', 'yellow', 'purple']],
+    })
+    assert resposta.status_code == 302
+
+    assert admin.get('/admin/produtos').status_code == 200
+    assert admin.post(f'/admin/produto/excluir/{produto_id}').status_code == 302
@@ -0,0 +1,76 @@
+import base64
+
+import pytest
+
+from pagination import codificar_cursor
+
+
+@pytest.fixture(scope='module')
+def catalogo(app):
+    """Onze produtos com nomes repetidos (o id desempata) direto no banco, mais o read model."""
+    import listing
+    from models import Produto, db
+    with app.app_context():
+        produtos = [Produto(nome=f'Paginado {n // 2}', descricao='Peça paginada', preco=10.0 + n)
+                    for n in range(11)]
+        db.session.add_all(produtos)
+        db.session.flush()
+        listing.atualizar_produtos(produtos)
+        import search
+        search.indexar_produtos(produtos)
+        db.session.commit()
+        return [p.id for p in produtos]
+
+
+def _percorrer(cliente, **params):
+    ids, cursor, paginas = [], None, 0
+    while True:
+        resposta = cliente.get('/loja/produtos', query_string=dict(params, limite=3, cursor=cursor or ''))
+        assert resposta.status_code == 200
+        dados = resposta.get_json()
+        ids += [p['id'] for p in dados['produtos']]
+        paginas += 1
+        cursor = dados['proximo_cursor']
+        if cursor is None:
+            return ids, paginas
+
+
+def test_todas_as_paginas_sem_busca(app, cliente, catalogo):
+    import listing
+    from models import db
+    with app.app_context():
+        esperado = db.session.execute(
+            db.select(listing.listagem.c.id).order_by(listing.listagem.c.nome, listing.listagem.c.id)
+        ).scalars().all()
+    ids, paginas = _percorrer(cliente)
+    assert ids == esperado # Todos, uma vez cada, na ordem (nome, id)
+    assert paginas == -(-len(esperado) // 3)
+
+
+def test_todas_as_paginas_com_busca(cliente, catalogo):
+    ids, _ = _percorrer(cliente, q='paginada')
+    assert sorted(ids) == sorted(catalogo) and len(set(ids)) == len(ids)
+
+
+def _token(json_texto):
+    return base64.urlsafe_b64encode(json_texto.encode()).decode().rstrip('=')
+
+
+CURSORES_INVALIDOS = [
+    'nao-e-base64!', _token('{"a": 1}'), _token('[1]'), _token('["a", 1, 2]'),
+    codificar_cursor([{'a': 1}, 1]), codificar_cursor([[1], 1]), codificar_cursor([None, 1]),
+    codificar_cursor([True, 1]), codificar_cursor([1, 1]), codificar_cursor(['a', 'b']),
+    codificar_cursor(['a', 1.5]), codificar_cursor(['a', 2**63]), _token('["a", NaN]'),
+]
+
+
+@pytest.mark.parametrize('cursor', CURSORES_INVALIDOS)
+def test_cursor_invalido(cliente, catalogo, cursor):
+    assert cliente.get('/loja/produtos', query_string={'cursor': cursor}).status_code == 400
+    assert cliente.get('/loja', query_string={'cursor': cursor}).status_code == 302
+
+
+@pytest.mark.parametrize('cursor', [codificar_cursor([[1], 'a', 1]), codificar_cursor([{'a': 1}, 'a', 1])])
+def test_cursor_invalido_com_busca(cliente, catalogo, cursor):
+    resposta = cliente.get('/loja/produtos', query_string={'q': 'paginada', 'cursor': cursor})
+    assert resposta.status_code == 400
@@ -0,0 +1,96 @@
+import json
+import os
+import uuid
+
+import pytest
+
+from order_queue import FilaPedidos
+
+
+@pytest.mark.parametrize('corpo', [
+    [], [1, 2], 'itens', 7, None,
+    {'itens': [{'id': True}]},
+    {'itens': [{'id': 1.5}]},
+    {'itens': [{'id': '²'}]},
+    {'itens': [{'id': 0}]},
+    {'itens': [{'id': 2**63}]},
+    {'itens': [{'id': 10**30}]},
+    {'itens': [{'id': '99999999999999999999999'}]},
+    {'itens': [{'id': 1, 'quantidade': True}]},
+    {'itens': [{'id': 1, 'quantidade': 0}]},
+    {'itens': [7]},
+])
+def test_checkout_recusa_corpo_invalido(cliente, corpo):
+    resposta = cliente.post('/checkout', data=json.dumps(corpo), content_type='application/json')
+    assert resposta.status_code == 400
+
+
+def test_checkout_aceita_id_grande_inexistente(cliente):
+    resposta = cliente.post('/checkout', json={'itens': [{'id': 2**63 - 1}]})
+    assert resposta.status_code == 409
+
+
+def _pedido(total=10.0):
+    return {'codigo': uuid.uuid4().hex, 'criado_em': '2025-01-01T12:00:00', 'total': total,
+            'itens': [{'produto_id': 1, 'nome': 'Bata', 'preco_unitario': 10.0, 'quantidade': 1}]}
+
+
+def _gravados(app, codigos):
+    from models import Pedido, db
+    with app.app_context():
+        return set(db.session.scalars(db.select(Pedido.codigo).where(Pedido.codigo.in_(codigos))))
+
+
+@pytest.fixture
+def fila(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHECKOUT_DIARIO_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'CHECKOUT_INTERVALO', 0.3) # Junta os pedidos do teste num lote
+    monkeypatch.setitem(app.config, 'CHECKOUT_TENTATIVAS', 2)
+    fila = FilaPedidos(app)
+    yield fila
+    fila.parar()
+
+
+def test_pedidos_sao_gravados_em_lote_e_o_diario_zerado(app, fila, tmp_path):
+    pedidos = [_pedido() for _ in range(5)]
+    for pedido in pedidos:
+        fila.enfileirar(pedido)
+    assert fila.drenar(10)
+    assert _gravados(app, [p['codigo'] for p in pedidos]) == {p['codigo'] for p in pedidos}
+    assert (fila.gravados, fila.lotes) == (5, 1)
+    assert os.path.getsize(tmp_path / f'pedidos-{os.getpid()}.jsonl') == 0
+
+
+def test_pedido_recusado_nao_trava_os_seguintes(app, fila, tmp_path):
+    bons = [_pedido(), _pedido()]
+    ruim = _pedido(total=None) # NOT NULL: o banco recusa sempre
+    for pedido in (bons[0], ruim, bons[1]):
+        fila.enfileirar(pedido)
+    assert fila.drenar(30)
+    assert _gravados(app, [p['codigo'] for p in bons + [ruim]]) == {p['codigo'] for p in bons}
+    assert fila.rejeitados == 1
+    with open(tmp_path / f'rejeitados-{os.getpid()}.jsonl', encoding='utf-8') as f:
+        assert [json.loads(linha)['codigo'] for linha in f] == [ruim['codigo']]
+    assert os.path.getsize(tmp_path / f'pedidos-{os.getpid()}.jsonl') == 0
+
+    # Os seguintes nem esperam pelas tentativas
+    depois = _pedido()
+    fila.enfileirar(depois)
+    assert fila.drenar(10)
+    assert _gravados(app, [depois['codigo']]) == {depois['codigo']}
+
+
+def test_diario_de_processo_encerrado_e_regravado_uma_vez(app, fila, tmp_path):
+    pedidos = [_pedido(), _pedido()]
+    diario = tmp_path / 'pedidos-999999.jsonl'
+    conteudo = ''.join(json.dumps(p) + '\n' for p in pedidos) + '{"codigo": "pela-met' # Queda no meio da linha
+    diario.write_text(conteudo, encoding='utf-8')
+    with app.app_context():
+        assert fila.recuperar() == 2
+    assert not diario.exists()
+    assert _gravados(app, [p['codigo'] for p in pedidos]) == {p['codigo'] for p in pedidos}
+
+    # O mesmo diário de novo (ex: dois processos recuperando): nada é duplicado
+    diario.write_text(conteudo, encoding='utf-8')
+    with app.app_context():
+        assert fila.recuperar() == 0
@@ -0,0 +1,69 @@
+import marshal
+import pstats
+
+import pytest
+
+
+def test_visitante_nao_recebe_perfil(cliente, caches_frios):
+    for resposta in (cliente.get('/sobre?_perfil=texto'), cliente.get('/sobre', headers={'X-Perfil': 'prof'})):
+        assert resposta.status_code == 200 and resposta.mimetype == 'text/html'
+        assert 'X-Perfil-Status' not in resposta.headers and 'Content-Disposition' not in resposta.headers
+
+
+def test_perfil_em_texto(admin, caches_frios):
+    resposta = admin.get('/loja?_perfil=texto')
+    assert resposta.mimetype == 'text/plain' and resposta.headers['X-Perfil-Status'] == '200'
+    texto = resposta.get_data(as_text=True)
+    assert texto.startswith('GET /loja?_perfil=texto (loja, status 200)')
+    assert 'queries)' in texto and 'cumulative' in texto.lower()
+    assert 'tpl;dur=' in resposta.headers['Server-Timing'] and resposta.cache_control.no_store
+
+
+def test_perfil_pstats_para_download(admin, caches_frios, tmp_path):
+    resposta = admin.get('/sobre', headers={'X-Perfil': 'prof'})
+    assert resposta.headers['Content-Disposition'].startswith('attachment; filename="perfil-sobre-')
+    arquivo = tmp_path / 'sobre.prof'
+    arquivo.write_bytes(resposta.data)
+    stats = pstats.Stats(str(arquivo))
+    assert any(funcao == 'sobre' for _, _, funcao in stats.stats)
+
+
+def test_perfil_por_amostras(admin, caches_frios, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROFILER_SAMPLE_INTERVAL', 0.0005)
+    resposta = admin.get('/loja?_perfil=amostras')
+    assert resposta.headers['Content-Disposition'].endswith('.folded"')
+    for linha in resposta.get_data(as_text=True).splitlines():
+        pilha, _, contagem = linha.rpartition(' ')
+        assert pilha and int(contagem) > 0
+
+
+@pytest.fixture
+def amostragem(app, monkeypatch):
+    import app as modulo
+    monkeypatch.setitem(app.config, 'PROFILER_SAMPLE_RATE', 1.0)
+    monkeypatch.setitem(app.config, 'PROFILER_KEEP', 2)
+    monkeypatch.setattr(modulo.profiler, '_lentas', [])
+    return modulo.profiler
+
+
+def test_guarda_as_mais_lentas(app, admin, cliente, caches_frios, amostragem, monkeypatch):
+    for url in ('/sobre', '/loja', '/loja?q=bata', '/sobre'):
+        assert cliente.get(url).status_code == 200 # Visitante: a página normal, medida por trás
+    monkeypatch.setitem(app.config, 'PROFILER_SAMPLE_RATE', 0) # As consultas abaixo não entram na lista
+    lista = admin.get('/admin/perfis').get_json()
+    perfis = lista['perfis']
+    assert len(perfis) == 2 and perfis[0]['total_ms'] >= perfis[1]['total_ms']
+    assert lista['amostradas'] >= 4
+
+    resposta = admin.get(perfis[0]['url'] + '?formato=texto')
+    assert resposta.mimetype == 'text/plain' and perfis[0]['path'] in resposta.get_data(as_text=True)
+    assert isinstance(marshal.loads(admin.get(perfis[1]['url']).data), dict)
+    assert admin.get('/admin/perfis/999999').status_code == 404
+
+
+def test_perfis_guardados_so_para_admin(cliente, amostragem):
+    cliente.get('/sobre')
+    (perfil,) = amostragem.lentas()
+    for url in ('/admin/perfis', f"/admin/perfis/{perfil['id']}"):
+        resposta = cliente.get(url)
+        assert resposta.status_code == 302 and '/admin/login' in resposta.headers['Location']
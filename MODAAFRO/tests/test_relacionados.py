@@ -0,0 +1,87 @@
+import sqlalchemy as sa
+import pytest
+
+import related
+from models import Categoria, Produto, ProdutoRelacionado, ProdutoTermo, produto_categoria
+
+CATALOGO = {
+    1: ('Vestido Ankara Longo', 'Vestido longo com estampa ankara', [1]),
+    2: ('Vestido Ankara Curto', 'Vestido curto com estampa ankara', [1]),
+    3: ('Saia Ankara', 'Saia midi com estampa ankara', [2]),
+    4: ('Calça Jeans', 'Calça reta de jeans', [3]),
+    5: ('Bata Bordada', 'Bata de linho bordada', [2]),
+}
+
+
+@pytest.fixture
+def conexao():
+    """Banco em memória só com as tabelas dos relacionados."""
+    engine = sa.create_engine('sqlite://')
+    tabelas = [Categoria.__table__, Produto.__table__, produto_categoria,
+               ProdutoTermo.__table__, ProdutoRelacionado.__table__]
+    Produto.metadata.create_all(engine, tables=tabelas)
+    with engine.begin() as conexao:
+        conexao.execute(sa.insert(Categoria.__table__), [{'id': c, 'nome': f'C{c}'} for c in (1, 2, 3)])
+        for produto_id, (nome, descricao, categorias) in CATALOGO.items():
+            _inserir(conexao, produto_id, nome, descricao, categorias)
+        yield conexao
+
+
+def _inserir(conexao, produto_id, nome, descricao, categorias):
+    conexao.execute(sa.insert(Produto.__table__).values(
+        id=produto_id, nome=nome, descricao=descricao, preco=10.0, destaque=False))
+    conexao.execute(sa.insert(produto_categoria), [{'produto_id': produto_id, 'categoria_id': c} for c in categorias])
+
+
+def _listas(conexao):
+    return {i: [j for j, _ in lista] for i, lista in related._listas(conexao, list(CATALOGO) + [6]).items()}
+
+
+def test_vizinhos_pela_semelhanca(conexao):
+    resumo = related.reconstruir(conexao, k=2)
+    assert resumo['produtos'] == 5
+    listas = _listas(conexao)
+    assert listas[1] == [2, 3] # Mesma categoria e nome parecido, depois só o "ankara"
+    assert listas[3][0] in (1, 2)
+    assert 1 not in listas.get(4, []) and 4 not in listas[1] # Nada em comum com a calça
+    assert listas[5] == [3] # Só a categoria em comum
+
+
+def test_numpy_e_python_dao_o_mesmo_resultado(conexao, monkeypatch):
+    if related.np is None:
+        pytest.skip('numpy não instalado')
+    related.reconstruir(conexao, k=3)
+    com_numpy = related._listas(conexao, list(CATALOGO))
+    monkeypatch.setattr(related, 'np', None)
+    related.reconstruir(conexao, k=3)
+    sem_numpy = related._listas(conexao, list(CATALOGO))
+    assert {i: [j for j, _ in l] for i, l in com_numpy.items()} == {i: [j for j, _ in l] for i, l in sem_numpy.items()}
+    for i in com_numpy:
+        assert [s for _, s in com_numpy[i]] == pytest.approx([s for _, s in sem_numpy[i]])
+
+
+def test_atualizacao_incremental(conexao):
+    related.reconstruir(conexao, k=2)
+    _inserir(conexao, 6, 'Vestido Ankara Midi', 'Vestido midi com estampa ankara', [1])
+    alterados = related.atualizar(conexao, 6, k=2)
+    listas = _listas(conexao)
+    assert set(listas[6]) == {1, 2}
+    assert 6 in listas[1] and 6 in listas[2] and {1, 2, 6} <= alterados
+
+    # Excluído: some das listas de que fazia parte, e outro produto fica com a vaga
+    conexao.execute(sa.delete(produto_categoria).where(produto_categoria.c.produto_id == 6))
+    conexao.execute(sa.delete(Produto.__table__).where(Produto.__table__.c.id == 6))
+    related.atualizar(conexao, 6, k=2)
+    listas = _listas(conexao)
+    assert 6 not in listas and all(6 not in lista for lista in listas.values())
+    assert listas[1] == [2, 3]
+
+
+def test_modal_traz_os_relacionados(app, admin, cliente, caches_frios):
+    from conftest import criar_produto
+    a = criar_produto(admin, 'Kimono Adinkra Vermelho', categoria=1)
+    b = criar_produto(admin, 'Kimono Adinkra Azul', categoria=1)
+    assert app.test_cli_runner().invoke(args=['build-related']).exit_code == 0
+    caches_frios()
+    relacionados = cliente.get(f'/produto/{a}').get_json()['relacionados']
+    assert relacionados[0]['id'] == b and relacionados[0]['nome'] == 'Kimono Adinkra Azul'
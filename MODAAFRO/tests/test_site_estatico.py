@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import event
+
+from conftest import criar_produto
+from static_site import SiteEstatico
+
+
+@pytest.fixture
+def site(app, caches_frios, tmp_path, monkeypatch):
+    """Exportação ligada (anota as páginas de cada commit) para uma pasta temporária."""
+    import app as modulo
+    from models import PaginaEstaticaPendente, db
+    destino = tmp_path / 'site'
+    monkeypatch.setitem(app.config, 'STATIC_EXPORT_DIR', str(destino))
+    orcamentos = dict(app.config['SQL_QUERY_BUDGETS'])
+    for rota, extra in {'add_produto': 3, 'edit_produto': 2, 'delete_produto': 2}.items():
+        orcamentos[rota] += extra # Ver SQL_QUERY_BUDGETS
+    monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGETS', orcamentos)
+    site = SiteEstatico(app, db)
+    with app.app_context():
+        db.session.execute(db.delete(PaginaEstaticaPendente))
+        db.session.commit()
+
+    def construir(incremental=False):
+        with app.app_context():
+            return site.construir(modulo.produto_detalhe, modulo.carregar_produtos,
+                                  incremental=incremental, log=lambda *a: None)
+    yield destino, construir
+    event.remove(db.session, 'after_flush', site._anotar)
+
+
+def _versao(caminho):
+    st = os.stat(caminho)
+    return st.st_ino, st.st_mtime_ns
+
+
+def test_site_completo(app, admin, site):
+    from models import Categoria, db
+    destino, construir = site
+    assert admin.post('/admin/categorias', data={'nome': 'Estática Completa'}).status_code == 302
+    with app.app_context():
+        categoria = db.session.scalar(db.select(Categoria.id).filter_by(nome='Estática Completa'))
+    produto = criar_produto(admin, 'Vestido Estático', categoria=categoria)
+    resumo = construir()
+
+    pagina_categoria = f'loja/categoria/{categoria}/index.html'
+    for arquivo in ('index.html', 'sobre/index.html', 'loja/index.html', pagina_categoria):
+        assert (destino / arquivo).read_text(encoding='utf-8').startswith('<!DOCTYPE html>')
+    assert 'Vestido Estático' in (destino / pagina_categoria).read_text(encoding='utf-8')
+    detalhe = json.loads((destino / f'produto/{produto}.json').read_text(encoding='utf-8'))
+    assert detalhe['nome'] == 'Vestido Estático'
+    assert (destino / 'uploads' / detalhe['imagens'][0].rsplit('/uploads/', 1)[1]).is_file()
+    assert (destino / 'static/css/style.css').is_file()
+    assert resumo['produtos'] >= 1 and not list(destino.rglob('.tmp-*'))
+
+
+def _mudaram(destino, antes):
+    return {p.relative_to(destino).as_posix() for p, v in antes.items() if _versao(p) != v}
+
+
+def test_incremental_refaz_so_as_paginas_afetadas(admin, site):
+    destino, construir = site
+    construir()
+    antes = {p: _versao(p) for p in destino.rglob('*.html')}
+
+    produto = criar_produto(admin, 'Turbante Incremental', categoria=2) # Fora dos destaques
+    resumo = construir(incremental=True)
+    assert resumo['produtos'] == 1 and (destino / f'produto/{produto}.json').is_file()
+    mudaram = _mudaram(destino, antes)
+    assert {'loja/index.html', 'loja/categoria/2/index.html'} <= mudaram
+    assert all(p.startswith('loja/') for p in mudaram), mudaram # Nem a inicial nem o "sobre"
+
+    antes = {p: _versao(p) for p in destino.rglob('*.html')}
+    resposta = admin.post(f'/admin/produto/editar/{produto}', data={
+        'nome': 'Turbante Editado', 'descricao': 'Algodão', 'preco': '45.00', 'categorias': '2'})
+    assert resposta.status_code == 302
+    resumo = construir(incremental=True)
+    assert (resumo['paginas'], resumo['produtos']) == (2, 1)
+    assert _mudaram(destino, antes) == {'loja/index.html', 'loja/categoria/2/index.html'}
+    detalhe = json.loads((destino / f'produto/{produto}.json').read_text(encoding='utf-8'))
+    assert detalhe['nome'] == 'Turbante Editado'
+
+    # Nada mudou desde então: nada a refazer
+    assert construir(incremental=True)['paginas'] == 0
+
+    assert admin.post(f'/admin/produto/excluir/{produto}').status_code == 302
+    resumo = construir(incremental=True)
+    assert resumo['removidos'] == 1 and not (destino / f'produto/{produto}.json').exists()
+    assert 'Turbante Editado' not in (destino / 'loja/categoria/2/index.html').read_text(encoding='utf-8')
+
+
+def test_categoria_nova_refaz_todas_as_paginas(admin, site):
+    destino, construir = site
+    construir()
+    assert admin.post('/admin/categorias', data={'nome': 'Estática Nova'}).status_code == 302
+    resumo = construir(incremental=True)
+    # O menu de categorias está em todas as páginas HTML
+    assert 'Estática Nova' in (destino / 'sobre/index.html').read_text(encoding='utf-8')
+    assert resumo['paginas'] == len(list(destino.rglob('*.html')))
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+import pytest
+
+import snapshot
+from conftest import criar_produto
+
+
+@pytest.fixture
+def produto(app, admin):
+    return criar_produto(admin, 'Kimono Kente', imagens=2, categoria=2, destaque=True)
+
+
+def test_gera_e_le_o_snapshot(app, produto, tmp_path):
+    import app as modulo
+    from models import db
+    caminho = str(tmp_path / 'catalogo.snapshot')
+    versao = modulo.catalogo_versao.atual()
+    with app.app_context(), db.engine.connect() as conexao:
+        resumo = snapshot.construir(conexao, caminho, versao)
+    lido = snapshot.Snapshot(caminho)
+
+    assert resumo['produtos'] == len(lido) and lido.versao == versao
+    p = lido.produto(produto)
+    assert (p.nome, p.preco, p.destaque, p.categoria_ids, len(p.imagens)) == ('Kimono Kente', 99.9, True, [2], 2)
+    assert p.imagem_destaque_url == p.imagens[0].url_imagem
+    assert lido.produto(10**9) is None
+    assert produto in [d.id for d in lido.destaques(100)]
+    assert (2, 'Vestidos') in lido.categorias
+    assert os.listdir(tmp_path) == ['catalogo.snapshot'] # Sem temporário
+
+
+def test_snapshot_desatualizado_volta_para_o_banco(app, cliente, produto, monkeypatch):
+    import app as modulo
+    snap = modulo.snapshot_catalogo
+    agendados = []
+    monkeypatch.setattr(snap, 'agendar', lambda: agendados.append(1))
+    snap.construir()
+    assert snap.atual() is not None
+
+    # Qualquer commit no catálogo muda a versão: quem lê passa a usar o banco
+    modulo.catalogo_versao.incrementar()
+    fallbacks = snap.fallbacks
+    assert snap.atual() is None
+    assert (snap.fallbacks, agendados) == (fallbacks + 1, [1])
+    resposta = cliente.get(f'/produto/{produto}')
+    assert resposta.status_code == 200 and resposta.get_json()['nome'] == 'Kimono Kente'
+
+    snap.construir()
+    assert snap.atual().versao == modulo.catalogo_versao.atual()
+
+
+def test_geracao_interrompida_nao_deixa_temporario(app, produto, tmp_path):
+    import app as modulo
+    from models import db
+    parar = threading.Event()
+    parar.set()
+    with app.app_context(), db.engine.connect() as conexao, pytest.raises(snapshot.GeracaoInterrompida):
+        snapshot.construir(conexao, str(tmp_path / 'catalogo.snapshot'), modulo.catalogo_versao.atual(),
+                           parar=parar)
+    assert os.listdir(tmp_path) == []
+
+
+def test_temporarios_abandonados_sao_apagados(tmp_path):
+    velho, novo, outro = (tmp_path / '.snapshot-velho', tmp_path / '.snapshot-novo', tmp_path / 'catalogo.snapshot')
+    for arquivo in (velho, novo, outro):
+        arquivo.write_bytes(b'x')
+    antes = time.time() - snapshot.TEMPORARIO_MAX_IDADE - 60
+    os.utime(velho, (antes, antes))
+    os.utime(outro, (antes, antes))
+
+    assert snapshot.limpar_temporarios(str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == ['.snapshot-novo', 'catalogo.snapshot']
+
+
+def test_parar_encerra_a_regeneracao(app, monkeypatch):
+    import app as modulo
+    from models import db
+    monkeypatch.setitem(app.config, 'SNAPSHOT_DELAY', 60)
+    snap = snapshot.SnapshotCatalogo(app, modulo.catalogo_versao, engine=lambda: db.engine)
+    snap.agendar()
+    inicio = time.monotonic()
+    snap.parar()
+    assert not snap._thread.is_alive()
+    assert time.monotonic() - inicio < 5
@@ -0,0 +1,54 @@
+import uuid
+
+from conftest import criar_produto
+from suggestions import IndiceSugestoes, normalizar
+
+PRODUTOS = [(1, 'Calça Jeans Azul'), (2, 'Calçado Couro'), (3, 'Camisa Kente'), (4, 'Bata Jeans'),
+            (5, 'CALÇA de linho'), (6, 'Saia')]
+CATEGORIAS = [(10, 'Calças'), (11, 'Camisas'), (12, 'Acessórios')]
+
+
+def _nomes(pares):
+    return [nome for _, nome in pares]
+
+
+def test_normalizar():
+    assert normalizar('  Calça-Jeans ') == 'calca jeans '
+    assert normalizar('ÁFRICA_ÉTNICA') == 'africa etnica'
+
+
+def test_prefixo_sem_acento_e_maiusculas():
+    indice = IndiceSugestoes(PRODUTOS, CATEGORIAS)
+    categorias, produtos = indice.sugerir('CALC')
+    assert _nomes(categorias) == ['Calças']
+    assert _nomes(produtos) == ['CALÇA de linho', 'Calça Jeans Azul', 'Calçado Couro'] # Ordem do nome normalizado
+
+
+def test_palavra_completa_e_palavra_do_meio():
+    indice = IndiceSugestoes(PRODUTOS, CATEGORIAS)
+    # "calça " (com espaço): a palavra terminou, "Calçado" não serve
+    assert _nomes(indice.sugerir('calça ')[1]) == ['CALÇA de linho', 'Calça Jeans Azul']
+    # Nomes que começam com o texto vêm antes dos que só têm uma palavra com ele
+    indice = IndiceSugestoes(PRODUTOS + [(7, 'Jeans Skinny')], CATEGORIAS)
+    assert _nomes(indice.sugerir('jea')[1]) == ['Jeans Skinny', 'Bata Jeans', 'Calça Jeans Azul']
+    assert _nomes(indice.sugerir('azul')[1]) == ['Calça Jeans Azul']
+
+
+def test_limites_e_texto_vazio():
+    indice = IndiceSugestoes(PRODUTOS, CATEGORIAS)
+    assert len(indice.sugerir('ca', limite_produtos=2)[1]) == 2
+    assert indice.sugerir('   ') == ([], [])
+    assert indice.sugerir('xyz') == ([], [])
+
+
+def test_rota_acompanha_o_catalogo(app, admin, cliente, caches_frios):
+    marca = uuid.uuid4().hex[:6]
+    assert cliente.get(f'/loja/sugestoes?q=zulu{marca}').get_json()['produtos'] == []
+    produto = criar_produto(admin, f'Zulu{marca} Bata', categoria=1)
+    resposta = cliente.get(f'/loja/sugestoes?q=ZULU{marca}')
+    assert resposta.get_json()['produtos'] == [{'id': produto, 'nome': f'Zulu{marca} Bata'}]
+    assert resposta.cache_control.public and resposta.cache_control.max_age is not None
+
+    categorias = cliente.get('/loja/sugestoes?q=vest').get_json()['categorias']
+    assert categorias[0]['nome'] == 'Vestidos' and categorias[0]['url'] == f"/loja?categoria_id={categorias[0]['id']}"
+    assert cliente.get('/loja/sugestoes?q=v').get_json() == {'q': 'v', 'categorias': [], 'produtos': []}
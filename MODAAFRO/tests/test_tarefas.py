@@ -0,0 +1,110 @@
+import os
+import time
+
+from models import Tarefa, db
+
+
+def test_versoes_mudam_uma_vez_por_referencia(app):
+    import app as modulo
+    with app.app_context():
+        modulo.fila_tarefas.enfileirar_varias('processar_imagem', 'produto:900',
+                                              [{'filename': f'{n}.jpg'} for n in range(3)])
+        db.session.commit()
+        tarefas = db.session.scalars(db.select(Tarefa).filter_by(referencia='produto:900')).all()
+        catalogo, variantes = modulo.catalogo_versao.atual(), modulo.variantes_versao.atual()
+
+        for n, tarefa in enumerate(tarefas, 1):
+            tarefa.estado = 'concluida'
+            db.session.commit()
+            modulo.tarefa_concluida('processar_imagem', 'produto:900')
+            mudou = modulo.variantes_versao.atual() != variantes
+            assert mudou == (n == len(tarefas)) # Só na última
+        # As variantes não mexem nos dados do catálogo (facetas, sugestões, snapshot)
+        assert modulo.catalogo_versao.atual() == catalogo
+
+        modulo.tarefa_concluida('atualizar_relacionados', 'produto:900')
+        assert modulo.catalogo_versao.atual() != catalogo
+
+
+
+def test_srcset_acompanha_variantes_de_outro_processo(app):
+    import app as modulo
+    import images
+    pasta = app.config['UPLOAD_FOLDER']
+    os.makedirs(os.path.join(pasta, images.PASTA_VARIANTES), exist_ok=True)
+
+    def criar_variante(largura):
+        with open(os.path.join(pasta, images.nome_variante('outro.jpg', largura, 'jpeg')), 'wb'):
+            pass
+
+    criar_variante(400)
+    with app.test_request_context():
+        assert '400w' in modulo.srcset_imagem('outro.jpg', 'card')
+        # A tarefa (noutro processo) termina a 600 e incrementa a versão;
+        # o limpar_cache de lá não chega a este worker
+        criar_variante(600)
+        modulo.variantes_versao.incrementar()
+        assert '600w' in modulo.srcset_imagem('outro.jpg', 'card')
+
+
+class _PoolEncerrado:
+    def submit(self, *args, **kwargs):
+        raise RuntimeError('cannot schedule new futures after interpreter shutdown')
+
+
+def test_reservas_voltam_para_a_fila_se_o_pool_encerrou(app):
+    import app as modulo
+    fila = modulo.fila_tarefas
+    with app.app_context():
+        db.session.execute(db.delete(Tarefa).where(Tarefa.estado == 'pendente'))
+        tarefa = fila.enfileirar('processar_imagem', 'produto:901', filename='x.jpg')
+        db.session.commit()
+        fila._ultima_manutencao = time.monotonic() # Sem manutenção nesta volta
+        try:
+            em_andamento = {}
+            fila._passo(_PoolEncerrado(), em_andamento, 2, ate_esvaziar=False)
+            assert fila._parar.is_set()
+        finally:
+            fila._parar.clear()
+        db.session.refresh(tarefa)
+        assert (tarefa.estado, tarefa.tentativas, em_andamento) == ('pendente', 0, {})
+
+
+class _PoolParado:
+    """Pool cujas tarefas nunca terminam (uma tarefa demorada)."""
+    def submit(self, *args, **kwargs):
+        from concurrent.futures import Future
+        return Future()
+
+
+def test_tarefa_demorada_com_batimento_nao_volta_para_a_fila(app, monkeypatch):
+    import datetime
+    import app as modulo
+    fila = modulo.fila_tarefas
+    monkeypatch.setitem(app.config, 'JOBS_POLL_INTERVAL', 0.01)
+    monkeypatch.setitem(app.config, 'JOBS_HEARTBEAT', 0)
+    with app.app_context():
+        db.session.execute(db.delete(Tarefa).where(Tarefa.estado.in_(('pendente', 'executando'))))
+        viva = fila.enfileirar('processar_imagem', 'produto:902', filename='x.jpg')
+        db.session.commit()
+        fila._ultima_manutencao = fila._ultimo_batimento = time.monotonic()
+        em_andamento = {}
+        fila._passo(_PoolParado(), em_andamento, 1, ate_esvaziar=False)
+        assert list(em_andamento.values()) == [viva.id]
+
+        # Começou há muito mais que JOBS_TIMEOUT, e há outra de um despachante que caiu
+        antes = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['JOBS_TIMEOUT'] + 60)
+        db.session.execute(db.update(Tarefa).where(Tarefa.id == viva.id)
+                           .values(iniciada_em=antes, batimento_em=antes))
+        orfa = Tarefa(tipo='processar_imagem', referencia='produto:903', estado='executando',
+                      tentativas=1, iniciada_em=antes, batimento_em=antes)
+        db.session.add(orfa)
+        db.session.commit()
+
+        fila._passo(_PoolParado(), em_andamento, 1, ate_esvaziar=False) # Bate pela que está rodando
+        fila._manutencao()
+        db.session.refresh(viva)
+        db.session.refresh(orfa)
+        assert (viva.estado, orfa.estado) == ('executando', 'pendente')
+        db.session.execute(db.delete(Tarefa).where(Tarefa.id.in_((viva.id, orfa.id))))
+        db.session.commit()
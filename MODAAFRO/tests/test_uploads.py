@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+CONTEUDO = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def arquivo(app):
+    nome = 'a' * 40 + '.jpg' # Como os do 'save_image': hash do conteúdo
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], nome), 'wb') as f:
+        f.write(CONTEUDO)
+    return nome
+
+
+def test_upload_com_cache_imutavel_e_etag_forte(cliente, arquivo):
+    resposta = cliente.get(f'/uploads/{arquivo}')
+    assert resposta.status_code == 200 and resposta.data == CONTEUDO
+    assert resposta.cache_control.max_age == 365 * 24 * 3600 and resposta.cache_control.immutable
+    etag, fraca = resposta.get_etag()
+    assert etag and not fraca
+    assert resposta.headers['Accept-Ranges'] == 'bytes'
+
+    # Mesmo nome e tamanho: mesma ETag (não depende do mtime de cada servidor)
+    os.utime(os.path.join(cliente.application.config['UPLOAD_FOLDER'], arquivo), (0, 0))
+    assert cliente.get(f'/uploads/{arquivo}').get_etag() == (etag, False)
+
+    resposta = cliente.get(f'/uploads/{arquivo}', headers={'If-None-Match': f'"{etag}"'})
+    assert resposta.status_code == 304 and resposta.data == b''
+    assert resposta.cache_control.immutable
+
+
+def test_upload_com_range(cliente, arquivo):
+    resposta = cliente.get(f'/uploads/{arquivo}', headers={'Range': 'bytes=100-199'})
+    assert resposta.status_code == 206 and resposta.data == CONTEUDO[100:200]
+    assert resposta.headers['Content-Range'] == f'bytes 100-199/{len(CONTEUDO)}'
+
+    etag, _ = resposta.get_etag()
+    resposta = cliente.get(f'/uploads/{arquivo}', headers={'Range': 'bytes=-24', 'If-Range': f'"{etag}"'})
+    assert resposta.status_code == 206 and resposta.data == CONTEUDO[-24:]
+    # If-Range de outra versão: manda o arquivo inteiro
+    resposta = cliente.get(f'/uploads/{arquivo}', headers={'Range': 'bytes=0-9', 'If-Range': '"outra"'})
+    assert resposta.status_code == 200 and resposta.data == CONTEUDO
+
+    resposta = cliente.get(f'/uploads/{arquivo}', headers={'Range': f'bytes={len(CONTEUDO)}-'})
+    assert resposta.status_code == 416
+
+
+def test_upload_entregue_pelo_proxy(app, cliente, arquivo, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOADS_OFFLOAD', 'x-accel')
+    resposta = cliente.get(f'/uploads/{arquivo}', headers={'Range': 'bytes=0-9'})
+    assert resposta.status_code == 200 and resposta.data == b'' # O proxy manda os bytes (e trata o Range)
+    assert resposta.headers['X-Accel-Redirect'] == f'/_uploads/{arquivo}'
+    assert 'X-Sendfile' not in resposta.headers
+    assert resposta.cache_control.immutable and resposta.get_etag()[0]
+
+
+@pytest.mark.parametrize('caminho', ['nao-existe.jpg', '../config.py', '..%2Fconfig.py', 'variantes'])
+def test_upload_inexistente_ou_fora_da_pasta(cliente, caminho):
+    assert cliente.get(f'/uploads/{caminho}').status_code == 404
@@ -0,0 +1,166 @@
+# uploads.py
+#
+# Armazenamento dos uploads pelo conteúdo: o nome do arquivo é o SHA-256 dos
+# bytes ('<hash>.<ext>'). Enviar a mesma foto de novo, ou usá-la num produto
+# e num banner, aponta para o mesmo arquivo, e um nome nunca muda de
+# conteúdo (o cache 'immutable' do /uploads continua valendo).
+#
+# Quem usa um arquivo são as colunas ImagemProduto.url_imagem,
+# Produto.imagem_destaque_url e Banner.imagem_url: a contagem de referências
+# é feita nelas mesmas (não há contador para divergir), e o arquivo só é
+# apagado quando nenhuma o referencia mais.
+#
+# Arquivos sem referência que sobraram (commit que falhou depois do upload,
+# importação interrompida, nomes antigos com uuid4...) são recolhidos por
+# 'flask gc-uploads'.
+
+import hashlib
+import os
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+import images
+from forms import IMG_ALLOWED
+from models import db, Banner, ImagemProduto, Produto
+
+# Colunas que referenciam arquivos da pasta de uploads
+COLUNAS_REFERENCIA = (ImagemProduto.url_imagem, Produto.imagem_destaque_url, Banner.imagem_url)
+
+# Mesmo conteúdo com extensões diferentes vira um arquivo só
+EXTENSOES_EQUIVALENTES = {'jpeg': 'jpg'}
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+def extensao(nome):
+    """'Foto.JPEG' -> 'jpg' ('' se não tiver extensão)."""
+    ext = nome.rsplit('.', 1)[1].lower() if '.' in nome else ''
+    return EXTENSOES_EQUIVALENTES.get(ext, ext)
+
+
+def salvar(stream, ext, pasta):
+    """
+    Grava os bytes de 'stream' na pasta de uploads com o nome do hash.
+    Retorna (nome, novo): 'novo' é False quando o arquivo já existia (nada
+    foi gravado). Nesse caso o mtime é renovado, o que protege o arquivo de
+    uma exclusão já agendada e da carência do 'gc-uploads'.
+    """
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    sha = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                bloco = stream.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                sha.update(bloco)
+                f.write(bloco)
+        nome = f"{sha.hexdigest()}.{EXTENSOES_EQUIVALENTES.get(ext, ext)}"
+        destino = os.path.join(pasta, nome)
+        if os.path.exists(destino):
+            os.remove(tmp)
+            os.utime(destino)
+            return nome, False
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, destino) # Atômico: dois envios iguais ao mesmo tempo dão no mesmo arquivo
+        return nome, True
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def copiar(origem, pasta):
+    """Como 'salvar', lendo de um arquivo (ex: importação do catálogo)."""
+    with open(origem, 'rb') as f:
+        return salvar(f, extensao(origem), pasta)
+
+
+def referenciados(nomes):
+    """Quais dos 'nomes' são usados por alguma linha (uma consulta por coluna)."""
+    nomes = list(nomes)
+    usados = set()
+    for coluna in COLUNAS_REFERENCIA:
+        usados.update(db.session.scalars(sa.select(coluna).where(coluna.in_(nomes)).distinct()))
+    return usados
+
+
+def _varrer(pasta):
+    """Arquivos (não pastas) de 'pasta', um a um, sem montar a lista inteira."""
+    try:
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if entrada.is_file(follow_symlinks=False):
+                    yield entrada
+    except FileNotFoundError:
+        return
+
+
+def _original_existe(pasta, base):
+    return any(os.path.exists(os.path.join(pasta, f"{base}.{ext}")) for ext in IMG_ALLOWED)
+
+
+def coletar_lixo(pasta, carencia=3600, tamanho_lote=500, simular=False):
+    """
+    Apaga os uploads que nenhuma linha referencia, com suas variantes, as
+    variantes cujo original não existe mais e temporários abandonados.
+    Arquivos modificados há menos de 'carencia' segundos nunca são apagados:
+    podem ser de um upload cuja transação ainda não terminou. A pasta é
+    lida em fluxo e conferida com o banco em lotes de 'tamanho_lote' nomes.
+    Retorna um dict com o que foi (ou, em 'simular', seria) apagado.
+    """
+    limite = time.time() - carencia
+    resumo = {'arquivos': 0, 'variantes': 0, 'temporarios': 0, 'bytes': 0}
+    bases_apagadas = set() # Na simulação os originais continuam lá
+
+    def apagar(entrada, tipo):
+        resumo[tipo] += 1
+        resumo['bytes'] += entrada.stat().st_size
+        if not simular:
+            try:
+                os.remove(entrada.path)
+            except FileNotFoundError:
+                pass
+
+    def conferir(lote):
+        usados = referenciados(lote)
+        db.session.rollback() # Não segura a transação de leitura entre os lotes
+        for entrada in lote.values():
+            if entrada.name not in usados:
+                apagar(entrada, 'arquivos')
+                bases_apagadas.add(entrada.name.rsplit('.', 1)[0])
+
+    lote = {}
+    for entrada in _varrer(pasta):
+        if entrada.stat().st_mtime > limite:
+            continue
+        if entrada.name.startswith('.tmp-'):
+            apagar(entrada, 'temporarios')
+            continue
+        if entrada.name.startswith('.') or extensao(entrada.name) not in IMG_ALLOWED:
+            continue # Ex: '.gitkeep'; só imagens são uploads
+        lote[entrada.name] = entrada
+        if len(lote) >= tamanho_lote:
+            conferir(lote)
+            lote = {}
+    if lote:
+        conferir(lote)
+
+    # Variantes sem original (o original apagado acima ou por uma exclusão antiga)
+    for entrada in _varrer(os.path.join(pasta, images.PASTA_VARIANTES)):
+        if entrada.stat().st_mtime > limite:
+            continue
+        if entrada.name.endswith('.tmp'): # Variante que o Pillow não terminou de gravar
+            apagar(entrada, 'temporarios')
+            continue
+        base = entrada.name.rsplit('.', 1)[0].rsplit('-', 1)[0] # 'abc-400.webp' -> 'abc'
+        if base not in bases_apagadas and _original_existe(pasta, base):
+            continue
+        apagar(entrada, 'variantes')
+
+    if not simular:
+        images.limpar_cache()
+    return resumo
+